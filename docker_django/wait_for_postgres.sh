@@ -4,5 +4,11 @@
 # NOTE: we pass in "db" as a parameter since this is the hostname Docker sets for us (in the docker-compose.yml)
 python wait_for_postgres.py db
 
+# (re)install the triggers that keep the indexes over time_entries, the deleted entries' tombstones and the polled
+# endpoints' table versions current; safe to run on every start
+python manage.py refresh_entry_index
+python manage.py install_entry_tombstones
+python manage.py install_table_versions
+
 # Execute anything in the "CMD" definition
 exec "$@"
\ No newline at end of file
@@ -168,3 +168,6 @@ LOGOUT_URL = '/reports/logout/'
 
 # Custom field name that represents the log as categories:
 LOGGING_CATEGORY_NAME = 'Log As'
+
+# Where the build_weekly_report command keeps the prebuilt weekly report files
+WEEKLY_REPORT_DIR = ENV('WEEKLY_REPORT_DIR', default=os.path.join(os.path.dirname(BASE_DIR), 'weekly_reports'))
@@ -18,15 +18,22 @@ from django.contrib import admin
 from django.conf.urls import include
 
 from time_management.planning import planning_home, get_all_dev_assignments, get_assignments, get_planning_projection, \
-    developer_assignments, deactivate, activate, update_supervisor, remove_assignment, add_assignment
-
-from time_management.home import home, get_entries_home, get_distribution, get_entries_home_page, get_all_distribution
-from time_management.time_entries import entries_home, get_date_range, get_project_activities, update_entries, delete_entry
-from time_management.calendar_view import calendar_home, update_entry_data, copy_entry
+    developer_assignments, deactivate, activate, update_supervisor, remove_assignment, add_assignment, \
+    get_team_assignments, get_fte_timeline, over_allocations, available_developers, get_scenarios, save_scenario, \
+    remove_scenario, compare_planning_scenarios, bulk_update_assignments
+
+from time_management.home import home, get_entries_home, get_distribution, get_entries_home_page, \
+    get_all_distribution, get_home_bootstrap
+from time_management.entry_pages import get_entries_page, get_entries_totals
+from time_management.entry_sync import sync_entries
+from time_management.team_entries import get_team_entries
+from time_management.time_entries import entries_home, get_date_range, get_project_activities, update_entries, \
+    delete_entry, invalidate_activities
+from time_management.calendar_view import calendar_home, update_entry_data, copy_entry, copy_range
 from time_management.distribution import distribution_home, get_entries
 from time_management.report_generation import report_generator_home, generate_external_report, \
     generate_csr_report, generate_internal_report, missing_hours
-from time_management.reports import weekly_report_form_url
+from time_management.reports import weekly_report_form_url, get_project_trend
 from time_management.rates import rates_home, save_rate, save_start_date, save_end_date, save_rates, delete_rates, \
     add_rates, add_single_category
 from time_management.auth import login_page, logout_request
@@ -44,7 +51,12 @@ urlpatterns = [
     # Home Page
     url(r'^$', home, name='home'),
     url(r'^get_entries$', get_entries_home, name="get_entries"),
+    url(r'^get_home_bootstrap$', get_home_bootstrap, name="get_home_bootstrap"),
     url(r'^get_all_entries$', get_entries_home_page, name="get_all_entries"),
+    url(r'^get_entries_page$', get_entries_page, name="get_entries_page"),
+    url(r'^get_entries_totals$', get_entries_totals, name="get_entries_totals"),
+    url(r'^sync_entries$', sync_entries, name="sync_entries"),
+    url(r'^get_team_entries$', get_team_entries, name="get_team_entries"),
     url(r'^get_distribution$', get_distribution, name="get_distribution"),
     url(r'^get_all_distribution$', get_all_distribution, name="get_all_distribution"),
 
@@ -52,6 +64,7 @@ urlpatterns = [
     url(r'^time_entries/$', entries_home, name="time_entries"),
     url(r'^get_dates$', get_date_range, name='get_dates'),
     url(r'^get_activities$', get_project_activities, name="get_activities"),
+    url(r'^invalidate_activities$', invalidate_activities, name="invalidate_activities"),
     url(r'^update_entries$', update_entries, name="update_entries"),
     url(r'^del_entry$', delete_entry, name='del_entry'),
 
@@ -59,6 +72,7 @@ urlpatterns = [
     url(r'^calendar/$', calendar_home, name="calendar"),
     url(r'^update_entry_data$', update_entry_data, name="update_entry_data"),
     url(r'^copy_entry$', copy_entry, name="copy_entry_data"),
+    url(r'^copy_range$', copy_range, name='copy_range'),
 
     # Time Distribution View
     url(r'^distribution/$', distribution_home, name="distribution"),
@@ -100,11 +114,20 @@ urlpatterns = [
     url(r'^get_assignments$', get_assignments, name='get_assignments'),
     url(r'^get_planning_projection$', get_planning_projection, name='getProjections'),
     url(r'^developer_assignments$', developer_assignments, name='dev_assignments'),
+    url(r'^get_team_assignments$', get_team_assignments, name='team_assignments'),
+    url(r'^get_fte_timeline$', get_fte_timeline, name='fte_timeline'),
+    url(r'^over_allocations$', over_allocations, name='over_allocations'),
+    url(r'^available_developers$', available_developers, name='available_developers'),
+    url(r'^get_scenarios$', get_scenarios, name='get_scenarios'),
+    url(r'^save_scenario$', save_scenario, name='save_scenario'),
+    url(r'^remove_scenario$', remove_scenario, name='remove_scenario'),
+    url(r'^compare_scenarios$', compare_planning_scenarios, name='compare_scenarios'),
     url(r'^deactivate_developer$', deactivate, name='deactivate'),
     url(r'^activate_developer$', activate, name='activate'),
     url(r'^update_supervisor$', update_supervisor, name='update_supervisor'),
     url(r'^remove_project_distribution_entry$', remove_assignment, name='remove_assignment'),
     url(r'^add_developer$', add_assignment, name='add_developer'),
+    url(r'^bulk_update_assignments$', bulk_update_assignments, name='bulk_update_assignments'),
 
     # Adjustable Rates
     url(r'^rates/$', rates_home, name='rates_home'),
@@ -118,6 +141,7 @@ urlpatterns = [
 
     # Weekly Report Generator (callable via the following URL):
     url(r'^weekly_report/$', weekly_report_form_url, name='weekly_report'),
+    url(r'^project_trend/$', get_project_trend, name='project_trend'),
 
     # Used if on production for CAS authentication
     #url(r'^login/$', cas.views.login, name='login'),
@@ -18,12 +18,22 @@ var EntryList = new Array();
 // It also sets an "onchange" event for each checkbox - this is used to keep track, using local storage, the selected items.
 function init()
 {
+    // the month and user Establish() will pick, so their entries can come along with the dropdowns
+    var now = new Date();
+    var target_user = $('#username').val();
+    if(window.location.href.indexOf('=') > 0)
+    {
+        target_user = window.location.href.split('=')[1];
+    }
 
     // make a call to get all of our info we need to fill out our time entries and options
 	$.ajax({
-		url: '../get_dates',
+		url: '../get_home_bootstrap',
+		data: {month: now.getMonth() + 1, year: now.getFullYear(), target: target_user, order: ORDER_BY, by: ORDER},
 		dataType: "json",
-		success: function(data){
+		success: function(bootstrap){
+			var data = bootstrap.periods;
+
 			// setup the month list
 			var months = data.months;
 			for(var i = 0; i < months.length; i++)
@@ -87,7 +97,7 @@ function init()
             // add this option to our month select
             $('#year_dropdown').append(option);
 
-			Establish();
+			Establish(bootstrap);
 		},
 		error: function(){
 			alert("Could not get time entries.  Please contact the system administrator.");
@@ -96,7 +106,7 @@ function init()
 
 }
 
-function Establish()
+function Establish(bootstrap)
 {
 
 	// check if we want to look up a specific user...
@@ -166,7 +176,7 @@ function Establish()
 
 
 
-	GetEntries();
+	GetEntries(bootstrap);
 }
 
 function SwapOrder()
@@ -196,7 +206,8 @@ var ACTIVITIES = new Array();
 
 var EXPECTED_BILLABLE = '';
 
-function GetEntries()
+// bootstrap: a get_home_bootstrap response to show instead of fetching the entries
+function GetEntries(bootstrap)
 {
     // make sure to clear out any open dialogs
     $('.ui-dialog').each(function(){
@@ -218,7 +229,7 @@ function GetEntries()
 	}
 
 	// now that we have our date setup, let's get our entries!
-	$.ajax({
+	var request = {
 		url: '../get_entries',
 		data: {month: $('#month_name').val(), year: $('#year_name').val(), target: target_user, order: ORDER_BY, by: ORDER},
 		dataType: 'json',
@@ -460,6 +471,7 @@ function GetEntries()
                                 console.log("Update successful");
                                 $('#calendar').fullCalendar('clientEvents', [id])[0].changes = false;
                                 $('#dialog_'+id).remove();
+                                SyncEntries();
                             },
                             error: function(){
                                 alert("Failed to update entry.");
@@ -489,31 +501,9 @@ function GetEntries()
                                  url: '../copy_entry',
                                  data: {target: target_user, entry_id: id, date: dateText},
                                  dataType: 'json',
-                                 success: function(new_event){
-                                     console.log(new_event)
-                                    // what should be the color of this event?
-                                    var bg_color = '#e0fed0';
-                                    if(new_event.activity.indexOf('non-billable') >= 0)
-                                        bg_color = '#d0e5f0';
-
-                                    var en = {
-                                        title: new_event.name,
-                                        start: new_event.date,
-                                        comments: new_event.comments,
-                                        activity: new_event.activity,
-                                        backgroundColor: bg_color,
-                                        textColor: '#000000',
-                                        hours: new_event.hours,
-                                        date: new_event.date,
-                                        editable: true,
-                                        id: new_event.id,
-                                        project: new_event.name,
-                                        activity_id: new_event.activity_id,
-                                        project_id: new_event.project_id,
-                                        changes: false
-                                    };
-                                     // add this to the events
-                                     $('#calendar').fullCalendar('renderEvent', en);
+                                 success: function(){
+                                     // the copy comes along with everything else that changed
+                                     SyncEntries();
                                  },
                                  error: function(){
                                      alert("Failed to copy your time entry.");
@@ -552,6 +542,7 @@ function GetEntries()
                                      console.log("Entry deleted");
                                      $('#dialog_'+id).remove();
                                      $('#calendar').fullCalendar('removeEvents', [id]);
+                                     SyncEntries();
 
                                  },
                                  error: function(){
@@ -604,6 +595,7 @@ function GetEntries()
                         dataType: 'text',
                         success: function(){
                             console.log("Update successful");
+                            SyncEntries();
                         },
                         error: function(){
                             alert("Failed to update entry.");
@@ -703,80 +695,13 @@ function GetEntries()
 			$('#calendar').fullCalendar('removeEvents');
 			for(var i = 0; i < entries.length; i++)
 			{
-                // what should be the color of this event?
-                var bg_color = '#e0fed0';
-                if(entries[i].activity.indexOf('non-billable') >= 0)
-                    bg_color = '#d0e5f0';
-
-				var en = {
-                    title: entries[i].name,
-                    start: entries[i].date,
-                    comments: entries[i].comments,
-                    activity: entries[i].activity,
-                    backgroundColor: bg_color,
-                    textColor: '#000000',
-                    hours: entries[i].hours,
-                    date: entries[i].date,
-                    editable: true,
-                    id: entries[i].id,
-                    project: entries[i].name,
-                    activity_id: entries[i].activity_id,
-                    project_id: entries[i].project_id,
-                    changes: false
-                }
-				$('#calendar').fullCalendar('renderEvent', en);
-
-                // find this entry in "DAY_HOURS"
-                var added = false;
-                for(var j = 0; j < DAY_HOURS.length; j++)
-                {
-                    if(DAY_HOURS[j].date == entries[i].date) {
-                        DAY_HOURS[j].hours += entries[i].hours;
-                        added = true;
-                        break;
-                    }
-                }
-                if(!added)
-                {
-                    var new_date = {
-                        date: entries[i].date,
-                        hours: entries[i].hours
-                    };
-                    DAY_HOURS.push(new_date);
-                }
+				$('#calendar').fullCalendar('renderEvent', EntryEvent(entries[i]));
 			}
 
-            // now color code each date with an entry to be a specific color
-            for(var i = 0; i < DAY_HOURS.length; i++)
-            {
-                var hours = DAY_HOURS[i].hours;
-                var color = '#D6FFC1';
-                if(hours < EXPECTED_BILLABLE)
-                    color = '#FFBEBE';
-
-                var hour_display = document.createElement("DIV");
-                $(hour_display).css('height', '100%');
-                $(hour_display).css('width', '100%');
-                $(hour_display).css('color', color);
-                $(hour_display).css('text-align', 'center');
-                $(hour_display).css('font-size', '60px');
-                $(hour_display).css('position', 'absolute');
-                $(hour_display).css('top', '0');
-                $(hour_display).css('left', '0');
-                $(hour_display).attr("title", "Total logged time: " + DAY_HOURS[i].hours);
-
-                var hour_holder = document.createElement('div');
-                $(hour_holder).html(DAY_HOURS[i].hours);
-                $(hour_holder).css('position', 'relative');
-                $(hour_holder).css('top', '50%');
-                $(hour_holder).css('transform', 'translateY(-50%)');
-                $(hour_display).append(hour_holder);
-
-                var target = 'td.fc-day[data-date="'+DAY_HOURS[i].date+'"]';
-                console.log("Adding hour display for " + DAY_HOURS[i].date);
-                $(target).append(hour_display);
-                $(target).css('position', 'relative');
-            }
+            // edits are followed by a sync from here on, rather than another load of the month
+            SYNC_TOKEN = data.token;
+
+            ShowDayHours();
 			$('#status_update').html('');
 		},
 		error: function(data){
@@ -788,11 +713,170 @@ function GetEntries()
 			}
 			alert("Failed to retrieve your time entries.  Please contact the system administrator.");
 		}
-	});
+	};
+
+	// the first month's entries came with the page's bootstrap
+	if(bootstrap !== undefined)
+	{
+		request.success(bootstrap);
+		return;
+	}
+	$.ajax(request);
 }
 
 var DAY_HOURS = [];
 
+// the token from the last load or sync; sync_entries sends what changed after it
+var SYNC_TOKEN = '';
+
+// turn an entry from get_entries or sync_entries into a calendar event
+function EntryEvent(entry)
+{
+    // what should be the color of this event?
+    var bg_color = '#e0fed0';
+    if(entry.activity.indexOf('non-billable') >= 0)
+        bg_color = '#d0e5f0';
+
+    return {
+        title: entry.name,
+        start: entry.date,
+        comments: entry.comments,
+        activity: entry.activity,
+        backgroundColor: bg_color,
+        textColor: '#000000',
+        hours: entry.hours,
+        date: entry.date,
+        editable: true,
+        id: entry.id,
+        project: entry.name,
+        activity_id: entry.activity_id,
+        project_id: entry.project_id,
+        changes: false
+    };
+}
+
+// total up the hours of each day on the calendar and color code each date with an entry
+function ShowDayHours()
+{
+    DAY_HOURS = new Array();
+    $('.day_hours').remove();
+
+    var events = $('#calendar').fullCalendar('clientEvents');
+    for(var i = 0; i < events.length; i++)
+    {
+        // find this entry in "DAY_HOURS"
+        var added = false;
+        for(var j = 0; j < DAY_HOURS.length; j++)
+        {
+            if(DAY_HOURS[j].date == events[i].date) {
+                DAY_HOURS[j].hours += parseFloat(events[i].hours);
+                added = true;
+                break;
+            }
+        }
+        if(!added)
+        {
+            var new_date = {
+                date: events[i].date,
+                hours: parseFloat(events[i].hours)
+            };
+            DAY_HOURS.push(new_date);
+        }
+    }
+
+    for(var i = 0; i < DAY_HOURS.length; i++)
+    {
+        var hours = DAY_HOURS[i].hours;
+        var color = '#D6FFC1';
+        if(hours < EXPECTED_BILLABLE)
+            color = '#FFBEBE';
+
+        var hour_display = document.createElement("DIV");
+        $(hour_display).addClass('day_hours');
+        $(hour_display).css('height', '100%');
+        $(hour_display).css('width', '100%');
+        $(hour_display).css('color', color);
+        $(hour_display).css('text-align', 'center');
+        $(hour_display).css('font-size', '60px');
+        $(hour_display).css('position', 'absolute');
+        $(hour_display).css('top', '0');
+        $(hour_display).css('left', '0');
+        $(hour_display).attr("title", "Total logged time: " + DAY_HOURS[i].hours);
+
+        var hour_holder = document.createElement('div');
+        $(hour_holder).html(DAY_HOURS[i].hours);
+        $(hour_holder).css('position', 'relative');
+        $(hour_holder).css('top', '50%');
+        $(hour_holder).css('transform', 'translateY(-50%)');
+        $(hour_display).append(hour_holder);
+
+        var target = 'td.fc-day[data-date="'+DAY_HOURS[i].date+'"]';
+        $(target).append(hour_display);
+        $(target).css('position', 'relative');
+    }
+}
+
+// bring the calendar up to date after an edit: only the entries changed since our token (by us or anyone else)
+// come back, along with the ids of the ones that are gone
+function SyncEntries()
+{
+    // which target should we use?
+    var target_user = $('#username').val();
+    if(TARGET != '')
+    {
+        target_user = TARGET;
+    }
+
+    $.ajax({
+        url: '../sync_entries',
+        data: {month: $('#month_name').val(), year: $('#year_name').val(), target: target_user, token: SYNC_TOKEN},
+        dataType: 'json',
+        success: function(data){
+            // our token is too old to catch up from, so start over
+            if(data.reset)
+            {
+                GetEntries();
+                return;
+            }
+            SYNC_TOKEN = data.token;
+
+            $('#calendar').fullCalendar('removeEvents', function(event){
+                return data.deleted.indexOf(event.id) >= 0;
+            });
+            for(var i = 0; i < data.entries.length; i++)
+            {
+                // don't throw away changes still being made in an entry's dialog
+                var current = $('#calendar').fullCalendar('clientEvents', [data.entries[i].id]);
+                if(current.length > 0 && current[0].changes)
+                    continue;
+
+                $('#calendar').fullCalendar('removeEvents', [data.entries[i].id]);
+                $('#calendar').fullCalendar('renderEvent', EntryEvent(data.entries[i]));
+            }
+
+            // update the totals
+            var total_hours = 0;
+            var support = 0;
+            var events = $('#calendar').fullCalendar('clientEvents');
+            for(var i = 0; i < events.length; i++)
+            {
+                if(events[i].activity.toLowerCase().indexOf('non-billable') >= 0)
+                    support += parseFloat(events[i].hours);
+                else
+                    total_hours += parseFloat(events[i].hours);
+            }
+            $('#billable_hours').html(Math.round(total_hours * 100) / 100);
+            $('#support_hours').html(Math.round(support * 100) / 100);
+            $('#total_hours').html(Math.round((total_hours + support) * 100) / 100);
+
+            ShowDayHours();
+        },
+        error: function(){
+            console.log("Failed to sync time entries.");
+        }
+    });
+}
+
 function SetupEntries()
 {
 	
@@ -153,7 +153,10 @@ function init()
 						$('#div_'+UpdateEntries[i]).toggleClass('time_entry_mod');
 					}
 					UpdateEntries = [];
-					GetEntries();
+
+					// the new rows come back from the sync as saved entries
+					$('#entry_list .new_entry').remove();
+					SyncEntries();
 					return;
 				}
 			},
@@ -280,6 +283,12 @@ var ACTIVITY_LIST = new Array();
 // list of "log as" options
 var LOGAS_LIST = new Array();
 
+// the entries on the page by id, to total up after a sync
+var ENTRIES = {};
+
+// the token from the last load or sync; sync_entries sends what changed after it
+var SYNC_TOKEN = '';
+
 function GetEntries()
 {
 	// make sure we clear our DIV
@@ -312,6 +321,10 @@ function GetEntries()
 			ACTIVITY_LIST = data.activities;
 			LOGAS_LIST = data.logas;
 
+			// edits are followed by a sync from here on, rather than another load of the range
+			SYNC_TOKEN = data.token;
+			ENTRIES = {};
+
 			// did we get any back?
 			if(data.result == 'No Entries')
 			{
@@ -415,240 +428,316 @@ function GetEntries()
 
 			for(var i = 0; i < entries.length; i++)
 			{
-				// create a new row
-				var div = document.createElement("tr");
-				div.id = "row_"+entries[i].id;
-
-				//------ Project Dropdown ---------//
-                var proj_cell = document.createElement("td");
-				var proj = document.createElement("SELECT");
-				proj.id = 'project_'+entries[i].id;
-				proj.className = 'project_select';
-                $(proj).addClass('form-control');
-                $(proj_cell).addClass('col-lg-2');
-
-				// options...
-				for(var j = 0; j < data.projects.length; j++)
+				// add this row to our project list
+				$('#entry_list').append(EntryRow(entries[i]));
+				ENTRIES[entries[i].id] = entries[i];
+			}
+			
+			// setup other widgets, etc
+			SetupEntries();
+		},
+		error: function(data){
+			if(data.responseText == "I'm afraid I can't do that...")
+			{
+				document.write('<img src="/reports/media/img/no.png" />');
+				document.close();
+				return;
+			}
+			alert("Failed to retrieve your time entries.  Please contact the system administrator.");
+		}
+	});
+}
+
+// build the row for an entry from get_entries or sync_entries
+function EntryRow(entry)
+{
+	// create a new row
+	var div = document.createElement("tr");
+	div.id = "row_"+entry.id;
+
+	//------ Project Dropdown ---------//
+    var proj_cell = document.createElement("td");
+	var proj = document.createElement("SELECT");
+	proj.id = 'project_'+entry.id;
+	proj.className = 'project_select';
+    $(proj).addClass('form-control');
+    $(proj_cell).addClass('col-lg-2');
+
+	// options...
+	for(var j = 0; j < PROJECT_LIST.length; j++)
+	{
+		// create a new option
+		var option = document.createElement("OPTION");
+		option.value = PROJECT_LIST[j].id;
+		option.innerHTML = PROJECT_LIST[j].name;
+
+		if(PROJECT_LIST[j].member == false || PROJECT_LIST[j].active != 1){
+			$(option).attr('disabled', 'disabled');
+		}
+
+		// if this project is the same that our entry is assigned to, select it.
+		if(option.value == entry.project)
+			option.selected = "SELECTED";
+
+		// add this option to our select
+		$(proj).append(option);
+	}
+
+	// add some functionality to the dropdown (if they select "MyTimeOff", then
+	// the corresponding "Activity" should only be "Support (Nonbillable)")
+	$(proj).change(function(){
+		var id = this.id.split('_')[1];
+		var project_id = $(this).val();
+		$.ajax({
+			url: '../get_activities?project='+project_id,
+			dataType: 'json',
+			success: function(data){
+				// what is the currently selected activity?
+				var selected_activity = $('#activity_'+id+' option:selected').html();
+				// clear the list
+				$('#activity_'+id).html('');
+				for(var i = 0; i < data.length; i++)
 				{
 					// create a new option
-					var option = document.createElement("OPTION");
-					option.value = data.projects[j].id;
-					option.innerHTML = data.projects[j].name;
+					var option = document.createElement('option');
+					$(option).val(data[i].id);
+					$(option).html(data[i].name);
 
-					if(data.projects[j].member == false || data.projects[j].active != 1){
-						$(option).attr('disabled', 'disabled');
-					}
-				
-					// if this project is the same that our entry is assigned to, select it.
-					if(option.value == entries[i].project)
-						option.selected = "SELECTED";
+					// do we select it?
+					if(data[i].name == selected_activity)
+						$(option).attr('selected', 'selected');
 
-					// add this option to our select
-					$(proj).append(option);
+					// add it to our list!
+					$('#activity_'+id).append(option);
 				}
+			},
+			error: function(){
+				console.log("Failed to get activities for this project.");
+			}
+		});
+	});
 
-				// add some functionality to the dropdown (if they select "MyTimeOff", then
-				// the corresponding "Activity" should only be "Support (Nonbillable)")
-				$(proj).change(function(){
-					var id = this.id.split('_')[1];
-					var project_id = $(this).val();
-					$.ajax({
-						url: '../get_activities?project='+project_id,
-						dataType: 'json',
-						success: function(data){
-							// what is the currently selected activity?
-							var selected_activity = $('#activity_'+id+' option:selected').html();
-							// clear the list
-							$('#activity_'+id).html('');
-							for(var i = 0; i < data.length; i++)
-							{
-								// create a new option
-								var option = document.createElement('option');
-								$(option).val(data[i].id);
-								$(option).html(data[i].name);
-
-								// do we select it?
-								if(data[i].name == selected_activity)
-									$(option).attr('selected', 'selected');
-
-								// add it to our list!
-								$('#activity_'+id).append(option);
-							}
-						},
-						error: function(){
-							console.log("Failed to get activities for this project.");
-						}
-					});
-				});
+	// add this drop-down to the div
+	$(proj_cell).append(proj);
+    $(div).append(proj_cell);
 
-				// add this drop-down to the div
-				$(proj_cell).append(proj);
-                $(div).append(proj_cell);
-
-				//---------- Entry Date ------------//
-                var day_cell = document.createElement("td");
-				var day = document.createElement("INPUT");
-				day.type = "text";
-				day.className = "entry_date";
-				day.value = entries[i].date;
-				day.id = "entry_date_"+entries[i].id;
-				$(day_cell).addClass("col-lg-1");
-				$(day).addClass("form-control");
-
-				// add it to the div
-                $(day_cell).append(day);
-				$(div).append(day_cell);
-
-
-				//----------- Hours ------------//
-                var hours_cell = document.createElement("td");
-				var hours = document.createElement("INPUT");
-				hours.type = "text";
-				hours.className = "entry_hours";
-				hours.value = entries[i].hours;
-				hours.id = "entry_hours_"+entries[i].id;
-				// $(hours).css('width', '50px');
-				$(hours).addClass('form-control');
-
-				// add it to the div
-                $(hours_cell).append(hours);
-                $(hours_cell).addClass("col-lg-1");
-				$(div).append(hours_cell);
-
-
-
-				//----------- Comments ------------//
-                var comments_cell = document.createElement("td");
-				var comments = document.createElement("INPUT");
-				comments.type = "text";
-				comments.className = "comment";
-				comments.value = entries[i].comments;
-				comments.id = "comment_"+entries[i].id;
-				$(comments).css('width', '100%');
-				$(comments).addClass('form-control');
-
-				// add it to the div
-                $(comments_cell).append(comments);
-                $(comments_cell).addClass("col-lg-3");
-				$(div).append(comments_cell);
-	
-				
-				//----------- Issue ------------//
-                // var issue_cell = document.createElement("td");
-				// var issue = document.createElement("INPUT");
-				// issue.type = "text";
-				// issue.className = "entry_issue";
-				// issue.value = entries[i].issue;
-				// issue.id = "issue_"+entries[i].id;
-                //
-				// // add it to the div
-                // $(issue_cell).append(issue);
-				// $(div).append(issue_cell);
-		
+	//---------- Entry Date ------------//
+    var day_cell = document.createElement("td");
+	var day = document.createElement("INPUT");
+	day.type = "text";
+	day.className = "entry_date";
+	day.value = entry.date;
+	day.id = "entry_date_"+entry.id;
+	$(day_cell).addClass("col-lg-1");
+	$(day).addClass("form-control");
 
-				//----------- Issue Link -------//
-				// var link = document.createElement("SPAN");
-				// link.className = "issue_link";
-				// if(issue.value != '')
-				// 	link.innerHTML = '<a href="https://redmine.crc.nd.edu/redmine/issues/'+entries[i].issue+'" target="_blank">&rarr;</a>';
-				//
-				// // add it to the div
-                // $(issue_cell).append(link);
-
-				//------------ Activity ------------//
-                var activity_cell = document.createElement("td");
-				var act = document.createElement("SELECT");
-				act.id = "activity_"+entries[i].id;
-				act.className = "activity_select";
-				$(act).addClass("form-control");
-
-				// options...get the activities of the given project
-				//
-				for(var j = 0; j < data.activities.length; j++)
-				{
-					// new option
-					var option = document.createElement("OPTION");
-					option.value = data.activities[j].id;
-					option.innerHTML = data.activities[j].name;
-					
-					// if this activity is the same that the entry was logged as, select it
-					if(option.innerHTML == entries[i].activity)
-						option.selected = "SELECTED";
+	// add it to the div
+    $(day_cell).append(day);
+	$(div).append(day_cell);
 
-					// add this option to our drop-down menu
-					$(act).append(option);
-				}
-				
-				// add the activity drop-down to our div
-                $(activity_cell).append(act);
-				$(activity_cell).addClass("col-lg-2");
-				$(div).append(activity_cell);
-		
-				//--------- Log As ----------------//
-                var logas_cell = document.createElement("td");
-				var logas = document.createElement("SELECT");
-				logas.id = "logas_"+entries[i].id;
-				logas.className = "logas_select";
-				$(logas).addClass("form-control");
-
-				// options...
-				for(var j = 0; j < LOGAS_LIST.length; j++)
-				{
-					// new option
-					var option = document.createElement("OPTION");
-					option.value = LOGAS_LIST[j].name;
-					option.innerHTML = LOGAS_LIST[j].name;
 
-					if(option.innerHTML == entries[i].logas)
-						option.selected = "SELECTED";
-	
-					// add this option to our drop-down menu
-					$(logas).append(option);
-				}
+	//----------- Hours ------------//
+    var hours_cell = document.createElement("td");
+	var hours = document.createElement("INPUT");
+	hours.type = "text";
+	hours.className = "entry_hours";
+	hours.value = entry.hours;
+	hours.id = "entry_hours_"+entry.id;
+	// $(hours).css('width', '50px');
+	$(hours).addClass('form-control');
 
-				// add the "log as" drop-down to our div
-                $(logas_cell).append(logas);
-				$(logas_cell).addClass("col-lg-2");
-				$(div).append(logas_cell);
+	// add it to the div
+    $(hours_cell).append(hours);
+    $(hours_cell).addClass("col-lg-1");
+	$(div).append(hours_cell);
 
 
-				//-------- Delete ---------//
-                var delete_cell = document.createElement("td");
-				var del = document.createElement("button");
-				del.id = "delete_"+entries[i].id;
-				del.className = "delete_button";
-				$(del).html("Delete");
-			
-				// add the delete button to our div
-                $(delete_cell).append(del);
-                $(delete_cell).addClass('col-lg-1');
-				$(div).append(delete_cell);
 
-				// add this div to our project list
-				$('#entry_list').append(div);
+	//----------- Comments ------------//
+    var comments_cell = document.createElement("td");
+	var comments = document.createElement("INPUT");
+	comments.type = "text";
+	comments.className = "comment";
+	comments.value = entry.comments;
+	comments.id = "comment_"+entry.id;
+	$(comments).css('width', '100%');
+	$(comments).addClass('form-control');
 
-			}
-			
-			// setup other widgets, etc
-			SetupEntries();
-		},
-		error: function(data){
-			if(data.responseText == "I'm afraid I can't do that...")
+	// add it to the div
+    $(comments_cell).append(comments);
+    $(comments_cell).addClass("col-lg-3");
+	$(div).append(comments_cell);
+
+
+	//----------- Issue ------------//
+    // var issue_cell = document.createElement("td");
+	// var issue = document.createElement("INPUT");
+	// issue.type = "text";
+	// issue.className = "entry_issue";
+	// issue.value = entry.issue;
+	// issue.id = "issue_"+entry.id;
+    //
+	// // add it to the div
+    // $(issue_cell).append(issue);
+	// $(div).append(issue_cell);
+
+
+	//----------- Issue Link -------//
+	// var link = document.createElement("SPAN");
+	// link.className = "issue_link";
+	// if(issue.value != '')
+	// 	link.innerHTML = '<a href="https://redmine.crc.nd.edu/redmine/issues/'+entry.issue+'" target="_blank">&rarr;</a>';
+	//
+	// // add it to the div
+    // $(issue_cell).append(link);
+
+	//------------ Activity ------------//
+    var activity_cell = document.createElement("td");
+	var act = document.createElement("SELECT");
+	act.id = "activity_"+entry.id;
+	act.className = "activity_select";
+	$(act).addClass("form-control");
+
+	// options...get the activities of the given project
+	//
+	for(var j = 0; j < ACTIVITY_LIST.length; j++)
+	{
+		// new option
+		var option = document.createElement("OPTION");
+		option.value = ACTIVITY_LIST[j].id;
+		option.innerHTML = ACTIVITY_LIST[j].name;
+
+		// if this activity is the same that the entry was logged as, select it
+		if(option.innerHTML == entry.activity)
+			option.selected = "SELECTED";
+
+		// add this option to our drop-down menu
+		$(act).append(option);
+	}
+
+	// add the activity drop-down to our div
+    $(activity_cell).append(act);
+	$(activity_cell).addClass("col-lg-2");
+	$(div).append(activity_cell);
+
+	//--------- Log As ----------------//
+    var logas_cell = document.createElement("td");
+	var logas = document.createElement("SELECT");
+	logas.id = "logas_"+entry.id;
+	logas.className = "logas_select";
+	$(logas).addClass("form-control");
+
+	// options...
+	for(var j = 0; j < LOGAS_LIST.length; j++)
+	{
+		// new option
+		var option = document.createElement("OPTION");
+		option.value = LOGAS_LIST[j].name;
+		option.innerHTML = LOGAS_LIST[j].name;
+
+		if(option.innerHTML == entry.logas)
+			option.selected = "SELECTED";
+
+		// add this option to our drop-down menu
+		$(logas).append(option);
+	}
+
+	// add the "log as" drop-down to our div
+    $(logas_cell).append(logas);
+	$(logas_cell).addClass("col-lg-2");
+	$(div).append(logas_cell);
+
+
+	//-------- Delete ---------//
+    var delete_cell = document.createElement("td");
+	var del = document.createElement("button");
+	del.id = "delete_"+entry.id;
+	del.className = "delete_button";
+	$(del).html("Delete");
+
+	// add the delete button to our div
+    $(delete_cell).append(del);
+    $(delete_cell).addClass('col-lg-1');
+	$(div).append(delete_cell);
+
+	return div;
+}
+
+// bring the list up to date after an edit: only the entries changed since our token (by us or anyone else) come
+// back, along with the ids of the ones that are gone or moved out of the range
+function SyncEntries()
+{
+	// which target should we use?
+	var target_user = $('#username').val();
+	if(TARGET != '')
+	{
+		target_user = TARGET;
+	}
+
+	var start_range = $('#date_range').val().split(' - ')[0];
+	var end_range = $('#date_range').val().split(' - ')[1];
+	$.ajax({
+		url: '../sync_entries',
+		data: {start: start_range, end: end_range, target: target_user, token: SYNC_TOKEN},
+		dataType: 'json',
+		success: function(data){
+			// our token is too old to catch up from, so start over
+			if(data.reset)
 			{
-				document.write('<img src="/reports/media/img/no.png" />');
-				document.close();
+				GetEntries();
 				return;
 			}
-			alert("Failed to retrieve your time entries.  Please contact the system administrator.");
+			SYNC_TOKEN = data.token;
+
+			for(var i = 0; i < data.deleted.length; i++)
+			{
+				$('#row_'+data.deleted[i]).remove();
+				delete ENTRIES[data.deleted[i]];
+			}
+
+			for(var i = 0; i < data.entries.length; i++)
+			{
+				var entry = data.entries[i];
+				ENTRIES[entry.id] = entry;
+
+				// don't throw away changes that haven't been saved yet
+				if(UpdateEntries.indexOf(String(entry.id)) >= 0)
+					continue;
+
+				var row = EntryRow(entry);
+				if($('#row_'+entry.id).length > 0)
+					$('#row_'+entry.id).replaceWith(row);
+				else
+					$('#entry_list').append(row);
+				SetupEntries(row);
+			}
+
+			// update the totals
+			var total_hours = 0;
+			var support = 0;
+			for(var id in ENTRIES)
+			{
+				if(ENTRIES[id].activity.toLowerCase().indexOf('non-billable') >= 0)
+					support += ENTRIES[id].hours;
+				else
+					total_hours += ENTRIES[id].hours;
+			}
+			$('#billable_hours').html(Math.round(total_hours * 100) / 100);
+			$('#support_hours').html(Math.round(support * 100) / 100);
+			$('#total_hours').html(Math.round((total_hours + support) * 100) / 100);
+		},
+		error: function(){
+			console.log("Failed to sync time entries.");
 		}
 	});
 }
 
-function SetupEntries()
+// scope: the rows to set up (all of them if it's left out)
+function SetupEntries(scope)
 {
 	
 	//-------------- Setup Datepicker objects for each of the Dates listed -------------------------------//
-	$('.entry_date').each(function(){
+	$('.entry_date', scope).each(function(){
 		$(this).datepicker({
 			dateFormat: "yy-mm-dd"
 		});
@@ -656,45 +745,45 @@ function SetupEntries()
 
 	//-------------------- Setup "onchange" events for all entry-specific elements --------------------------------------//
 	// for projects
-	$('.project_select').each(function(){
+	$('.project_select', scope).each(function(){
 		$(this).change(function(){
 			EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
 		});
 	});
 	// for dates
-	$('.entry_date').each(function(){
+	$('.entry_date', scope).each(function(){
 		$(this).change(function(){
 			EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
 		});
 	});
 	// for hours
-	$('.entry_hours').each(function(){
+	$('.entry_hours', scope).each(function(){
                 $(this).change(function(){
                         EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
                 });
         });
 	// for comments
-	$('.comment').each(function(){
+	$('.comment', scope).each(function(){
                 $(this).change(function(){
                         EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
                 });
         });
 	// for activity
-	$('.activity_select').each(function(){
+	$('.activity_select', scope).each(function(){
                 $(this).change(function(){
                         EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
                 });
         });
 
 	// for log as
-	$('.logas_select').each(function(){
+	$('.logas_select', scope).each(function(){
 		$(this).change(function(){
 			EntryChanged(this.parentNode.parentNode.id.split('_')[1]);
 		});
 	});
 
 	// for delete
-	$('.delete_button').each(function(){
+	$('.delete_button', scope).each(function(){
 		$(this).click(function(){
 			DeleteEntry(this.parentNode.parentNode.id);
 		});
@@ -951,7 +1040,7 @@ function DeleteEntry(id)
 				if(data == '200')
 				{
 					alert("Time entry removed!");
-					GetEntries();			
+					SyncEntries();
 				}
 				if(data == 'Error 97')
 				{
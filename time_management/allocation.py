@@ -0,0 +1,93 @@
+import datetime
+from itertools import groupby
+
+from django.db import connection
+
+# a developer is over-allocated once their assignments add up to more than this (1.0 = 100%)
+OVER_ALLOCATION_LIMIT = 1.0
+
+# percentages are stored as floats, so ignore anything smaller than this when comparing loads
+TOLERANCE = 0.000001
+
+
+def allocation_segments(intervals):
+    """
+    Sweeps over a list of (from, to, percentage) intervals (dates are inclusive) and returns the maximal
+    (start, end, load) spans where the combined load is constant and non-zero.  Runs in O(n log n) for n intervals
+    no matter how many days they cover.
+    """
+    events = {}
+    for start, end, percentage in intervals:
+        if start > end:
+            continue
+        events[start] = events.get(start, 0.0) + float(percentage)
+        stop = end + datetime.timedelta(days=1)
+        events[stop] = events.get(stop, 0.0) - float(percentage)
+
+    segments = []
+    load = 0.0
+    previous = None
+    for day in sorted(events):
+        if previous is not None and abs(load) > TOLERANCE:
+            last = day - datetime.timedelta(days=1)
+            if len(segments) > 0 and segments[-1][1] == previous - datetime.timedelta(days=1) \
+                    and abs(segments[-1][2] - load) <= TOLERANCE:
+                # the load didn't actually change (an assignment ended as another started), so keep extending
+                segments[-1] = (segments[-1][0], last, segments[-1][2])
+            else:
+                segments.append((previous, last, round(load, 6)))
+        load += events[day]
+        previous = day
+
+    return segments
+
+
+def over_allocated_spans(intervals, limit=OVER_ALLOCATION_LIMIT):
+    """
+    Returns every maximal span where the intervals add up to more than the limit, along with the peak load reached
+    within that span.
+    """
+    spans = []
+    for start, end, load in allocation_segments(intervals):
+        if load <= limit + TOLERANCE:
+            continue
+        if len(spans) > 0 and spans[-1]['end'] == start - datetime.timedelta(days=1):
+            spans[-1]['end'] = end
+            spans[-1]['peak'] = max(spans[-1]['peak'], load)
+        else:
+            spans.append({'start': start, 'end': end, 'peak': load})
+
+    return spans
+
+
+def get_over_allocations(since=None, limit=OVER_ALLOCATION_LIMIT, cur=None):
+    """
+    Finds every developer whose project_distribution assignments push them above the limit.  Rows are streamed in
+    developer order, so only one developer's intervals are held at a time.
+    :param since: ignore anything that ends before this date (None checks all of history)
+    :return: List of developers with their over-allocated spans
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    if since is None:
+        since = datetime.date.min
+
+    cur.execute(
+        'SELECT project_distribution.user, users.firstname||\' \'||users.lastname, '
+        'GREATEST("from", %s), "to", percentage FROM project_distribution '
+        'INNER JOIN users ON users.id = project_distribution.user '
+        'WHERE "to" >= %s ORDER BY project_distribution.user;', [since, since])
+
+    developers = []
+    for (user_id, name), rows in groupby(cur, key=lambda row: (row[0], row[1])):
+        spans = over_allocated_spans([(row[2], row[3], row[4]) for row in rows], limit)
+        if len(spans) == 0:
+            continue
+        developers.append({
+            'developer_id': user_id,
+            'developer': name,
+            'spans': spans
+        })
+
+    return developers
@@ -0,0 +1,128 @@
+import bisect
+import threading
+
+from django.db import connection
+
+from time_management.allocation import allocation_segments
+
+
+class DeveloperLoad:
+    """
+    A developer's allocation as sorted, non-overlapping (start, end, load) spans, with a sparse table over the loads
+    so the peak load across any date range is found with two binary searches and one lookup.
+    """
+    def __init__(self, segments):
+        self.starts = [segment[0] for segment in segments]
+        self.ends = [segment[1] for segment in segments]
+
+        # table[k][i] holds the max load of the 2^k spans starting at i
+        self.table = [[segment[2] for segment in segments]]
+        width = 1
+        while width * 2 <= len(segments):
+            previous = self.table[-1]
+            self.table.append([max(previous[i], previous[i + width]) for i in range(len(previous) - width)])
+            width *= 2
+
+    def peak(self, start, end):
+        """
+        Returns the highest load the developer reaches between start and end (inclusive).  Days between spans carry
+        no load, so only the spans overlapping the range matter.
+        """
+        first = bisect.bisect_left(self.ends, start)
+        last = bisect.bisect_right(self.starts, end) - 1
+        if first > last:
+            return 0.0
+
+        level = (last - first + 1).bit_length() - 1
+        return max(self.table[level][first], self.table[level][last - (1 << level) + 1])
+
+
+class AvailabilityIndex:
+    """
+    Answers "who has at least X free between these dates?" for every active programmer.
+
+    Each developer's spans are rebuilt on their own: assignments changed through this process mark the developer
+    stale directly, and a per-developer checksum of project_distribution catches changes made by other processes.
+    """
+    def __init__(self):
+        self.developers = {}
+        self.names = {}
+        self.signatures = {}
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def invalidate_developer(self, user_id):
+        self.stale.add(int(user_id))
+
+    def invalidate(self):
+        self.signatures = {}
+
+    def refresh(self, cur=None):
+        """
+        Compares each active programmer's assignment checksum with the one we built from and reloads only those that
+        changed (all of them on the first call).
+        """
+        if cur is None:
+            cur = connection.cursor()
+
+        cur.execute(
+            'SELECT programmers.user_id, users.firstname||\' \'||users.lastname, count(project_distribution.id), '
+            'COALESCE(sum(project_distribution.id), 0), COALESCE(sum(percentage), 0), '
+            'COALESCE(sum("from" - DATE \'2000-01-01\'), 0), COALESCE(sum("to" - DATE \'2000-01-01\'), 0) '
+            'FROM programmers INNER JOIN users ON users.id = programmers.user_id '
+            'LEFT JOIN project_distribution ON project_distribution.user = programmers.user_id '
+            'WHERE programmers.active = TRUE '
+            'GROUP BY programmers.user_id, users.firstname, users.lastname;')
+        signatures = {}
+        names = {}
+        for row in cur.fetchall():
+            signatures[row[0]] = tuple(row[2:])
+            names[row[0]] = row[1]
+
+        with self.lock:
+            changed = [user_id for user_id in signatures
+                       if user_id in self.stale or self.signatures.get(user_id) != signatures[user_id]]
+
+            # drop anyone who is no longer an active programmer
+            for user_id in list(self.developers):
+                if user_id not in signatures:
+                    del self.developers[user_id]
+
+            if len(changed) > 0:
+                cur.execute('SELECT "user", "from", "to", percentage FROM project_distribution '
+                            'WHERE "user" = ANY(%s);', [changed])
+                intervals = dict((user_id, []) for user_id in changed)
+                for row in cur.fetchall():
+                    intervals[row[0]].append((row[1], row[2], row[3]))
+
+                for user_id in changed:
+                    self.developers[user_id] = DeveloperLoad(allocation_segments(intervals[user_id]))
+
+            self.names = names
+            self.signatures = signatures
+            self.stale = set()
+
+    def available(self, start, end, min_free=0.0):
+        """
+        Returns the active programmers with at least min_free capacity (1.0 = 100%) on every day between start and
+        end, most available first.
+        """
+        self.refresh()
+
+        results = []
+        for user_id, load in self.developers.items():
+            free = round(1.0 - load.peak(start, end), 6)
+            if free < min_free:
+                continue
+            results.append({
+                'developer_id': user_id,
+                'developer': self.names[user_id],
+                'free': free
+            })
+
+        results.sort(key=lambda result: (-result['free'], result['developer']))
+        return results
+
+
+# shared by every request served by this process
+availability_index = AvailabilityIndex()
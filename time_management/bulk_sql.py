@@ -0,0 +1,16 @@
+"""
+Helpers for writing many rows with a single statement (multi-row INSERT, UPDATE ... FROM (VALUES ...)).
+"""
+
+
+def values_clause(rows, template):
+    """
+    Builds a VALUES list and its flattened parameters for the given rows.
+    :param rows: list of tuples, one per row
+    :param template: placeholder for one row, e.g. '(%s, %s::date)' (casts keep the column types when NULLs are passed)
+    :return: (sql, params) tuple, e.g. ('(%s, %s::date), (%s, %s::date)', [1, '2018-01-01', 2, '2018-02-01'])
+    """
+    params = []
+    for row in rows:
+        params.extend(row)
+    return ', '.join([template] * len(rows)), params
@@ -1,10 +1,21 @@
 from django.shortcuts import HttpResponse, render
-from django.db import connection
+from django.db import connection, transaction
+import calendar
 import datetime
 import json
 from django.contrib.auth.decorators import login_required
 from time_management.decorators import user_is_in_manager_group
 from time_management.time_tools import get_user_list, get_all_users
+from time_management.custom_fields import custom_field_registry
+from time_management.holidays import get_holidays
+from time_management.models import RedmineUser
+from time_management.time_entries import insert_entries, log_entry_changes, NO_ENTRY
+
+# what copy_range can copy
+COPY_UNITS = ('day', 'week', 'month')
+
+# the longest target range copy_range will fill (days)
+MAX_COPY_DAYS = 366
 
 
 @login_required
@@ -59,12 +70,12 @@ def update_entry_data(request):
     query = "UPDATE time_entries SET project_id = (SELECT id FROM projects WHERE name='%(project)s'), spent_on = " \
             "'%(date)s', hours = %(hours)s, comments = '%(comments)s', activity_id = %(activity)s, " \
             "tyear = %(year)s, " \
-            "tmonth = %(month)s, tweek = %(week)s WHERE id = %(entry_id)s RETURNING *;" % {
+            "tmonth = %(month)s, tweek = %(week)s, updated_on = '%(now)s' WHERE id = %(entry_id)s RETURNING *;" % {
                     'project': request.GET['project'], 'date': request.GET['date'],
                     'hours': float(request.GET['hours']),
                     'comments': request.GET['comments'].replace("'", "''"), 'activity': request.GET['activity'],
                     'entry_id': request.GET['id'], 'year': edate[0], 'month': edate[1],
-                    'week': entry_date.isocalendar()[1]}
+                    'week': entry_date.isocalendar()[1], 'now': datetime.datetime.now().isoformat()}
 
     # execute the query
     cur.execute(query)
@@ -164,3 +175,132 @@ def copy_entry(request):
     connection.commit()
 
     return HttpResponse(json.dumps(new_entry))
+
+
+def working_days(start, end):
+    """
+    The weekdays from start to end (inclusive) that aren't holidays.
+    """
+    holidays = set()
+    for year in range(start.year, end.year + 1):
+        holidays.update(holiday['date'] for holiday in get_holidays(year))
+
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5 and day not in holidays:
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def source_period(unit, source):
+    """
+    The first and last day of the day, week (Monday to Sunday) or month the source date falls in.
+    """
+    if unit == 'day':
+        return source, source
+    if unit == 'week':
+        monday = source - datetime.timedelta(days=source.weekday())
+        return monday, monday + datetime.timedelta(days=6)
+    first = source.replace(day=1)
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def source_days_for(unit, start, end, source_start, source_end):
+    """
+    Pairs each working day from start to end with the source day whose entries go on it: the source day itself, the
+    same weekday of the source week, or the source month's working day in the same position as the target day has
+    in its own month.
+    """
+    if unit == 'day':
+        return [(day, source_start) for day in working_days(start, end)]
+    if unit == 'week':
+        return [(day, source_start + datetime.timedelta(days=day.weekday())) for day in working_days(start, end)]
+
+    source_days = working_days(source_start, source_end)
+    pairs = []
+    position = 0
+    previous = None
+    # counted from the first of start's month, so positions match the source month's
+    for day in working_days(start.replace(day=1), end):
+        position = position + 1 if previous is not None and previous.month == day.month else 0
+        previous = day
+        if day >= start and position < len(source_days):
+            pairs.append((day, source_days[position]))
+    return pairs
+
+
+@login_required
+# @user_is_in_manager_group
+def copy_range(request):
+    """
+    Copies all of a user's entries from a source day, week or month (?unit=, ?source= any date in it) onto every
+    working day from ?start= to ?end= (yyyy-mm-dd), skipping weekends and holidays.  A day is copied onto each
+    target day, a week weekday by weekday, and a month by the position of each working day in its month.  Every copy
+    (entry and "log as" value) is inserted in one transaction.
+    """
+    unit = request.GET.get('unit', 'day')
+    if unit not in COPY_UNITS:
+        return HttpResponse(json.dumps({'error': 'Unknown unit "%s"' % unit}), status=400)
+
+    try:
+        source = datetime.datetime.strptime(request.GET['source'], '%Y-%m-%d').date()
+        start = datetime.datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+        end = datetime.datetime.strptime(request.GET.get('end', request.GET['start']), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return HttpResponse(json.dumps({'error': 'source and start (and optionally end) must be yyyy-mm-dd dates'}),
+                            status=400)
+
+    source_start, source_end = source_period(unit, source)
+    if end < start or (end - start).days >= MAX_COPY_DAYS:
+        return HttpResponse(json.dumps({'error': 'The target range must be 1 to %s days' % MAX_COPY_DAYS}), status=400)
+    if start <= source_end and end >= source_start:
+        return HttpResponse(json.dumps({'error': 'The target range overlaps the source'}), status=400)
+
+    target = request.user.username
+    if request.GET.get('target', '') != '':
+        target = request.GET['target']
+    try:
+        target_id = RedmineUser.objects.get(login=target).id
+    except RedmineUser.DoesNotExist:
+        return HttpResponse(json.dumps({'error': 'Unknown user'}), status=404)
+    if not request.user.is_staff and target_id not in get_user_list(username=request.user.username, as_json=True):
+        return HttpResponse("Error 97")
+
+    cur = connection.cursor()
+    logas_field = custom_field_registry.log_as_field(cur)
+
+    # every source entry, by day
+    cur.execute(
+        "SELECT time_entries.spent_on, time_entries.project_id, time_entries.hours, time_entries.comments, "
+        "time_entries.issue_id, time_entries.activity_id, COALESCE(custom_values.value, '') FROM time_entries "
+        "LEFT JOIN custom_values ON custom_values.customized_id = time_entries.id "
+        "AND custom_values.customized_type = 'TimeEntry' AND custom_values.custom_field_id = %s "
+        "WHERE time_entries.user_id = %s AND time_entries.spent_on >= %s AND time_entries.spent_on <= %s "
+        "ORDER BY time_entries.spent_on, time_entries.id;", [logas_field.id, target_id, source_start, source_end])
+    by_day = {}
+    for row in cur.fetchall():
+        by_day.setdefault(row[0], []).append(row[1:])
+
+    copies = []
+    for day, source_day in source_days_for(unit, start, end, source_start, source_end):
+        for entry in by_day.get(source_day, []):
+            copies.append({'project': entry[0], 'date': day.isoformat(), 'hours': entry[1], 'comments': entry[2],
+                           'issue': entry[3], 'activity': entry[4], 'logas': entry[5]})
+
+    ids = []
+    if len(copies) > 0:
+        now = datetime.datetime.now()
+        with transaction.atomic():
+            ids = insert_entries(copies, target_id, logas_field.id, now, cur)
+            # copies made on someone else's behalf are logged, as update_entries does
+            log_entry_changes(request.user.username, [(NO_ENTRY, copy, target) for copy in copies], now, cur)
+
+    context = {
+        'copied': len(ids),
+        'ids': ids,
+        'dates': sorted(set(copy['date'] for copy in copies))
+    }
+
+    return HttpResponse(json.dumps(context))
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.db import connection
+
+
+# how long the activity catalog is trusted before its change stamp is checked again (seconds)
+ACTIVITY_CATALOG_TTL = 60
+
+
+class ActivityCatalog:
+    """
+    Every TimeEntryActivity enumeration, held in memory by the process: the default activities, each project's
+    switched-off activities and the distinct active activity names.
+
+    These rows almost never change, so the catalog is only checked against a cheap stamp of the enumerations every
+    ACTIVITY_CATALOG_TTL seconds, and reloaded when the stamp moved or it was invalidated explicitly.
+    """
+    def __init__(self, ttl=ACTIVITY_CATALOG_TTL):
+        self.ttl = ttl
+        self.stamp = None
+        self.checked_at = None
+        self.defaults = []
+        self.exclusions = {}
+        self.activities = []
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.checked_at = None
+        self.stamp = None
+
+    def refresh(self, cur=None):
+        now = time.time()
+        if self.checked_at is not None and now - self.checked_at < self.ttl:
+            return
+
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < self.ttl:
+                return
+            if cur is None:
+                cur = connection.cursor()
+
+            cur.execute("SELECT count(*), md5(string_agg(id || ':' || name || ':' || active || ':' || "
+                        "COALESCE(project_id, 0), ',' ORDER BY id)) "
+                        "FROM enumerations WHERE type = 'TimeEntryActivity';")
+            stamp = tuple(cur.fetchone())
+            if stamp != self.stamp:
+                self.load(cur)
+                self.stamp = stamp
+            self.checked_at = now
+
+    def load(self, cur):
+        cur.execute("SELECT id, name, active, project_id FROM enumerations WHERE type = 'TimeEntryActivity' "
+                    "ORDER BY id;")
+        defaults = []
+        exclusions = {}
+        names = {}
+        for row in cur.fetchall():
+            if row[2] and row[3] is None:
+                defaults.append({'id': row[0], 'name': row[1]})
+            elif not row[2] and row[3] is not None:
+                exclusions.setdefault(row[3], set()).add(row[1])
+            if row[2] and row[1] not in names:
+                names[row[1]] = row[0]
+
+        self.defaults = defaults
+        self.exclusions = exclusions
+        self.activities = [{'id': names[name], 'name': name} for name in sorted(names)]
+
+    def get_defaults(self):
+        self.refresh()
+        return self.defaults
+
+    def get_exclusions(self, project_id):
+        self.refresh()
+        return self.exclusions.get(project_id, set())
+
+    def get_activities(self):
+        """
+        Returns every active activity name with the lowest id using it, ordered by name.
+        """
+        self.refresh()
+        return [dict(activity) for activity in self.activities]
+
+
+# shared by every request served by this process
+activity_catalog = ActivityCatalog()
+
+
+def get_memberships(project_ids, login, cur):
+    """
+    Returns the subset of the given projects the user is a member of.
+    """
+    if len(project_ids) == 0:
+        return set()
+
+    cur.execute("SELECT members.project_id FROM members INNER JOIN users ON users.id = members.user_id "
+                "WHERE users.login = %s AND members.project_id = ANY(%s);", [login, list(project_ids)])
+    return set(row[0] for row in cur.fetchall())
+
+
+def project_activities(defaults, excluded):
+    """
+    A project's effective activities: the defaults minus the ones it has switched off.
+    """
+    return [dict(activity) for activity in defaults if activity['name'] not in excluded]
+
+
+def build_project_catalog(project_ids, login=None, cur=None):
+    """
+    Builds {project id: {'member', 'activities'}} for every given project.  Activities come from the cached activity
+    catalog; the only query is for the user's memberships, when a login is given.
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    project_ids = set(project_ids)
+    activity_catalog.refresh(cur)
+    defaults = activity_catalog.get_defaults()
+    memberships = get_memberships(project_ids, login, cur) if login is not None else set()
+
+    catalog = {}
+    for project_id in project_ids:
+        catalog[project_id] = {
+            'member': project_id in memberships,
+            'activities': project_activities(defaults, activity_catalog.get_exclusions(project_id))
+        }
+    return catalog
@@ -0,0 +1,67 @@
+"""
+An optional, smaller encoding for the responses that list many rows (?format=compact).
+
+Instead of a list of objects that repeat every key, a list is sent as columns:
+
+    {"columns": ["id", "name", "hours"],
+     "values": [[1, 2, 3], [0, 1, 0], [2.5, 1.0, 4.0]],
+     "dictionaries": {"name": ["Project A", "Project B"]}}
+
+Row i is (values[0][i], values[1][i], ...).  A column listed in "dictionaries" holds indexes into that list rather
+than the values themselves, so a name shared by many rows is only sent once.
+"""
+import datetime
+import decimal
+import json
+
+COMPACT_FORMAT = 'compact'
+
+# keys and values are separated by a bare ',' and ':'
+COMPACT_SEPARATORS = (',', ':')
+
+
+class CompactEncoder(json.JSONEncoder):
+    """
+    Encodes Decimals as numbers and dates as ISO strings, so rows can be passed straight from the cursor.  It only
+    adds a default() hook, which keeps the json module on its C encoder.
+    """
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            return float(o)
+        if isinstance(o, (datetime.date, datetime.datetime)):
+            return o.isoformat()
+        return json.JSONEncoder.default(self, o)
+
+
+def dumps(obj):
+    return json.dumps(obj, cls=CompactEncoder, separators=COMPACT_SEPARATORS)
+
+
+def wants_compact(request):
+    return request.GET.get('format') == COMPACT_FORMAT
+
+
+def columnar(rows, columns, dictionary=()):
+    """
+    Turns rows (tuples in the order of columns) into the columnar form described above.
+    :param rows: list of tuples
+    :param columns: the name of each position in a row
+    :param dictionary: names of the columns whose values should be dictionary-encoded
+    """
+    values = [list(column) for column in zip(*rows)] if len(rows) > 0 else [[] for _ in columns]
+
+    dictionaries = {}
+    for name in dictionary:
+        i = columns.index(name)
+        index = {}
+        words = []
+        encoded = []
+        for value in values[i]:
+            if value not in index:
+                index[value] = len(words)
+                words.append(value)
+            encoded.append(index[value])
+        values[i] = encoded
+        dictionaries[name] = words
+
+    return {'columns': list(columns), 'values': values, 'dictionaries': dictionaries}
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from django.db import connection
+
+# Redmine custom fields the app relies on, by id
+FOPAL_FIELD = 4
+PI_FIELD = 6
+FINANCIAL_PI_FIELD = 10
+MISSING_HOURS_FIELD = 11
+BUDGET_FIELD = 12
+SPENT_FIELD = 13
+START_DATE_FIELD = 15
+END_DATE_FIELD = 16
+PLANNING_FIELD = 17
+REQUIRED_EFFORT_FIELD = 18
+WEEKLY_REPORT_FIELD = 19
+
+# ...and by name
+LOG_AS_FIELD_NAMES = ('Task', 'Log As')
+SUPERVISOR_EMAILS_FIELD_NAME = 'Supervisor Notification Emails'
+MINIMUM_HOURS_FIELD_NAME = 'Minimum Weekly Hours Required'
+
+# how long the registry is trusted before custom_fields is read again (seconds)
+CUSTOM_FIELD_TTL = 300
+
+
+def parse_possible_values(possible_values):
+    """
+    Redmine keeps a list field's options as a YAML list (a "---" line, then a "- value" line per option); returns
+    them as a list of strings.
+    """
+    values = []
+    for line in (possible_values or '').split('\n'):
+        line = line.rstrip('\r')
+        if not line.startswith('- '):
+            continue
+        value = line[2:]
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        if value != '':
+            values.append(value)
+    return values
+
+
+class CustomField:
+    def __init__(self, field_id, name, field_type, possible_values, default_value):
+        self.id = field_id
+        self.name = name
+        self.type = field_type
+        self.possible_values = parse_possible_values(possible_values)
+        self.default_value = default_value
+
+
+class CustomFieldRegistry:
+    """
+    Every row of custom_fields, loaded once per process and reloaded after CUSTOM_FIELD_TTL seconds.  Fields can be
+    looked up by id or by (case-insensitive) name and their possible values come pre-parsed.
+    """
+    def __init__(self, ttl=CUSTOM_FIELD_TTL):
+        self.ttl = ttl
+        self.loaded_at = None
+        self.by_id = {}
+        self.by_name = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def refresh(self, cur=None):
+        now = time.time()
+        if self.loaded_at is not None and now - self.loaded_at < self.ttl:
+            return
+
+        with self.lock:
+            if self.loaded_at is not None and now - self.loaded_at < self.ttl:
+                return
+            if cur is None:
+                cur = connection.cursor()
+
+            cur.execute('SELECT id, name, type, possible_values, default_value FROM custom_fields ORDER BY id;')
+            by_id = {}
+            by_name = {}
+            for row in cur.fetchall():
+                field = CustomField(row[0], row[1], row[2], row[3], row[4])
+                by_id[field.id] = field
+                by_name.setdefault((field.name.lower(), field.type), field)
+                by_name.setdefault((field.name.lower(), None), field)
+
+            self.by_id = by_id
+            self.by_name = by_name
+            self.loaded_at = now
+
+    def get(self, field_id, cur=None):
+        self.refresh(cur)
+        return self.by_id.get(field_id)
+
+    def find(self, name, field_type=None, cur=None):
+        """
+        Returns the field with the given name (and type, if given), or None.
+        """
+        self.refresh(cur)
+        return self.by_name.get((name.lower(), field_type))
+
+    def field_id(self, name, field_type=None, cur=None):
+        field = self.find(name, field_type, cur)
+        return field.id if field is not None else None
+
+    def field_name(self, field_id, cur=None):
+        field = self.get(field_id, cur)
+        return field.name if field is not None else None
+
+    def possible_values(self, name, cur=None):
+        field = self.find(name, cur=cur)
+        return list(field.possible_values) if field is not None else []
+
+    def log_as_field(self, cur=None):
+        """
+        The field time entries are categorized with, called "Task" or "Log As" depending on the install.
+        """
+        for name in LOG_AS_FIELD_NAMES:
+            field = self.find(name, cur=cur)
+            if field is not None:
+                return field
+        return None
+
+
+# shared by every request served by this process
+custom_field_registry = CustomFieldRegistry()
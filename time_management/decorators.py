@@ -1,7 +1,24 @@
+import hashlib
+
 from django.http import HttpResponseRedirect
-from django.db import connection
+from django.db import connection, transaction
+from django.views.decorators.http import condition
 from pr.settings.base import LOGIN_URL
 
+# the tables each polled endpoint reads; their versions (see table_watermark) make up the endpoint's validator.
+# Endpoints served from a process cache that doesn't follow these tables (like the activity catalog) can't be listed
+# here.
+WATERMARK_TABLES = {
+    'dates': ('entry_periods',),
+    'entities': ('activity_recency', 'projects', 'users', 'members', 'time_management_team',
+                 'time_management_teammember'),
+    'distribution': ('time_entries', 'projects', 'users', 'custom_values', 'time_management_team',
+                     'time_management_teammember'),
+    'teams': ('users', 'time_management_team', 'time_management_teammember'),
+    'project_hours': ('time_entries', 'users'),
+}
+
+
 def user_is_in_manager_group(function):
     def wrap(request, *args, **kwargs):
         username = request.user.username
@@ -28,4 +45,73 @@ def user_is_in_manager_group(function):
         # return function(request, *args, **kwargs)
     wrap.__doc__ = function.__doc__
     wrap.__name__ = function.__name__
-    return wrap
\ No newline at end of file
+    return wrap
+
+
+def install_table_versions(cur=None):
+    """
+    Creates (or replaces) the statement triggers that bump a table's row in table_versions whenever it is written,
+    for every table in WATERMARK_TABLES.  The bump commits with the write, so a validator can never get ahead of
+    (or fall behind) the data; writers to the same table wait for each other's bump only until they commit.
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    tables = sorted(set(table for tables in WATERMARK_TABLES.values() for table in tables))
+    with transaction.atomic():
+        cur.execute("CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ "
+                    "BEGIN "
+                    "UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME; "
+                    "RETURN NULL; "
+                    "END $$ LANGUAGE plpgsql;")
+        cur.execute("INSERT INTO table_versions (name, version) SELECT unnest(%s::varchar[]), 0 "
+                    "ON CONFLICT (name) DO NOTHING;", [tables])
+        for table in tables:
+            cur.execute("DROP TRIGGER IF EXISTS table_version_bump ON %s; "
+                        "CREATE TRIGGER table_version_bump AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %s "
+                        "FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version();" % (table, table))
+
+
+def table_watermark(tables, cur):
+    """
+    Returns a value that changes whenever one of the tables is written (their versions in table_versions), or None
+    if a table has no version yet because install_table_versions hasn't covered it.
+    """
+    cur.execute("SELECT array_agg(name || ':' || version ORDER BY name), count(*) FROM table_versions "
+                "WHERE name = ANY(%s);", [list(tables)])
+    versions, found = cur.fetchone()
+    if found < len(set(tables)):
+        return None
+    return versions
+
+
+def watermark_key(endpoint, cur):
+    """
+    A short string that changes with the endpoint's table watermark, or None without one.  Caches kept by an
+    endpoint's view put it in their keys, so a cached response is never served under a newer ETag than the data it
+    was built from.
+    """
+    watermark = table_watermark(WATERMARK_TABLES[endpoint], cur)
+    if watermark is None:
+        return None
+    return hashlib.md5(repr(watermark)).hexdigest()
+
+
+def conditional_get(endpoint):
+    """
+    Lets a client that already holds the current response get a 304 instead: the ETag is a hash of the endpoint's
+    table watermark (see WATERMARK_TABLES), the user and the query string, and the view only runs when the client's
+    If-None-Match doesn't match it.  Without a watermark no ETag is sent and every request runs the view.  Put it
+    below login_required, so anonymous requests never reach the database.
+    """
+    tables = WATERMARK_TABLES[endpoint]
+
+    def etag(request, *args, **kwargs):
+        cur = connection.cursor()
+        watermark = table_watermark(tables, cur)
+        if watermark is None:
+            return None
+        validator = [endpoint, request.user.username, request.user.is_staff, sorted(request.GET.lists()), watermark]
+        return hashlib.md5(repr(validator)).hexdigest()
+
+    return condition(etag_func=etag)
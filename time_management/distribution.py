@@ -3,7 +3,7 @@ from django.db import connection
 import json
 
 from django.contrib.auth.decorators import login_required
-from time_management.decorators import user_is_in_manager_group
+from time_management.decorators import user_is_in_manager_group, conditional_get
 from time_management.time_tools import get_user_list, get_all_users
 
 @login_required
@@ -27,6 +27,7 @@ def distribution_home(request):
 
 @login_required
 # @user_is_in_manager_group
+@conditional_get('entities')
 def get_entries(request):
     # first check to make sure we have all we need
     # do we have a date range?
@@ -47,40 +48,30 @@ def get_entries(request):
     # connect to the database
     cur = connection.cursor()
 
-    query = ''
+    # rank by the activity index (kept up to date by triggers on time_entries): anything with time logged
+    # across the date range comes first
+    params = [request.GET['start_date'], request.GET['end_date']]
     if request.GET['type'] == 'project':
-        if request.user.is_staff:
-            query = "select distinct(projects.name), projects.id, CASE WHEN time_entries.spent_on >= '%(start)s' and " \
-                    "time_entries.spent_on <= '%(end)s' THEN 2 ELSE 1 end AS t from projects inner join time_entries " \
-                    "on time_entries.project_id = projects.id ORDER BY t desc, projects.name;" % {
-                        'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        else:
-            user_list = get_user_list(username=request.user.username)
-            query = "select distinct(projects.name), projects.id, CASE WHEN time_entries.spent_on >= '%(start)s' and " \
-                    "time_entries.spent_on <= '%(end)s' THEN 2 ELSE 1 end AS t " \
-                    "from projects " \
-                    "inner join time_entries on time_entries.project_id = projects.id " \
-                    "inner join members ON members.project_id = projects.id " \
-                    "WHERE members.user_id in %(users)s " \
-                    "ORDER BY t desc, projects.name;" % {
-                        'start': request.GET['start_date'], 'end': request.GET['end_date'], 'users': user_list}
+        query = "SELECT projects.name, projects.id, CASE WHEN activity_recency.last_spent_on >= %s::date AND " \
+                "activity_recency.first_spent_on <= %s::date THEN 2 ELSE 1 END AS t FROM activity_recency " \
+                "INNER JOIN projects ON projects.id = activity_recency.object_id " \
+                "WHERE activity_recency.kind = 'project' "
+        if not request.user.is_staff:
+            query += "AND projects.id IN (SELECT project_id FROM members WHERE user_id = ANY(%s)) "
+            params.append(get_user_list(username=request.user.username, as_json=True))
+        query += "ORDER BY t DESC, projects.name;"
     if request.GET['type'] == 'programmer':
-        if request.user.is_staff:
-            query = "select distinct(users.id), users.firstname, users.lastname, max(CASE WHEN " \
-                    "time_entries.spent_on >= '%(start)s' and time_entries.spent_on <= '%(end)s' THEN 2 ELSE 1 end) AS t " \
-                    "from users inner join time_entries on time_entries.user_id = users.id " \
-                    "GROUP BY users.id, users.firstname, users.lastname ORDER BY t desc, users.firstname;" % {
-                        'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        else:
-            user_list = get_user_list(username=request.user.username)
-            query = "select distinct(users.id), users.firstname, users.lastname, max(CASE WHEN " \
-                    "time_entries.spent_on >= '%(start)s' and time_entries.spent_on <= '%(end)s' THEN 2 ELSE 1 end) AS t " \
-                    "from users inner join time_entries on time_entries.user_id = users.id " \
-                    "WHERE users.id in %(users)s " \
-                    "GROUP BY users.id, users.firstname, users.lastname ORDER BY t desc, users.firstname;" % {
-                        'start': request.GET['start_date'], 'end': request.GET['end_date'], 'users': user_list}
-
-    cur.execute(query)
+        query = "SELECT users.id, users.firstname, users.lastname, " \
+                "CASE WHEN activity_recency.last_spent_on >= %s::date AND " \
+                "activity_recency.first_spent_on <= %s::date THEN 2 ELSE 1 END AS t FROM activity_recency " \
+                "INNER JOIN users ON users.id = activity_recency.object_id " \
+                "WHERE activity_recency.kind = 'user' "
+        if not request.user.is_staff:
+            query += "AND users.id = ANY(%s) "
+            params.append(get_user_list(username=request.user.username, as_json=True))
+        query += "ORDER BY t DESC, users.firstname;"
+
+    cur.execute(query, params)
 
     results = cur.fetchall()
 
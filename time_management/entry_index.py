@@ -0,0 +1,153 @@
+"""
+Small tables maintained from time_entries so pages don't have to scan it.  They are kept by triggers on
+time_entries, so entries written by Redmine and scripts count as soon as they commit, just like the app's own;
+install_entry_index (the refresh_entry_index command) puts the triggers in place.
+"""
+from django.db import connection, transaction
+
+# Runs once per statement on time_entries with the rows it removed and added (as jsonb arrays of rows).  Each month's
+# entry count moves by the difference, and months left with none are dropped.  A new entry can only widen its
+# project's and user's span; a removed one only narrows a span if it sat on its first or last day, and only those
+# spans are locked and recounted (project_id and user_id are indexed).  Locking the span before recounting means a
+# writer that widened it first has committed by the time we count.
+ENTRY_INDEX_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION entry_index_apply(removed jsonb, added jsonb) RETURNS void AS $$
+DECLARE
+    span record;
+    new_first date;
+    new_last date;
+BEGIN
+    INSERT INTO entry_periods (year, month, entries)
+    SELECT tyear, tmonth, sum(step) FROM (
+        SELECT tyear, tmonth, -1 AS step FROM jsonb_to_recordset(removed) AS r (tyear integer, tmonth integer)
+        UNION ALL
+        SELECT tyear, tmonth, 1 FROM jsonb_to_recordset(added) AS a (tyear integer, tmonth integer)) AS steps
+    GROUP BY tyear, tmonth HAVING sum(step) <> 0
+    ORDER BY tyear, tmonth
+    ON CONFLICT (year, month) DO UPDATE SET entries = entry_periods.entries + EXCLUDED.entries;
+    DELETE FROM entry_periods WHERE entries <= 0 AND (year, month) IN (
+        SELECT tyear, tmonth FROM jsonb_to_recordset(removed) AS r (tyear integer, tmonth integer));
+
+    INSERT INTO activity_recency (kind, object_id, first_spent_on, last_spent_on)
+    SELECT kind, object_id, first_spent_on, last_spent_on FROM (
+        SELECT 'project'::varchar AS kind, project_id AS object_id, min(spent_on) AS first_spent_on,
+            max(spent_on) AS last_spent_on
+        FROM jsonb_to_recordset(added) AS a (project_id integer, spent_on date) GROUP BY project_id
+        UNION ALL
+        SELECT 'user', user_id, min(spent_on), max(spent_on)
+        FROM jsonb_to_recordset(added) AS a (user_id integer, spent_on date) GROUP BY user_id) AS spans
+    ORDER BY kind, object_id
+    ON CONFLICT (kind, object_id) DO UPDATE SET
+        first_spent_on = LEAST(activity_recency.first_spent_on, EXCLUDED.first_spent_on),
+        last_spent_on = GREATEST(activity_recency.last_spent_on, EXCLUDED.last_spent_on);
+
+    FOR span IN
+        SELECT activity_recency.kind, activity_recency.object_id FROM activity_recency
+        INNER JOIN (
+            SELECT 'project'::varchar AS kind, project_id AS object_id, spent_on
+            FROM jsonb_to_recordset(removed) AS r (project_id integer, spent_on date)
+            UNION ALL
+            SELECT 'user', user_id, spent_on FROM jsonb_to_recordset(removed) AS r (user_id integer, spent_on date)
+        ) AS gone ON gone.kind = activity_recency.kind AND gone.object_id = activity_recency.object_id
+        WHERE gone.spent_on IN (activity_recency.first_spent_on, activity_recency.last_spent_on)
+        ORDER BY activity_recency.kind, activity_recency.object_id
+        FOR UPDATE OF activity_recency
+    LOOP
+        IF span.kind = 'project' THEN
+            SELECT min(spent_on), max(spent_on) INTO new_first, new_last FROM time_entries
+            WHERE project_id = span.object_id;
+        ELSE
+            SELECT min(spent_on), max(spent_on) INTO new_first, new_last FROM time_entries
+            WHERE user_id = span.object_id;
+        END IF;
+
+        IF new_first IS NULL THEN
+            DELETE FROM activity_recency WHERE kind = span.kind AND object_id = span.object_id;
+        ELSE
+            UPDATE activity_recency SET first_spent_on = new_first, last_spent_on = new_last
+            WHERE kind = span.kind AND object_id = span.object_id;
+        END IF;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION entry_index_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM entry_index_apply(NULL, (SELECT jsonb_agg(to_jsonb(n)) FROM new_entries n));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM entry_index_apply((SELECT jsonb_agg(to_jsonb(o)) FROM old_entries o), NULL);
+    ELSE
+        -- only entries moved to another project, user, day or month matter
+        PERFORM entry_index_apply(
+            (SELECT jsonb_agg(to_jsonb(o)) FROM old_entries o INNER JOIN new_entries n ON n.id = o.id
+             WHERE (o.project_id, o.user_id, o.spent_on, o.tyear, o.tmonth)
+                IS DISTINCT FROM (n.project_id, n.user_id, n.spent_on, n.tyear, n.tmonth)),
+            (SELECT jsonb_agg(to_jsonb(n)) FROM old_entries o INNER JOIN new_entries n ON n.id = o.id
+             WHERE (o.project_id, o.user_id, o.spent_on, o.tyear, o.tmonth)
+                IS DISTINCT FROM (n.project_id, n.user_id, n.spent_on, n.tyear, n.tmonth)));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# transition tables can only be named for one event per trigger
+ENTRY_INDEX_TRIGGERS = """
+DROP TRIGGER IF EXISTS entry_index_insert ON time_entries;
+CREATE TRIGGER entry_index_insert AFTER INSERT ON time_entries REFERENCING NEW TABLE AS new_entries
+    FOR EACH STATEMENT EXECUTE PROCEDURE entry_index_changed();
+DROP TRIGGER IF EXISTS entry_index_update ON time_entries;
+CREATE TRIGGER entry_index_update AFTER UPDATE ON time_entries REFERENCING OLD TABLE AS old_entries
+    NEW TABLE AS new_entries FOR EACH STATEMENT EXECUTE PROCEDURE entry_index_changed();
+DROP TRIGGER IF EXISTS entry_index_delete ON time_entries;
+CREATE TRIGGER entry_index_delete AFTER DELETE ON time_entries REFERENCING OLD TABLE AS old_entries
+    FOR EACH STATEMENT EXECUTE PROCEDURE entry_index_changed();
+"""
+
+
+def rebuild_activity_index(cur):
+    """
+    Recomputes activity_recency from all of time_entries.
+    """
+    cur.execute('DELETE FROM activity_recency;')
+    cur.execute(
+        "INSERT INTO activity_recency (kind, object_id, first_spent_on, last_spent_on) "
+        "SELECT 'project', project_id, min(spent_on), max(spent_on) FROM time_entries GROUP BY project_id "
+        "UNION ALL "
+        "SELECT 'user', user_id, min(spent_on), max(spent_on) FROM time_entries GROUP BY user_id;")
+
+
+def rebuild_period_index(cur):
+    """
+    Recounts entry_periods from all of time_entries.
+    """
+    cur.execute('DELETE FROM entry_periods;')
+    cur.execute('INSERT INTO entry_periods (year, month, entries) '
+                'SELECT tyear, tmonth, count(*) FROM time_entries GROUP BY tyear, tmonth;')
+
+
+def install_entry_index(cur=None):
+    """
+    Creates (or replaces) the triggers that keep the indexes current, then rebuilds the indexes from all of
+    time_entries, in one transaction.  Creating the triggers blocks writes to time_entries until it commits, so the
+    rebuild can't miss an entry and no entry is counted twice.
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    with transaction.atomic():
+        cur.execute(ENTRY_INDEX_FUNCTIONS)
+        cur.execute(ENTRY_INDEX_TRIGGERS)
+        rebuild_activity_index(cur)
+        rebuild_period_index(cur)
+
+
+def get_periods(cur):
+    """
+    Returns the years and the months that have time logged, each in order.
+    """
+    cur.execute('SELECT array_agg(DISTINCT year ORDER BY year), array_agg(DISTINCT month ORDER BY month) '
+                'FROM entry_periods;')
+    years, months = cur.fetchone()
+    return years or [], months or []
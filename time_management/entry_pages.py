@@ -0,0 +1,166 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.db import connection
+from django.shortcuts import HttpResponse
+
+from time_management.custom_fields import custom_field_registry
+from time_management.time_tools import get_user_list
+
+# columns entries can be sorted by; time_entries.id breaks ties so every position in the list is unique
+SORT_KEYS = {
+    'project': 'projects.name',
+    'date': 'time_entries.spent_on',
+    'hours': 'time_entries.hours',
+    'activity': 'enumerations.name'
+}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(order, direction, value, entry_id):
+    """
+    Packs the position after the last entry of a page into an opaque, URL-safe token.
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    elif isinstance(value, decimal.Decimal):
+        value = str(value)
+    return base64.urlsafe_b64encode(json.dumps([order, direction, value, entry_id]))
+
+
+def decode_cursor(token, order, direction):
+    """
+    Returns the (sort value, entry id) a token points after.  Tokens only make sense for the sort they came from.
+    """
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(str(token)))
+        token_order, token_direction, value, entry_id = cursor
+        entry_id = int(entry_id)
+    except (TypeError, ValueError, binascii.Error):
+        raise InvalidCursor('Malformed cursor')
+
+    if token_order != order or token_direction != direction:
+        raise InvalidCursor('Cursor belongs to a different sort order')
+    return value, entry_id
+
+
+def entry_filter(request, cur):
+    """
+    Builds the joins and conditions for the entries the user may see between the start and end dates: everyone's
+    for staff, their team's (and their own, unless include_manager=false) otherwise.
+    """
+    # only the "log as" value is joined, so each entry appears exactly once
+    sql = "FROM time_entries " \
+          "INNER JOIN custom_values ON custom_values.customized_id = time_entries.id " \
+          "AND custom_values.customized_type = 'TimeEntry' AND custom_values.custom_field_id = %s " \
+          "INNER JOIN projects ON projects.id = time_entries.project_id " \
+          "INNER JOIN enumerations ON enumerations.id = time_entries.activity_id " \
+          "WHERE time_entries.spent_on >= %s::date AND time_entries.spent_on <= %s::date " \
+          "AND custom_values.value != '' "
+    params = [custom_field_registry.log_as_field(cur).id, request.GET['start'], request.GET['end']]
+
+    if not request.user.is_staff:
+        include_manager = request.GET.get('include_manager') != 'false'
+        sql += "AND time_entries.user_id = ANY(%s) "
+        params.append(get_user_list(request.user.username, as_json=True, include_manager=include_manager))
+
+    return sql, params
+
+
+@login_required
+def get_entries_page(request):
+    """
+    Returns one page of the entries between start and end, sorted by ?order= (project, date, hours or activity) and
+    ?by= (asc or desc).  Pages are found by position (keyset), not by offset, so every page costs the same: pass
+    the "next" token of one page as ?cursor= to get the one after it.  Totals come from get_entries_totals.
+    """
+    order = request.GET.get('order', 'date')
+    if order not in SORT_KEYS:
+        return HttpResponse(json.dumps({'error': 'Unknown order "%s"' % order}), status=400)
+    direction = 'desc' if request.GET.get('by') == 'desc' else 'asc'
+    sort_key = SORT_KEYS[order]
+
+    try:
+        page_size = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return HttpResponse(json.dumps({'error': 'limit must be a number'}), status=400)
+
+    cur = connection.cursor()
+    sql, params = entry_filter(request, cur)
+    if request.GET.get('cursor'):
+        try:
+            value, entry_id = decode_cursor(request.GET['cursor'], order, direction)
+        except InvalidCursor as e:
+            return HttpResponse(json.dumps({'error': str(e)}), status=400)
+        sql += "AND (%s, time_entries.id) %s (%%s, %%s) " % (sort_key, '<' if direction == 'desc' else '>')
+        params += [value, entry_id]
+
+    cur.execute(
+        "SELECT time_entries.id, time_entries.project_id, projects.name, time_entries.issue_id, time_entries.hours, "
+        "time_entries.comments, enumerations.name, time_entries.spent_on, custom_values.value, enumerations.id, "
+        "projects.id, " + sort_key + " " + sql +
+        "ORDER BY " + sort_key + " " + direction + ", time_entries.id " + direction + " LIMIT %s;",
+        params + [page_size + 1])
+    entries = cur.fetchall()
+
+    entry_list = []
+    entry_number = 1
+    for entry in entries[:page_size]:
+        entry_number *= -1
+        entry_list.append({
+            'id': entry[0],
+            'project': entry[1],
+            'name': entry[2],
+            'issue': entry[3],
+            'hours': entry[4],
+            'comments': entry[5],
+            'activity': entry[6],
+            'date': entry[7].isoformat(),
+            'number': entry_number,
+            'logas': entry[8],
+            'activity_id': entry[9],
+            'project_id': entry[10]
+        })
+
+    # one extra row was fetched to tell whether another page follows
+    next_cursor = None
+    if len(entries) > page_size:
+        last = entries[page_size - 1]
+        next_cursor = encode_cursor(order, direction, last[11], last[0])
+
+    return HttpResponse(json.dumps({'entries': entry_list, 'next': next_cursor}, default=float))
+
+
+@login_required
+def get_entries_totals(request):
+    """
+    Returns the billable and non-billable (support) hours, and the number of entries, of the same entries
+    get_entries_page pages through.
+    """
+    cur = connection.cursor()
+    sql, params = entry_filter(request, cur)
+
+    cur.execute(
+        "SELECT COALESCE(SUM(time_entries.hours) FILTER "
+        "(WHERE lower(enumerations.name) NOT LIKE '%%non-billable%%'), 0), "
+        "COALESCE(SUM(time_entries.hours) FILTER (WHERE lower(enumerations.name) LIKE '%%non-billable%%'), 0), "
+        "count(*) " + sql + ";", params)
+    totals = cur.fetchone()
+
+    context = {
+        'total': round(float(totals[0]), 2),
+        'support': round(float(totals[1]), 2),
+        'count': totals[2]
+    }
+
+    return HttpResponse(json.dumps(context))
@@ -0,0 +1,180 @@
+"""
+Change feeds for the time entry pages: instead of fetching the whole month again after every edit, a page passes
+back the token it got with its last response and receives only what changed since.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.db import connection, transaction
+from django.shortcuts import HttpResponse
+from dateutil.relativedelta import relativedelta
+
+from time_management.custom_fields import custom_field_registry
+from time_management.models import RedmineUser
+from time_management.time_tools import get_user_list
+
+# updated_on and deleted_on are stamped before the write commits, so a change may become visible a little after the
+# timestamp it carries; changes are re-sent for this long past a token to cover that
+SYNC_OVERLAP = datetime.timedelta(seconds=10)
+
+# tombstones are kept this long; a token older than that could miss a delete, so its page is told to reload instead
+SYNC_RETENTION = datetime.timedelta(days=1)
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Every delete from time_entries, whether made here, through Redmine or by a script, leaves a tombstone for the
+# feed, and tombstones past the retention window are dropped (deleted_on is indexed).
+ENTRY_TOMBSTONE_TRIGGER = """
+CREATE OR REPLACE FUNCTION record_entry_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO time_entry_tombstones (entry_id, user_id, deleted_on)
+    SELECT id, user_id, localtimestamp FROM old_entries;
+    DELETE FROM time_entry_tombstones WHERE deleted_on < localtimestamp - interval '%(retention)d seconds';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS entry_tombstone_delete ON time_entries;
+CREATE TRIGGER entry_tombstone_delete AFTER DELETE ON time_entries REFERENCING OLD TABLE AS old_entries
+    FOR EACH STATEMENT EXECUTE PROCEDURE record_entry_tombstones();
+""" % {'retention': SYNC_RETENTION.total_seconds()}
+
+
+def install_entry_tombstones(cur=None):
+    """
+    Creates (or replaces) the trigger that leaves a tombstone for every deleted time entry.
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    with transaction.atomic():
+        cur.execute(ENTRY_TOMBSTONE_TRIGGER)
+
+
+def encode_sync_token(timestamp):
+    return base64.urlsafe_b64encode(timestamp.strftime(TIMESTAMP_FORMAT))
+
+
+def sync_clock(cur):
+    """
+    The database's clock, which the trigger stamps tombstones with.
+    """
+    cur.execute('SELECT localtimestamp;')
+    return cur.fetchone()[0]
+
+
+def new_sync_token(cur):
+    """
+    A token for a response about to read the entries: changes from here on are sent to whoever passes it back.
+    """
+    return encode_sync_token(sync_clock(cur))
+
+
+def decode_sync_token(token):
+    """
+    Returns the time a token was issued at, or None if it can't be read.
+    """
+    try:
+        return datetime.datetime.strptime(base64.urlsafe_b64decode(str(token)), TIMESTAMP_FORMAT)
+    except (TypeError, ValueError, binascii.Error):
+        return None
+
+
+def sync_range(request):
+    """
+    The date range the page shows: a month (?month=&year=) or ?start=&end= in mm/dd/yyyy, as get_entries_home takes.
+    """
+    if 'month' in request.GET:
+        start = datetime.date(int(request.GET['year']), int(request.GET['month']), 1)
+        return start, start + relativedelta(months=1)
+    start = datetime.datetime.strptime(request.GET['start'], '%m/%d/%Y').date()
+    end = datetime.datetime.strptime(request.GET['end'], '%m/%d/%Y').date()
+    return start, end
+
+
+@login_required
+def sync_entries(request):
+    """
+    Returns the target's entries in the range that were created or changed since ?token=, and the ids of entries
+    that were deleted or moved out of the range, along with the token for the next call.  Without a token every
+    entry in the range is returned.  A token older than SYNC_RETENTION gets {'reset': true} back: the page has to
+    load the range again (get_entries hands out a fresh token).
+    """
+    target = request.user.username
+    if request.GET.get('target', '') != '':
+        target = request.GET['target']
+
+    try:
+        target_id = RedmineUser.objects.get(login=target).id
+    except RedmineUser.DoesNotExist:
+        return HttpResponse(json.dumps({'error': 'Unknown user'}), status=404)
+    if not request.user.is_staff and target_id not in get_user_list(username=request.user.username, as_json=True):
+        return HttpResponse("Error 97")
+
+    since = None
+    if request.GET.get('token', '') != '':
+        since = decode_sync_token(request.GET['token'])
+        if since is None:
+            return HttpResponse(json.dumps({'error': 'Malformed token'}), status=400)
+
+    start, end = sync_range(request)
+    cur = connection.cursor()
+
+    # the next token is taken before reading, so anything changed while we read is sent again next time
+    now = sync_clock(cur)
+    if since is not None and since - SYNC_OVERLAP < now - SYNC_RETENTION:
+        return HttpResponse(json.dumps({'reset': True}))
+
+    query = "SELECT time_entries.id, time_entries.project_id, projects.name, time_entries.issue_id, " \
+            "time_entries.hours, time_entries.comments, enumerations.name, time_entries.spent_on, " \
+            "custom_values.value, enumerations.id, projects.id FROM time_entries " \
+            "INNER JOIN custom_values ON custom_values.customized_id = time_entries.id " \
+            "AND custom_values.customized_type = 'TimeEntry' AND custom_values.custom_field_id = %s " \
+            "INNER JOIN projects ON projects.id = time_entries.project_id " \
+            "INNER JOIN enumerations ON enumerations.id = time_entries.activity_id " \
+            "WHERE time_entries.user_id = %s AND custom_values.value != '' "
+    params = [custom_field_registry.log_as_field(cur).id, target_id]
+    if since is None:
+        query += "AND time_entries.spent_on >= %s AND time_entries.spent_on <= %s "
+        params += [start, end]
+    else:
+        # changed entries are returned wherever they are now, so ones moved out of the range can be dropped
+        query += "AND time_entries.updated_on >= %s "
+        params.append(since - SYNC_OVERLAP)
+    cur.execute(query + "ORDER BY time_entries.spent_on, time_entries.id;", params)
+
+    entry_list = []
+    deleted = []
+    for entry in cur.fetchall():
+        if not start <= entry[7] <= end:
+            deleted.append(entry[0])
+            continue
+        entry_list.append({
+            'id': entry[0],
+            'project': entry[1],
+            'name': entry[2],
+            'issue': entry[3],
+            'hours': entry[4],
+            'comments': entry[5],
+            'activity': entry[6],
+            'date': entry[7].isoformat(),
+            'logas': entry[8],
+            'activity_id': entry[9],
+            'project_id': entry[10]
+        })
+
+    if since is not None:
+        cur.execute('SELECT entry_id FROM time_entry_tombstones WHERE user_id = %s AND deleted_on >= %s;',
+                    [target_id, since - SYNC_OVERLAP])
+        deleted += [row[0] for row in cur.fetchall()]
+
+    context = {
+        'entries': entry_list,
+        'deleted': deleted,
+        'token': encode_sync_token(now)
+    }
+
+    return HttpResponse(json.dumps(context))
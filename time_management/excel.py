@@ -0,0 +1,75 @@
+"""
+A small layer over openpyxl's write-only mode for tabular exports.  Rows are serialized as they are appended instead
+of being kept as cell objects, so the memory used doesn't grow with the size of the sheet.
+"""
+from django.shortcuts import HttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# number formats for the kinds of values our reports hold
+MONEY_FORMAT = '"$"#,##0.00'
+PERCENT_FORMAT = '0.00%'
+DECIMAL_FORMAT = '0.00'
+DATE_FORMAT = 'yyyy-mm-dd'
+
+
+class Column:
+    def __init__(self, header, number_format=None, width=None):
+        self.header = header
+        self.number_format = number_format
+        self.width = width
+
+
+class ExcelWriter:
+    """
+    Writes one sheet: a bold header row followed by rows appended one at a time.  Each column's number format is
+    applied to its cells, so numbers stay numbers in Excel.
+
+    A write-only workbook can only be saved once.
+    """
+    def __init__(self, columns, title='Sheet'):
+        self.columns = columns
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title)
+
+        # column widths and frozen panes have to be set before the first row is written
+        for i, column in enumerate(columns):
+            if column.width is not None:
+                self.sheet.column_dimensions[get_column_letter(i + 1)].width = column.width
+        self.sheet.freeze_panes = 'A2'
+
+        header_font = Font(bold=True)
+        headers = []
+        for column in columns:
+            cell = WriteOnlyCell(self.sheet, value=column.header)
+            cell.font = header_font
+            headers.append(cell)
+        self.sheet.append(headers)
+
+    def append(self, values):
+        row = []
+        for column, value in zip(self.columns, values):
+            if column.number_format is not None and value is not None:
+                cell = WriteOnlyCell(self.sheet, value=value)
+                cell.number_format = column.number_format
+                row.append(cell)
+            else:
+                row.append(value)
+        self.sheet.append(row)
+
+    def save(self, file_out):
+        self.workbook.save(file_out)
+        return file_out
+
+
+def excel_response(filename):
+    """
+    Returns an attachment response a writer can be saved straight into.
+    """
+    response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
@@ -0,0 +1,219 @@
+import datetime
+
+import numpy
+from django.db import connection
+
+from holidays import get_holidays, get_working_days
+
+# hours in a regular (non-manager) working day
+WORKING_DAY_HOURS = 8
+
+# managers are budgeted this many hours for the whole month, spread over its working days
+MANAGER_MONTHLY_HOURS = 30
+
+
+def prospect_key(prospect_id):
+    """
+    Prospective projects share the project id space in the planning UI, so they are keyed as "new_<id>" (the same
+    convention add_assignment uses).
+    """
+    return 'new_' + str(prospect_id)
+
+
+def interval_matrix(rows, starts, ends, values, row_count, day_count):
+    """
+    Builds a dense (row_count x day_count) matrix where every interval adds its value to row[start..end] (inclusive).
+    Each interval only touches two cells of a difference array; a cumulative sum along the days turns it back into
+    per-day totals.
+    """
+    diff = numpy.zeros((max(row_count, 1), day_count + 1))
+    if len(rows) > 0:
+        numpy.add.at(diff, (rows, starts), values)
+        numpy.add.at(diff, (rows, ends + 1), -values)
+    return numpy.cumsum(diff, axis=1)[:row_count, :day_count]
+
+
+class FTETimeline:
+    """
+    Per-day allocated FTE for every developer and every project over a planning horizon.
+
+    All of the project_distribution intervals overlapping the horizon are loaded once and turned into two dense
+    matrices: developers x days and projects x days.  Project effort coming from managers is kept in its own matrix
+    since managers bill a different number of hours per day.
+    """
+    def __init__(self, start_date, end_date, assignments):
+        """
+        :param start_date: first day of the horizon
+        :param end_date: last day of the horizon (inclusive)
+        :param assignments: list of (user id, project key, percentage, from, to, manager) tuples
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.day_count = max((end_date - start_date).days + 1, 0)
+
+        self.developer_ids = sorted(set(a[0] for a in assignments))
+        self.project_ids = sorted(set(a[1] for a in assignments if a[1] is not None))
+        self.developer_index = dict((dev, i) for i, dev in enumerate(self.developer_ids))
+        self.project_index = dict((project, i) for i, project in enumerate(self.project_ids))
+
+        # clip every interval to the horizon, converting dates to day offsets
+        developers = []
+        projects = []
+        starts = []
+        ends = []
+        values = []
+        managers = []
+        for assignment in assignments:
+            start = max(assignment[3], start_date)
+            end = min(assignment[4], end_date)
+            if start > end:
+                continue
+            developers.append(self.developer_index[assignment[0]])
+            projects.append(self.project_index.get(assignment[1], -1))
+            starts.append((start - start_date).days)
+            ends.append((end - start_date).days)
+            values.append(float(assignment[2]))
+            managers.append(bool(assignment[5]))
+
+        developers = numpy.array(developers, dtype=int)
+        projects = numpy.array(projects, dtype=int)
+        starts = numpy.array(starts, dtype=int)
+        ends = numpy.array(ends, dtype=int)
+        values = numpy.array(values, dtype=float)
+        managers = numpy.array(managers, dtype=bool)
+
+        self.developer_matrix = interval_matrix(developers, starts, ends, values,
+                                                len(self.developer_ids), self.day_count)
+
+        # prospective rows without a key (shouldn't happen) only count towards developers
+        staff = (projects >= 0) & ~managers
+        self.project_matrix = interval_matrix(projects[staff], starts[staff], ends[staff], values[staff],
+                                              len(self.project_ids), self.day_count)
+        management = (projects >= 0) & managers
+        self.manager_project_matrix = interval_matrix(projects[management], starts[management], ends[management],
+                                                      values[management], len(self.project_ids), self.day_count)
+
+        self.working_hours = None
+        self.manager_working_hours = None
+
+    @classmethod
+    def load(cls, start_date, end_date=None, cur=None):
+        """
+        Loads every project_distribution row overlapping [start_date, end_date].  If no end date is given the
+        horizon runs until the last assignment ends.
+        """
+        if cur is None:
+            cur = connection.cursor()
+
+        if end_date is None:
+            cur.execute('SELECT max("to") FROM project_distribution WHERE "to" >= %s;', [start_date])
+            end_date = cur.fetchone()[0]
+            if end_date is None or end_date < start_date:
+                end_date = start_date
+
+        cur.execute(
+            'SELECT project_distribution.user, project_distribution.project, project_distribution.prospective_project, '
+            'percentage, "from", "to", COALESCE(programmers.manager, FALSE) FROM project_distribution '
+            'LEFT JOIN programmers ON programmers.user_id = project_distribution.user '
+            'WHERE "from" <= %s AND "to" >= %s;', [end_date, start_date])
+
+        assignments = []
+        for row in cur.fetchall():
+            project = row[1]
+            if project is None and row[2] is not None:
+                project = prospect_key(row[2])
+            assignments.append((row[0], project, row[3], row[4], row[5], row[6]))
+
+        return cls(start_date, end_date, assignments)
+
+    def day_offset(self, day):
+        return (day - self.start_date).days
+
+    def day_slice(self, start=None, end=None):
+        """
+        Converts an inclusive date range into a column slice, clipped to the horizon.
+        """
+        first = 0
+        last = self.day_count
+        if start is not None:
+            first = min(max(self.day_offset(start), 0), self.day_count)
+        if end is not None:
+            last = min(max(self.day_offset(end) + 1, first), self.day_count)
+        return slice(first, last)
+
+    def dates(self, start=None, end=None):
+        days = self.day_slice(start, end)
+        return [self.start_date + datetime.timedelta(days=i) for i in range(days.start, days.stop)]
+
+    def developer_fte(self, user_id, start=None, end=None):
+        """
+        Returns the developer's allocated FTE for each day in the range (zeros if they have no assignments).
+        """
+        days = self.day_slice(start, end)
+        if user_id not in self.developer_index:
+            return numpy.zeros(days.stop - days.start)
+        return self.developer_matrix[self.developer_index[user_id], days]
+
+    def project_fte(self, project_id, start=None, end=None):
+        """
+        Returns the FTE allocated to the project (developers and managers) for each day in the range.
+        """
+        days = self.day_slice(start, end)
+        if project_id not in self.project_index:
+            return numpy.zeros(days.stop - days.start)
+        row = self.project_index[project_id]
+        return self.project_matrix[row, days] + self.manager_project_matrix[row, days]
+
+    def project_fte_on(self, project_id, day):
+        if not self.start_date <= day <= self.end_date or project_id not in self.project_index:
+            return 0.0
+        row = self.project_index[project_id]
+        offset = self.day_offset(day)
+        return float(self.project_matrix[row, offset] + self.manager_project_matrix[row, offset])
+
+    def load_working_hours(self):
+        """
+        Builds the hours-per-day vectors for regular developers and managers over the horizon (weekends and paid
+        holidays are zero).
+        """
+        if self.working_hours is not None:
+            return
+
+        holiday_dates = set()
+        for year in range(self.start_date.year, self.end_date.year + 1):
+            for holiday in get_holidays(year):
+                holiday_dates.add(holiday['date'])
+
+        monthly_days = {}
+        self.working_hours = numpy.zeros(self.day_count)
+        self.manager_working_hours = numpy.zeros(self.day_count)
+        for i, day in enumerate(self.dates()):
+            if day.weekday() >= 5 or day in holiday_dates:
+                continue
+            month = (day.year, day.month)
+            if month not in monthly_days:
+                monthly_days[month] = get_working_days(day.month, day.year)
+            self.working_hours[i] = WORKING_DAY_HOURS
+            self.manager_working_hours[i] = float(MANAGER_MONTHLY_HOURS) / float(monthly_days[month])
+
+    def project_hours(self, project_id, start=None, end=None):
+        """
+        Returns the total hours the project is staffed for across the range.
+        """
+        if project_id not in self.project_index:
+            return 0.0
+        self.load_working_hours()
+        days = self.day_slice(start, end)
+        row = self.project_index[project_id]
+        return float(numpy.dot(self.project_matrix[row, days], self.working_hours[days]) +
+                     numpy.dot(self.manager_project_matrix[row, days], self.manager_working_hours[days]))
+
+    def all_project_hours(self, start=None, end=None):
+        """
+        Returns {project: total staffed hours across the range} for every project at once.
+        """
+        self.load_working_hours()
+        days = self.day_slice(start, end)
+        hours = numpy.dot(self.project_matrix[:, days], self.working_hours[days]) + \
+            numpy.dot(self.manager_project_matrix[:, days], self.manager_working_hours[days])
+        return dict((project, float(hours[i])) for i, project in enumerate(self.project_ids))
@@ -1,15 +1,32 @@
 from django.shortcuts import HttpResponse, render
+from django.core.cache import cache
 from django.db import connection
 import datetime
 from holidays import get_holidays
 import calendar
 import json
 from django.contrib.auth.decorators import login_required
-from time_management.decorators import user_is_in_manager_group
+from time_management.decorators import user_is_in_manager_group, conditional_get, watermark_key
 from time_management.time_tools import get_user_list
+from time_management.time_entries import date_range_context
+from time_management.entry_sync import new_sync_token
+from time_management.catalog import build_project_catalog, activity_catalog
+from time_management.custom_fields import custom_field_registry, BUDGET_FIELD, SPENT_FIELD
 from time_management.models import RedmineUser, Team
+from time_management import compact_json
+from time_management.compact_json import columnar, wants_compact
 from dateutil.relativedelta import relativedelta
 
+# seconds a distribution stays cached
+DISTRIBUTION_CACHE_TIMEOUT = 60
+
+# the entry rows as selected by get_entries_home and get_entries_home_page, for the compact encoding
+ENTRY_COLUMNS = ('id', 'project', 'name', 'issue', 'hours', 'comments', 'activity', 'date', 'logas', 'activity_id',
+                 'project_id')
+ENTRY_DICTIONARY = ('name', 'activity', 'logas')
+
+DISTRIBUTION_COLUMNS = ('id', 'name', 'hours')
+
 
 @login_required
 # @user_is_in_manager_group
@@ -33,56 +50,82 @@ def get_entries_home(request):
         Generates the landing page for anyone to come to for them to change/modify
         their hours.  It allows for users to move hours from project to project.
         """
+    if 'month' in request.GET:
+        start = datetime.datetime(int(request.GET['year']), int(request.GET['month']), 1)
+        end = start + relativedelta(months=1)
+    else:
+        start = datetime.datetime.strptime(request.GET['start'], '%m/%d/%Y').strftime('%Y-%m-%d')
+        end = datetime.datetime.strptime(request.GET['end'], '%m/%d/%Y').strftime('%Y-%m-%d')
+
+    compact = wants_compact(request)
+    context = entries_home_context(request, start, end, request.GET.get('target', ''), request.GET['order'],
+                                   request.GET['by'], compact=compact)
+
+    if compact:
+        return HttpResponse(compact_json.dumps(context))
+
+    return HttpResponse(json.dumps(context))
+
+
+@login_required
+def get_home_bootstrap(request):
+    """
+    Everything the calendar page starts with, in one response: what get_entries returns for the month (?month=&year=,
+    this month by default) along with the month and year dropdowns get_dates returns, under 'periods'.  Each project
+    carries its activities, so the first edit doesn't need a get_activities call either.
+    """
+    today = datetime.date.today()
+    start = datetime.datetime(int(request.GET.get('year', today.year)), int(request.GET.get('month', today.month)), 1)
+    end = start + relativedelta(months=1)
+
+    context = entries_home_context(request, start, end, request.GET.get('target', ''),
+                                   request.GET.get('order', 'project'), request.GET.get('by', 'asc'))
+    context['periods'] = date_range_context(connection.cursor())
+
+    return HttpResponse(json.dumps(context))
+
+
+def entries_home_context(request, start, end, requested_target, order_key, by, compact=False):
+    """
+    The entries, projects, activities, "log as" options, users and holidays get_entries_home returns: the entries
+    from start to end of the requested target (if the user may see theirs, otherwise their own), ordered by
+    order_key (project, date, hours or activity) and by (asc or desc), with the sync_entries token for them.
+    """
     # target
     target = request.user.username
 
-    if 'target' in request.GET and request.GET['target'] != '' and request.GET['target'] != target and not request.user.is_staff:
+    if requested_target != '' and requested_target != target and not request.user.is_staff:
         # make sure the target is in their manager's group
         user_list = get_user_list(username=request.user.username, as_json=True)
-        print "Looking for:", request.GET['target']
-        target_user = RedmineUser.objects.get(login=request.GET['target'])
+        target_user = RedmineUser.objects.get(login=requested_target)
         if target_user.id in user_list:
-            target = request.GET['target']
-
-    if request.user.is_staff and 'target' in request.GET and request.GET['target'] != '':
-        target = request.GET['target']
+            target = requested_target
 
-    # if request.user.is_staff and 'target' in request.GET and request.GET['target'] != '':
-    #     target = request.GET['target']
-
-    # what is the month?
-    #month = request.GET['month']
-
-    # what is the year?
-    #year = request.GET['year']
+    if request.user.is_staff and requested_target != '':
+        target = requested_target
 
     # connect to the database
     cur = connection.cursor()
 
+    # the page passes this to sync_entries after its edits; taken before reading so nothing written meanwhile is lost
+    token = new_sync_token(cur)
+
     # how should we order things? (ascenting/descending)
     order = 'ASC'
-    if request.GET['by'] == 'desc':
+    if by == 'desc':
         order = 'DESC'
 
     # how do we want to order our entries?
     order_by = ''
-    if request.GET['order'] == 'project':
+    if order_key == 'project':
         order_by = 'projects.name ' + order + ', time_entries.spent_on ASC'
-    if request.GET['order'] == 'date':
+    if order_key == 'date':
         order_by = 'time_entries.spent_on ' + order + ', projects.name ASC'
-    if request.GET['order'] == 'hours':
+    if order_key == 'hours':
         order_by = 'time_entries.hours ' + order + ', projects.name ASC, time_entries.spent_on ASC'
-    if request.GET['order'] == 'activity':
+    if order_key == 'activity':
         order_by = 'enumerations.name ' + order + ', projects.name ASC, time_entries.spent_on ASC'
 
-    if 'start' in request.GET:
-        start = datetime.datetime.strptime(request.GET['start'], '%m/%d/%Y').strftime('%Y-%m-%d')
-        end = datetime.datetime.strptime(request.GET['end'], '%m/%d/%Y').strftime('%Y-%m-%d')
-
-    if 'month' in request.GET:
-        start = datetime.datetime(int(request.GET['year']), int(request.GET['month']), 1)
-        end = start + relativedelta(months=1)
-
     # get the records for this user, month, and year
     cur.execute(
         "SELECT time_entries.id, time_entries.project_id, projects.name, time_entries.issue_id, time_entries.hours, "
@@ -95,18 +138,7 @@ def get_entries_home(request):
         "AND users.login = '%(user)s' ORDER BY %(order)s;" % {
             'start': start, 'end': end, 'user': target, 'order': order_by})
 
-    print cur.mogrify( "SELECT time_entries.id, time_entries.project_id, projects.name, time_entries.issue_id, time_entries.hours, "
-        "time_entries.comments, enumerations.name, time_entries.spent_on, custom_values.value, enumerations.id, "
-        "projects.id FROM time_entries INNER JOIN custom_values ON custom_values.customized_id = time_entries.id "
-        "INNER JOIN users ON users.id = time_entries.user_id "
-        "INNER JOIN projects ON projects.id = time_entries.project_id "
-        "INNER JOIN enumerations ON enumerations.id = time_entries.activity_id WHERE "
-        "AND custom_values.value != '' and time_entries.spent_on >= '%(start)s' and time_entries.spent_on <= '%(end)s' "
-                       "AND users.login = '%(user)s' ORDER BY %(order)s;" % {
-            'start': start, 'end': end, 'user': target, 'order': order_by})
-
     entries = cur.fetchall()
-    print entries
 
     # assemble into a list
     entry_list = []
@@ -114,21 +146,23 @@ def get_entries_home(request):
     total_hours = 0
     support = 0
     for entry in entries:
-        new_entry = {}
-        entry_number *= -1
-        new_entry['id'] = entry[0]
-        new_entry['project'] = entry[1]
-        new_entry['name'] = entry[2]
-        new_entry['issue'] = entry[3]
-        new_entry['hours'] = entry[4]
-        new_entry['comments'] = entry[5]
-        new_entry['activity'] = entry[6]
-        new_entry['date'] = entry[7].isoformat()
-        new_entry['number'] = entry_number
-        new_entry['logas'] = entry[8]
-        new_entry['activity_id'] = entry[9]
-        new_entry['project_id'] = entry[10]
-        entry_list.append(new_entry)
+        # the compact encoding is built from the rows themselves
+        if not compact:
+            new_entry = {}
+            entry_number *= -1
+            new_entry['id'] = entry[0]
+            new_entry['project'] = entry[1]
+            new_entry['name'] = entry[2]
+            new_entry['issue'] = entry[3]
+            new_entry['hours'] = entry[4]
+            new_entry['comments'] = entry[5]
+            new_entry['activity'] = entry[6]
+            new_entry['date'] = entry[7].isoformat()
+            new_entry['number'] = entry_number
+            new_entry['logas'] = entry[8]
+            new_entry['activity_id'] = entry[9]
+            new_entry['project_id'] = entry[10]
+            entry_list.append(new_entry)
 
         # update our total hours (if it's billable!)
         if 'non-billable' not in entry[6].lower():
@@ -154,6 +188,9 @@ def get_entries_home(request):
             'user': target})
     projects = cur.fetchall()
 
+    # membership and activities for every project come from one catalog
+    catalog = build_project_catalog([project[0] for project in projects], login=target, cur=cur)
+
     # loop through the projects, constructiong a dictionary
     project_list = []
     for project in projects:
@@ -161,71 +198,22 @@ def get_entries_home(request):
         new_project['id'] = project[0]
         new_project['name'] = project[1]
         new_project['active'] = project[2]
-
-        # check if the user is a member of this project
-        cur.execute("SELECT count(*) from members INNER JOIN users ON users.id = members.user_id WHERE project_id = %(project)s and users.login = '%(user)s';" % {
-            'user': target,
-            'project': project[0]
-        })
-
-        members = cur.fetchone()[0]
-        if members == 1:
-            new_project['member'] = True
-        else:
-            new_project['member'] = False
-
-        # for each project, get a list of activities!
-        # first get any that are specific to our project
-        cur.execute(
-            "SELECT name FROM enumerations WHERE type = 'TimeEntryActivity' and project_id = %(proj)s "
-            "and active = FALSE;" % {
-                'proj': project[0]})
-        exclusions = cur.fetchall()
-        exclude_list = []
-        for ex in exclusions:
-            exclude_list.append(ex[0])
-
-        # now get the defaults
-        cur.execute(
-            "SELECT id, name FROM enumerations WHERE type = 'TimeEntryActivity' and active = TRUE "
-            "and project_id is NULL;")
-        activity = cur.fetchall()
-
-        activity_list = []
-        for act in activity:
-            if act[1] in exclude_list:
-                continue
-            active = {}
-            active['id'] = act[0]
-            active['name'] = act[1]
-            activity_list.append(active)
-        new_project['activities'] = activity_list
+        new_project['member'] = catalog[project[0]]['member']
+        new_project['activities'] = catalog[project[0]]['activities']
 
         if new_project not in project_list:
             project_list.append(new_project)
 
     # get a list of activities
-    cur.execute(
-        "SELECT min(id), name FROM enumerations where type = 'TimeEntryActivity' "
-        "AND active = TRUE GROUP BY name ORDER BY name;")
-    activities = cur.fetchall()
-    # loop through the activities, constructing a dictionary
-    activity_list = []
-    for activity in activities:
-        new_act = {}
-        new_act['id'] = activity[0]
-        new_act['name'] = activity[1]
-        activity_list.append(new_act)
+    activity_list = activity_catalog.get_activities()
 
     # get a list of "log as" options
-    cur.execute("SELECT possible_values FROM custom_fields WHERE (lower(name) = lower('Log As')  OR lower(name) = lower('Task'));")
-    logas = cur.fetchall()
+    logas = custom_field_registry.log_as_field(cur)
     # loop through, constructing a dictionary
-    logas = logas[0][0].split('\n')[1:-1]
     logas_list = []
-    for l in logas:
+    for l in logas.possible_values:
         new_logas = {}
-        new_logas['name'] = l[2:]
+        new_logas['name'] = l
         logas_list.append(new_logas)
 
     # get a list of users who have time logged for this month/year
@@ -308,9 +296,13 @@ def get_entries_home(request):
                'holidays': h_list,
                'logas': logas_list,
                'support': support,
-               'billable': (billable * 8)}
+               'billable': (billable * 8),
+               'token': token}
 
-    return HttpResponse(json.dumps(context))
+    if compact:
+        context['entries'] = columnar(entries, ENTRY_COLUMNS, ENTRY_DICTIONARY)
+
+    return context
 
 
 @login_required
@@ -341,6 +333,9 @@ def get_entries_home_page(request):
     # connect to the database
     cur = connection.cursor()
 
+    # the page passes this to sync_entries after its edits; taken before reading so nothing written meanwhile is lost
+    token = new_sync_token(cur)
+
     # how should we order things? (ascenting/descending)
     order = 'ASC'
     if request.GET['by'] == 'desc':
@@ -393,6 +388,7 @@ def get_entries_home_page(request):
                 'user': user_id_list, 'order': order_by})
 
     entries = cur.fetchall()
+    compact = wants_compact(request)
 
     # assemble into a list
     entry_list = []
@@ -400,21 +396,23 @@ def get_entries_home_page(request):
     total_hours = 0
     support = 0
     for entry in entries:
-        new_entry = {}
-        entry_number *= -1
-        new_entry['id'] = entry[0]
-        new_entry['project'] = entry[1]
-        new_entry['name'] = entry[2]
-        new_entry['issue'] = entry[3]
-        new_entry['hours'] = entry[4]
-        new_entry['comments'] = entry[5]
-        new_entry['activity'] = entry[6]
-        new_entry['date'] = entry[7].isoformat()
-        new_entry['number'] = entry_number
-        new_entry['logas'] = entry[8]
-        new_entry['activity_id'] = entry[9]
-        new_entry['project_id'] = entry[10]
-        entry_list.append(new_entry)
+        # the compact encoding is built from the rows themselves
+        if not compact:
+            new_entry = {}
+            entry_number *= -1
+            new_entry['id'] = entry[0]
+            new_entry['project'] = entry[1]
+            new_entry['name'] = entry[2]
+            new_entry['issue'] = entry[3]
+            new_entry['hours'] = entry[4]
+            new_entry['comments'] = entry[5]
+            new_entry['activity'] = entry[6]
+            new_entry['date'] = entry[7].isoformat()
+            new_entry['number'] = entry_number
+            new_entry['logas'] = entry[8]
+            new_entry['activity_id'] = entry[9]
+            new_entry['project_id'] = entry[10]
+            entry_list.append(new_entry)
 
         # update our total hours (if it's billable!)
         if 'non-billable' not in entry[6].lower():
@@ -434,63 +432,29 @@ def get_entries_home_page(request):
         "INNER JOIN users ON users.id = members.user_id ORDER BY projects.name;")
     projects = cur.fetchall()
 
+    # activities for every project come from one catalog
+    catalog = build_project_catalog([project[0] for project in projects], cur=cur)
+
     # loop through the projects, constructiong a dictionary
     project_list = []
     for project in projects:
         new_project = {}
         new_project['id'] = project[0]
         new_project['name'] = project[1]
-        # for each project, get a list of activities!
-        # first get any that are specific to our project
-        cur.execute(
-            "SELECT name FROM enumerations WHERE type = 'TimeEntryActivity' and project_id = %(proj)s "
-            "and active = FALSE;" % {
-                'proj': project[0]})
-        exclusions = cur.fetchall()
-        exclude_list = []
-        for ex in exclusions:
-            exclude_list.append(ex[0])
-
-        # now get the defaults
-        cur.execute(
-            "SELECT id, name FROM enumerations WHERE type = 'TimeEntryActivity' and active = TRUE "
-            "and project_id is NULL;")
-        activity = cur.fetchall()
-
-        activity_list = []
-        for act in activity:
-            if act[1] in exclude_list:
-                continue
-            active = {}
-            active['id'] = act[0]
-            active['name'] = act[1]
-            activity_list.append(active)
-        new_project['activities'] = activity_list
+        new_project['activities'] = catalog[project[0]]['activities']
 
         project_list.append(new_project)
 
     # get a list of activities
-    cur.execute(
-        "SELECT min(id), name FROM enumerations where type = 'TimeEntryActivity' "
-        "AND active = TRUE GROUP BY name ORDER BY name;")
-    activities = cur.fetchall()
-    # loop through the activities, constructing a dictionary
-    activity_list = []
-    for activity in activities:
-        new_act = {}
-        new_act['id'] = activity[0]
-        new_act['name'] = activity[1]
-        activity_list.append(new_act)
+    activity_list = activity_catalog.get_activities()
 
     # get a list of "log as" options
-    cur.execute("SELECT possible_values FROM custom_fields WHERE (lower(name) = lower('Log As') OR lower(name) = lower('Task'));")
-    logas = cur.fetchall()
+    logas = custom_field_registry.log_as_field(cur)
     # loop through, constructing a dictionary
-    logas = logas[0][0].split('\n')[1:-1]
     logas_list = []
-    for l in logas:
+    for l in logas.possible_values:
         new_logas = {}
-        new_logas['name'] = l[2:]
+        new_logas['name'] = l
         logas_list.append(new_logas)
 
     # get a list of users who have time logged for this month/year
@@ -566,7 +530,12 @@ def get_entries_home_page(request):
                'holidays': h_list,
                'logas': logas_list,
                'support': support,
-               'billable': (billable * 8)}
+               'billable': (billable * 8),
+               'token': token}
+
+    if compact:
+        context['entries'] = columnar(entries, ENTRY_COLUMNS, ENTRY_DICTIONARY)
+        return HttpResponse(compact_json.dumps(context))
 
     return HttpResponse(json.dumps(context))
 
@@ -574,6 +543,7 @@ def get_entries_home_page(request):
 
 @login_required
 # @user_is_in_manager_group
+@conditional_get('distribution')
 def get_distribution(request):
     # connect to the database
     cur = connection.cursor()
@@ -608,87 +578,73 @@ def get_distribution(request):
     if 'type' in request.GET:
         type = request.GET['type']
 
-    # now that we have everything, let's get what we need!
-    if type == 'project':
-        # get user and their total hours
-        query = "select distinct(user_id), users.firstname, users.lastname, SUM(hours) FROM time_entries " \
-                "INNER JOIN users ON time_entries.user_id = users.id WHERE project_id = %(id)s " \
-                "and spent_on >= '%(start)s'::date and spent_on <= '%(end)s'::date " \
-                "group by user_id, users.firstname, users.lastname;" % {
-                    'id': id, 'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        cur.execute(query)
+    if type not in ('project', 'programmer'):
+        return HttpResponse('Unknown Type')
+
+    # managers flip between people and projects quickly, so each (type, id, range) is kept for a short while; the
+    # watermark in the key retires it as soon as the tables behind the ETag change (nothing is cached without one)
+    watermark = watermark_key('distribution', cur)
+    cache_key = 'distribution:%s:%s:%s:%s:%s' % (watermark, type, id, request.GET['start_date'],
+                                                 request.GET['end_date'])
+    context = cache.get(cache_key) if watermark is not None else None
+    if context is None:
+        context = distribution_context(cur, type, id, request.GET['start_date'], request.GET['end_date'])
+        if watermark is not None:
+            cache.set(cache_key, context, DISTRIBUTION_CACHE_TIMEOUT)
+
+    if wants_compact(request):
+        compact = dict(context)
+        compact['entries'] = columnar([(e['id'], e['name'], e['hours']) for e in context['entries']],
+                                      DISTRIBUTION_COLUMNS)
+        return HttpResponse(compact_json.dumps(compact))
 
-        records = cur.fetchall()
+    return HttpResponse(json.dumps(context))
 
-        # get the total hours
-        query = "select SUM(hours) FROM time_entries WHERE project_id = %(id)s and spent_on >= '%(start)s' " \
-                "and spent_on <= '%(end)s';" % {
-                    'id': id, 'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        cur.execute(query)
-        total = cur.fetchone()
-        if total is not None:
-            total = total[0]
-        else:
-            total = 0
 
-        # loop through all records
-        entry_list = []
+def distribution_context(cur, type, id, start_date, end_date):
+    """
+    Hours per user for a project (with its budget and accumulated spending), or hours per project for a programmer,
+    each in one statement; the total comes from a window over the grouped rows.
+    """
+    if type == 'project':
+        cur.execute(
+            "SELECT per_user.user_id, users.firstname, users.lastname, per_user.hours, SUM(per_user.hours) OVER (), "
+            "fields.budget, fields.accumulative FROM (SELECT %s::integer AS id) AS project "
+            "LEFT JOIN LATERAL (SELECT max(value) FILTER (WHERE custom_field_id = %s) AS budget, "
+            "max(value) FILTER (WHERE custom_field_id = %s) AS accumulative FROM custom_values "
+            "WHERE customized_id = project.id AND customized_type = 'Project') AS fields ON TRUE "
+            "LEFT JOIN LATERAL (SELECT user_id, SUM(hours) AS hours FROM time_entries WHERE project_id = project.id "
+            "AND spent_on >= %s::date AND spent_on <= %s::date GROUP BY user_id) AS per_user ON TRUE "
+            "LEFT JOIN users ON users.id = per_user.user_id;", [id, BUDGET_FIELD, SPENT_FIELD, start_date, end_date])
+        records = cur.fetchall()
 
+        # loop through all records (a project without hours still comes back as one row, for its budget)
+        entry_list = []
         for rec in records:
+            if rec[0] is None:
+                continue
             new_entry = {}
             new_entry['id'] = rec[0]
             new_entry['name'] = rec[1] + ' ' + rec[2]
             new_entry['hours'] = rec[3]
             entry_list.append(new_entry)
 
-        # get the budget for this project
-        query = "select value from custom_values where customized_id = %(project)s " \
-                "and custom_field_id = 12 and customized_type = 'Project';" % {
-                    'project': id}
-        cur.execute(query)
-        budget = cur.fetchone()
-        if budget is not None:
-            budget = budget[0]
-        else:
-            budget = 0
-
-        # get the accumulative (if it exists)
-        query = "select value from custom_values where customized_id = %(project)s " \
-                "and custom_field_id = 13 and customized_type = 'Project';" % {
-                    'project': id}
-        cur.execute(query)
-        accumulative = cur.fetchone()
-        if accumulative is not None:
-            accumulative = accumulative[0]
-        else:
-            accumulative = 0
+        total = records[0][4]
+        budget = records[0][5] if records[0][5] is not None else 0
+        accumulative = records[0][6] if records[0][6] is not None else 0
 
-        context = {'entries': entry_list, 'total': total, 'budget': budget, 'accumulative': accumulative}
-        return HttpResponse(json.dumps(context))
+        return {'entries': entry_list, 'total': total, 'budget': budget, 'accumulative': accumulative}
 
     if type == 'programmer':
-        cur.execute("select login from users where id = %(id)s;" % {'id': id})
-        username = cur.fetchone()[0]
-        # get user and their total hours
-        query = "select distinct(project_id), projects.name, SUM(hours) FROM time_entries " \
-                "INNER JOIN projects ON time_entries.project_id = projects.id " \
-                "INNER JOIN users ON time_entries.user_id = users.id WHERE login = '%(id)s' " \
-                "and spent_on >= '%(start)s' and spent_on <= '%(end)s' group by project_id, projects.name;" % {
-                    'id': username, 'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        cur.execute(query)
-
+        cur.execute(
+            "SELECT per_project.project_id, projects.name, per_project.hours, SUM(per_project.hours) OVER () "
+            "FROM (SELECT project_id, SUM(hours) AS hours FROM time_entries WHERE user_id = %s "
+            "AND spent_on >= %s::date AND spent_on <= %s::date GROUP BY project_id) AS per_project "
+            "INNER JOIN projects ON projects.id = per_project.project_id;", [id, start_date, end_date])
         records = cur.fetchall()
 
-        # get the total hours
-        query = "select SUM(hours) FROM time_entries INNER JOIN users ON time_entries.user_id = users.id " \
-                "WHERE login = '%(id)s' and spent_on >= '%(start)s' and spent_on <= '%(end)s';" % {
-                    'id': username, 'start': request.GET['start_date'], 'end': request.GET['end_date']}
-        cur.execute(query)
-        total = cur.fetchone()[0]
-
         # loop through all records
         entry_list = []
-
         for rec in records:
             new_entry = {}
             new_entry['id'] = rec[0]
@@ -696,8 +652,9 @@ def get_distribution(request):
             new_entry['hours'] = rec[2]
             entry_list.append(new_entry)
 
-        context = {'entries': entry_list, 'total': total}
-        return HttpResponse(json.dumps(context))
+        total = records[0][3] if len(records) > 0 else None
+
+        return {'entries': entry_list, 'total': total}
 
 
 @login_required
@@ -727,154 +684,70 @@ def get_all_distribution(request):
         if request.GET['include_manager'] == 'false':
             include_manager = False
 
-    if request.user.is_staff:
-        cur.execute("SELECT id, name, parent_id FROM projects;")
-    else:
-        # get a list of users this person should be able to see (if manager, their team[s])
-        user_id_list = get_user_list(request.user.username, include_manager=include_manager)
-        print "User list:", user_id_list
-        cur.execute("SELECT distinct(projects.id), projects.name, parent_id FROM projects "
-                    "INNER JOIN members ON projects.id = members.project_id "
-                    "INNER JOIN users ON users.id = members.user_id "
-                    "WHERE users.id in %(users)s;" % {'users': user_id_list})
-
-    all_projects = cur.fetchall()
-
-    parent_projects = []
-
-    # first run through and identify all of the parent projects
-    for project in all_projects:
-        if project[2] is None:
-            # then we have a parent project.  See if it already exists in the parent projects list
-            parent_found = False
-            for parent in parent_projects:
-                if parent['id'] == project[0]:
-                    parent_found = True
-
-            if not parent_found:
-                # then add what we have
-                parent_obj = {
-                    'id': project[0],
-                    'name': project[1],
-                    'subprojects': [],
-                    'total_hours': 0.0,
-                    'percent': 0.0
-                }
-                parent_projects.append(parent_obj)
-            continue
-
-        # otherwise, this is a sub project, so let's see if we can find our parent
-        parent_found = False
-        for parent in parent_projects:
-            if parent['id'] == project[2]:
-                parent_found = True
-
-                parent['subprojects'].append(
-                    {
-                        'id': project[0],
-                        'name': project[1],
-                        'total_hours': 0.0,
-                        'percent': 0.0
-                    }
-                )
-
-        if not parent_found:
-            # then add what we have
-            parent_obj = {
-                'id': project[2],
-                'name': None,
-                'subprojects': [
-                    {
-                        'id': project[0],
-                        'name': project[1],
-                        'total_hours': 0.0,
-                        'percent': 0.0
-                    }
-                ],
-                'total_hours': 0.0,
-                'percent': 0.0
-            }
-            parent_projects.append(parent_obj)
-
-    # now run through each parent project and make sure we have a name for it
-    for project in parent_projects:
-        if project['name'] is None:
-            cur.execute("SELECT name FROM projects WHERE id = %(id)s;" % {
-                'id': project['id']
-            })
-            name = cur.fetchone()[0]
-            project['name'] = name
+    # the projects this person should be able to see (if manager, their team[s]), as (parent, project) pairs: each
+    # sub-project under its parent, and every parent under itself for the hours logged to the parent directly
+    visible = "SELECT id, name, parent_id FROM projects"
+    entry_filter = ""
+    params = [request.GET['start_date'], request.GET['end_date']]
+    if not request.user.is_staff:
+        user_id_list = get_user_list(request.user.username, as_json=True, include_manager=include_manager)
+        visible += " WHERE id IN (SELECT project_id FROM members WHERE user_id = ANY(%s))"
+        entry_filter = "AND time_entries.user_id = ANY(%s) "
+        params = [user_id_list] + params + [user_id_list]
+
+    # one grouped query: ROLLUP adds each parent's total and the grand total to the per-project sums
+    cur.execute(
+        "WITH visible AS (" + visible + "), "
+        "nodes AS (SELECT parent_id AS root_id, id AS project_id FROM visible WHERE parent_id IS NOT NULL "
+        "UNION SELECT COALESCE(parent_id, id), COALESCE(parent_id, id) FROM visible), "
+        "totals AS (SELECT nodes.root_id, nodes.project_id, GROUPING(nodes.root_id, nodes.project_id) AS level, "
+        "SUM(time_entries.hours) AS hours FROM nodes "
+        "LEFT JOIN time_entries ON time_entries.project_id = nodes.project_id "
+        "AND time_entries.spent_on >= %s::date AND time_entries.spent_on <= %s::date " + entry_filter +
+        "GROUP BY ROLLUP (nodes.root_id, nodes.project_id)) "
+        "SELECT totals.level, totals.root_id, roots.name, totals.project_id, children.name, totals.hours FROM totals "
+        "LEFT JOIN projects roots ON roots.id = totals.root_id "
+        "LEFT JOIN projects children ON children.id = totals.project_id "
+        "ORDER BY roots.name, totals.root_id, totals.level DESC, children.name;", params)
 
     total_hours = 0.0
-
-    parent_list = parent_projects
-
-    for parent_project in parent_list:
-        for sub_project in parent_project['subprojects']:
-
-            if request.user.is_staff:
-                cur.execute("SELECT sum(hours) FROM time_entries WHERE project_id = %(project)s AND "
-                            "spent_on >= '%(start)s' and spent_on <= '%(end)s';" % {
-                                'start': request.GET['start_date'],
-                                'end': request.GET['end_date'],
-                                'project': sub_project['id']
-                            })
-            else:
-                # get a list of users this person should be able to see (if manager, their team[s])
-                user_id_list = get_user_list(request.user.username, include_manager=include_manager)
-                cur.execute("SELECT sum(hours) FROM time_entries "
-                            "INNER JOIN users ON time_entries.user_id = users.id "
-                            "WHERE project_id = %(project)s AND "
-                            "spent_on >= '%(start)s' and spent_on <= '%(end)s' "
-                            "AND users.id in %(user)s;" % {
-                                'start': request.GET['start_date'],
-                                'end': request.GET['end_date'],
-                                'project': sub_project['id'],
-                                'user': user_id_list
-                            })
-            hours = cur.fetchone()
-            if hours[0] is not None or hours[0] > 0:
-                sub_project['total_hours'] = hours[0]
-                parent_project['total_hours'] += hours[0]
-                total_hours += hours[0]
-
-        # THEN check for hours logged to the parent project
-        if request.user.is_staff:
-            cur.execute("SELECT sum(hours) FROM time_entries WHERE project_id = %(project)s AND "
-                        "spent_on >= '%(start)s' and spent_on <= '%(end)s';" % {
-                            'start': request.GET['start_date'],
-                            'end': request.GET['end_date'],
-                            'project': parent_project['id']
-                        })
-        else:
-            # get a list of users this person should be able to see (if manager, their team[s])
-            user_id_list = get_user_list(request.user.username, include_manager=include_manager)
-            cur.execute("SELECT sum(hours) FROM time_entries "
-                        "INNER JOIN users ON time_entries.user_id = users.id "
-                        "WHERE project_id = %(project)s AND "
-                        "spent_on >= '%(start)s' and spent_on <= '%(end)s' "
-                        "AND users.id in %(user)s;" % {
-                            'start': request.GET['start_date'],
-                            'end': request.GET['end_date'],
-                            'project': parent_project['id'],
-                            'user': user_id_list
-                        })
-        hours = cur.fetchone()
-        if hours[0] is not None or hours[0] > 0:
-            # then we need to make sure to add the parent as one of its sub-projects (so it shows on the outer ring)
-            i_am_my_own_child = {
-                'id': parent_project['id'],
-                'name': parent_project['name'],
-                'total_hours': hours[0],
+    parent_list = []
+    parents = {}
+    own_hours = {}
+    for row in cur.fetchall():
+        level, root_id, root_name, project_id, project_name, hours = row
+        if level == 3:
+            # the grand total
+            total_hours = hours or 0.0
+        elif level == 1:
+            # a parent's total (its sub-projects and its own hours)
+            parents[root_id] = {
+                'id': root_id,
+                'name': root_name,
+                'subprojects': [],
+                'total_hours': hours or 0.0,
                 'percent': 0.0
             }
-            parent_project['subprojects'].append(i_am_my_own_child)
-            parent_project['total_hours'] += hours[0]
-            total_hours += hours[0]
-
-            # parent_project['subprojects'].append(s_obj)
+            parent_list.append(parents[root_id])
+        elif project_id == root_id:
+            # hours logged to the parent itself show as one of its sub-projects (so it shows on the outer ring)
+            if hours is not None:
+                own_hours[root_id] = {
+                    'id': project_id,
+                    'name': project_name,
+                    'total_hours': hours,
+                    'percent': 0.0
+                }
+        else:
+            parents[root_id]['subprojects'].append({
+                'id': project_id,
+                'name': project_name,
+                'total_hours': hours if hours is not None else 0.0,
+                'percent': 0.0
+            })
 
-        # parent_list.append(parent_obj)
+    for root_id in own_hours:
+        parents[root_id]['subprojects'].append(own_hours[root_id])
 
     # now run through and calculate percentages
     for parent in parent_list:
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from time_management.reports import build_weekly_report_file
+
+
+class Command(BaseCommand):
+    help = 'Builds the weekly report and makes it the one served by the weekly report page.  Meant to run nightly.'
+
+    def handle(self, *args, **options):
+        path = build_weekly_report_file()
+        self.stdout.write(self.style.SUCCESS('Weekly report written to %s' % path))
@@ -1,4 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError 
+from time_management.custom_fields import custom_field_registry, SUPERVISOR_EMAILS_FIELD_NAME, \
+    MINIMUM_HOURS_FIELD_NAME
 import datetime
 import os
 import psycopg2
@@ -28,14 +30,10 @@ class Command(BaseCommand):
         cursor = connection.cursor()
 
         # get the custom field id for supervisor lists
-        cursor.execute(
-            "SELECT id FROM custom_fields WHERE name = 'Supervisor Notification Emails' AND type='UserCustomField';")
-        custom_field_id = cursor.fetchone()
+        custom_field_id = custom_field_registry.field_id(SUPERVISOR_EMAILS_FIELD_NAME, 'UserCustomField', cursor)
         if custom_field_id is None:
             self.stdout.write(
                 self.style.ERROR('Failed to find custom field "Supervisor Notification Emails" for users.'))
-        else:
-            custom_field_id = custom_field_id[0]
 
 
 
@@ -67,8 +65,8 @@ class Command(BaseCommand):
                               cursor=cursor)
 
             # get the expected hours (first check if there is a value defined, otherwise use the default)
-            cursor.execute("SELECT id, default_value FROM custom_fields WHERE type = 'UserCustomField' and name = 'Minimum Weekly Hours Required';")
-            min_hours_record = cursor.fetchone()
+            min_hours_field = custom_field_registry.find(MINIMUM_HOURS_FIELD_NAME, 'UserCustomField', cursor)
+            min_hours_record = (min_hours_field.id, min_hours_field.default_value)
 
             cursor.execute("SELECT value FROM custom_values WHERE custom_field_id = %(min_hours_id)s AND customized_id = %(user_id)s;" % {
                 'user_id': user[0],
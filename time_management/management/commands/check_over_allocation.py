@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+import datetime
+
+from time_management.allocation import get_over_allocations, OVER_ALLOCATION_LIMIT
+
+
+class Command(BaseCommand):
+    help = 'Reports every developer whose project assignments add up to more than 100% on some days.  ' \
+           'Meant to run nightly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Check all of history instead of today onward.')
+        parser.add_argument('--limit', type=float, default=OVER_ALLOCATION_LIMIT,
+                            help='Allocation (1.0 = 100%%) a developer may not exceed.')
+
+    def handle(self, *args, **options):
+        since = datetime.date.today()
+        if options['all']:
+            since = None
+
+        developers = get_over_allocations(since=since, limit=options['limit'])
+        if len(developers) == 0:
+            self.stdout.write(self.style.SUCCESS('No developers are over-allocated.'))
+            return
+
+        for developer in developers:
+            for span in developer['spans']:
+                self.stdout.write('%s (%s): %s to %s, peaking at %.0f%%' % (
+                    developer['developer'], developer['developer_id'], span['start'].isoformat(),
+                    span['end'].isoformat(), span['peak'] * 100))
+
+        self.stdout.write(self.style.WARNING('%s developer(s) are over-allocated.' % len(developers)))
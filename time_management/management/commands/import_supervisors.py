@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
+from time_management.custom_fields import custom_field_registry, SUPERVISOR_EMAILS_FIELD_NAME
 import datetime
 import psycopg2
 import csv
@@ -20,12 +21,9 @@ class Command(BaseCommand):
         cursor = connection.cursor()
 
         # get the custom field id for supervisor lists
-        cursor.execute("SELECT id FROM custom_fields WHERE name = 'Supervisor Notification Emails' AND type='UserCustomField';")
-        custom_field_id = cursor.fetchone()
+        custom_field_id = custom_field_registry.field_id(SUPERVISOR_EMAILS_FIELD_NAME, 'UserCustomField', cursor)
         if custom_field_id is None:
             self.stdout.write(self.style.ERROR('Failed to find custom field "Supervisor Notification Emails" for users.'))
-        else:
-            custom_field_id = custom_field_id[0]
 
         # try to open the file
         try:
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from time_management.entry_sync import install_entry_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Installs the trigger that leaves a tombstone in time_entry_tombstones for every deleted time entry.  ' \
+           'Run it after migrating; running it again is safe.'
+
+    def handle(self, *args, **options):
+        install_entry_tombstones()
+        self.stdout.write(self.style.SUCCESS('Entry tombstone trigger installed.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from time_management.decorators import install_table_versions
+
+
+class Command(BaseCommand):
+    help = 'Installs the triggers that keep table_versions current for the tables polled endpoints are validated ' \
+           'against.  Run it after migrating; running it again is safe.'
+
+    def handle(self, *args, **options):
+        install_table_versions()
+        self.stdout.write(self.style.SUCCESS('Table version triggers installed.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from time_management.entry_index import install_entry_index
+
+
+class Command(BaseCommand):
+    help = 'Installs the triggers on time_entries that keep the entry indexes current and rebuilds the indexes. ' \
+           'Run it after migrating; running it again is safe.'
+
+    def handle(self, *args, **options):
+        install_entry_index()
+        self.stdout.write(self.style.SUCCESS('Entry index triggers installed and indexes rebuilt.'))
@@ -81,4 +81,79 @@ class Enumeration(models.Model):
 
     class Meta:
         managed = False
-        db_table = 'enumerations'
\ No newline at end of file
+        db_table = 'enumerations'
+
+
+class ProjectSnapshot(models.Model):
+    """
+    One project's line of the weekly report on the day it was built, kept so trends don't have to be recomputed from
+    time_entries and project_distribution.
+    """
+    project = models.ForeignKey('Project', models.DO_NOTHING)
+    taken_on = models.DateField()
+    budget = models.DecimalField(max_digits=14, decimal_places=2)
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    fte = models.DecimalField(max_digits=8, decimal_places=2)
+    end_date = models.DateField(blank=True, null=True)
+    projected_spending = models.DecimalField(max_digits=14, decimal_places=2)
+    hours = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        db_table = 'project_snapshots'
+        unique_together = ('project', 'taken_on')
+
+
+class ActivityRecency(models.Model):
+    """
+    The first and last day a project (kind 'project') or a user (kind 'user') has time logged, kept up to date from
+    time_entries by time_management.entry_index.
+    """
+    kind = models.CharField(max_length=10)
+    object_id = models.IntegerField()
+    first_spent_on = models.DateField()
+    last_spent_on = models.DateField()
+
+    class Meta:
+        db_table = 'activity_recency'
+        unique_together = ('kind', 'object_id')
+        index_together = [('kind', 'last_spent_on')]
+
+
+class EntryPeriod(models.Model):
+    """
+    A year and month with time logged and how many entries it has, kept up to date from time_entries by
+    time_management.entry_index.
+    """
+    year = models.IntegerField()
+    month = models.IntegerField()
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'entry_periods'
+        unique_together = ('year', 'month')
+
+
+class EntryTombstone(models.Model):
+    """
+    A deleted time entry, left by a trigger on time_entries and kept for a day so clients syncing changes (see
+    time_management.entry_sync) can drop it.
+    """
+    entry_id = models.IntegerField()
+    user_id = models.IntegerField()
+    deleted_on = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'time_entry_tombstones'
+        index_together = [('user_id', 'deleted_on')]
+
+
+class TableVersion(models.Model):
+    """
+    How many statements have written a table, bumped by trigger (see time_management.decorators) and used to tell
+    whether a polled response may have changed.
+    """
+    name = models.CharField(max_length=63, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'table_versions'
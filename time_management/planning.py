@@ -2,10 +2,18 @@ import json
 
 import datetime
 from django.contrib.auth.decorators import login_required
-from django.db import connection
+from django.db import connection, transaction
 from django.shortcuts import HttpResponse, render
 
 from time_tools import date_working_hours, manager_date_working_hours
+from time_management.fte_timeline import FTETimeline
+from time_management.custom_fields import BUDGET_FIELD, SPENT_FIELD, START_DATE_FIELD, END_DATE_FIELD, \
+    PLANNING_FIELD, REQUIRED_EFFORT_FIELD
+from time_management.allocation import get_over_allocations, OVER_ALLOCATION_LIMIT
+from time_management.availability import availability_index
+from time_management.scenarios import Scenario, ScenarioTimeline, compare_scenarios, get_session_scenarios, \
+    save_session_scenario, delete_session_scenario, load_scenario_rows, scenario_changes, invalidate_baseline
+from time_management.bulk_sql import values_clause
 
 
 @login_required
@@ -19,15 +27,15 @@ def planning_home(request):
     cur = connection.cursor()
 
     cur.execute("SELECT projects.id, name FROM projects INNER JOIN custom_values ON custom_values.customized_id = "
-                "projects.id WHERE custom_field_id = 17 AND value = '1';")
+                "projects.id WHERE custom_field_id = %(field)s AND value = '1';" % {'field': PLANNING_FIELD})
     projects = cur.fetchall()
     context['projects'] = []
     total_required = 0
     for project in projects:
         cur.execute(
             "SELECT min(value), max(value) FROM custom_values WHERE customized_id = %(project)s "
-            "AND (custom_field_id = 16 OR custom_field_id = 15);" % {
-                'project': project[0]})
+            "AND (custom_field_id = %(end)s OR custom_field_id = %(start)s);" % {
+                'project': project[0], 'end': END_DATE_FIELD, 'start': START_DATE_FIELD})
         dates = cur.fetchall()
         if len(dates) > 0 and dates[0][0] != '' and dates[0][1] != '' and dates[0][0] != dates[0][1]:
             start_date = str(dates[0][0])
@@ -38,8 +46,8 @@ def planning_home(request):
 
         # get the required effort, if it exists
         cur.execute(
-            "SELECT value FROM custom_values WHERE customized_id = %(project)s AND custom_field_id = 18;" % {
-                'project': project[0]})
+            "SELECT value FROM custom_values WHERE customized_id = %(project)s AND custom_field_id = %(field)s;" % {
+                'project': project[0], 'field': REQUIRED_EFFORT_FIELD})
         effort = cur.fetchall()
         if len(effort) > 0:
             effort = effort[0][0]
@@ -93,38 +101,26 @@ def planning_home(request):
 def get_all_dev_assignments(request):
     cur = connection.cursor()
 
+    # grab the active developers along with their manager and today's assignment in one pass
     cur.execute(
-        'SELECT users.firstname||\' \'||users.lastname, users.id, programmers.manager FROM users '
-        'INNER JOIN programmers ON programmers.user_id = users.id WHERE programmers.active = TRUE '
-        'ORDER BY users.lastname;')
+        'SELECT users.firstname||\' \'||users.lastname, users.id, programmers.manager, '
+        'supervisors.firstname||\' \'||supervisors.lastname, supervisors.id, COALESCE(today.percentage, 0) '
+        'FROM users INNER JOIN programmers ON programmers.user_id = users.id '
+        'LEFT JOIN users supervisors ON supervisors.id = programmers.supervisor '
+        'LEFT JOIN (SELECT "user", SUM(percentage) AS percentage FROM project_distribution '
+        'WHERE "from" <= CURRENT_DATE AND "to" >= CURRENT_DATE GROUP BY "user") today ON today.user = users.id '
+        'WHERE programmers.active = TRUE ORDER BY users.lastname;')
     programmers = cur.fetchall()
 
     list = []
     for dev in programmers:
-        # get their manager info
-        cur.execute(
-            "SELECT users.firstname||' '||users.lastname, users.id FROM users "
-            "INNER JOIN programmers ON programmers.supervisor = users.id WHERE programmers.user_id = %(user)s;" % {
-                'user': dev[1]})
-        manager_info = cur.fetchone()
-
-        # get their current assignment values as of today
-        cur.execute(
-            'SELECT SUM(percentage) FROM project_distribution WHERE "user" = %(user)s '
-            'AND "from" <= CURRENT_DATE AND "to" >= CURRENT_DATE;' % {
-                'user': dev[1]})
-        current_assignment = cur.fetchone()[0]
-        if current_assignment is None:
-            current_assignment = 0
-        if manager_info is None:
-            manager_info = [None, None]
         new_entry = {
             'developer': dev[0],
             'developer_id': dev[1],
             'supervisor': dev[2],
-            'manager_name': manager_info[0],
-            'manager_id': manager_info[1],
-            'today_assignment': (current_assignment * 100)
+            'manager_name': dev[3],
+            'manager_id': dev[4],
+            'today_assignment': (dev[5] * 100)
         }
         list.append(new_entry)
 
@@ -174,8 +170,8 @@ def get_assignments(request):
     else:
         cur.execute(
             "SELECT min(value::date), max(value::date) FROM custom_values "
-            "WHERE customized_id = %(project)s AND (custom_field_id = 16 OR custom_field_id = 15);" % {
-                'project': request.GET['project']})
+            "WHERE customized_id = %(project)s AND (custom_field_id = %(end)s OR custom_field_id = %(start)s);" % {
+                'project': request.GET['project'], 'end': END_DATE_FIELD, 'start': START_DATE_FIELD})
     dates = cur.fetchall()
     if len(dates) > 0 and dates[0][0] is not None and dates[0][1] is not None:
         start_date = str(dates[0][0])
@@ -189,8 +185,9 @@ def get_assignments(request):
         cur.execute("SELECT fte_requirements FROM prospective_projects WHERE id = %(project)s;" % {
             'project': request.GET['project']})
     else:
-        cur.execute("SELECT value FROM custom_values WHERE customized_id = %(project)s AND custom_field_id = 18;" % {
-            'project': request.GET['project']})
+        cur.execute(
+            "SELECT value FROM custom_values WHERE customized_id = %(project)s AND custom_field_id = %(field)s;" % {
+                'project': request.GET['project'], 'field': REQUIRED_EFFORT_FIELD})
     effort = cur.fetchall()
     if len(effort) > 0:
         effort = effort[0]
@@ -228,8 +225,8 @@ def get_planning_projection(request):
     project_id = request.GET['project']
 
     # get project budget
-    cur.execute("select value from custom_values where custom_field_id = 12 and customized_id = %(project)s;" % {
-        'project': project_id})
+    cur.execute("select value from custom_values where custom_field_id = %(field)s and customized_id = %(project)s;" % {
+        'project': project_id, 'field': BUDGET_FIELD})
     budget = cur.fetchone()[0]
 
     future_spending_hours = 0
@@ -262,8 +259,8 @@ def get_planning_projection(request):
     future_spending_cost = future_spending_hours * float(rate)
 
     # how much have we spent so far?
-    cur.execute("select value from custom_values where custom_field_id = 13 and customized_id = %(project)s;" % {
-        'project': project_id})
+    cur.execute("select value from custom_values where custom_field_id = %(field)s and customized_id = %(project)s;" % {
+        'project': project_id, 'field': SPENT_FIELD})
     spent = cur.fetchone()[0]
 
     total_projected_spending = float(spent) + float(future_spending_cost)
@@ -291,16 +288,7 @@ def developer_assignments(request):
 
     assignment_list = []
     for assignment in assignments:
-        new_assignment = {
-            'project_id': assignment[1],
-            'project': assignment[0],
-            'effort': assignment[2],
-            'start': str(assignment[3]),
-            'end': str(assignment[4] + datetime.timedelta(days=1)),
-            'entry_id': assignment[5],
-            'class': assignment[6]
-        }
-        assignment_list.append(new_assignment)
+        assignment_list.append(format_assignment(assignment))
 
     # get their manager info
     cur.execute(
@@ -321,6 +309,222 @@ def developer_assignments(request):
     return HttpResponse(json.dumps(context))
 
 
+def format_assignment(assignment):
+    """
+    Converts a (project name, project id, effort, from, to, entry id, class) row from project_distribution into the
+    dictionary the vis.js timeline expects.  The timeline treats the end date as exclusive, so we push it out a day.
+    """
+    return {
+        'project_id': assignment[1],
+        'project': assignment[0],
+        'effort': assignment[2],
+        'start': str(assignment[3]),
+        'end': str(assignment[4] + datetime.timedelta(days=1)),
+        'entry_id': assignment[5],
+        'class': assignment[6]
+    }
+
+
+def get_team_timeline(cur):
+    """
+    Returns every active developer with their supervisor and all of their project_distribution rows.  Only two
+    queries are run (developers, then every assignment for those developers) and the assignments are grouped here.
+    """
+    today = datetime.date.today()
+
+    cur.execute(
+        "SELECT users.firstname||' '||users.lastname, users.id, programmers.manager, "
+        "supervisors.firstname||' '||supervisors.lastname, supervisors.id "
+        "FROM users INNER JOIN programmers ON programmers.user_id = users.id "
+        "LEFT JOIN users supervisors ON supervisors.id = programmers.supervisor "
+        "WHERE programmers.active = TRUE ORDER BY users.lastname;")
+    programmers = cur.fetchall()
+
+    developers = []
+    developer_index = {}
+    for dev in programmers:
+        new_entry = {
+            'developer': dev[0],
+            'developer_id': dev[1],
+            'supervisor': dev[2],
+            'manager_name': dev[3],
+            'manager_id': dev[4],
+            'today_assignment': 0,
+            'assignments': []
+        }
+        developers.append(new_entry)
+        developer_index[dev[1]] = new_entry
+
+    cur.execute(
+        'SELECT projects.name, projects.id, (percentage * 100)::text, "from", "to", '
+        'project_distribution.id, \'\'::text, project_distribution.user, percentage FROM project_distribution '
+        'INNER JOIN projects ON projects.id = project_distribution.project '
+        'INNER JOIN programmers ON programmers.user_id = project_distribution.user '
+        'WHERE programmers.active = TRUE ORDER BY "from";')
+    assignments = cur.fetchall()
+
+    for assignment in assignments:
+        developer = developer_index.get(assignment[7])
+        if developer is None:
+            continue
+        developer['assignments'].append(format_assignment(assignment))
+        if assignment[3] <= today <= assignment[4]:
+            developer['today_assignment'] += assignment[8] * 100
+
+    return developers
+
+
+@login_required
+def get_team_assignments(request):
+    cur = connection.cursor()
+
+    context = {
+        'active_devs': get_team_timeline(cur)
+    }
+
+    return HttpResponse(json.dumps(context))
+
+
+@login_required
+def get_fte_timeline(request):
+    """
+    Per-day allocated FTE for every developer and project between start and end (YYYY-MM-DD), for planning charts.
+    """
+    start = datetime.datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+
+    timeline = FTETimeline.load(start, end)
+    developer_ids = set(timeline.developer_ids)
+    project_ids = set(timeline.project_ids)
+
+    # lay a saved what-if scenario over the live assignments
+    if 'scenario' in request.GET and request.GET['scenario'] != '':
+        scenario = [s for s in get_session_scenarios(request.session) if s.name == request.GET['scenario']]
+        if len(scenario) == 0:
+            return HttpResponse('No such scenario')
+        rows, managers = load_scenario_rows(scenario, connection.cursor())
+        timeline = ScenarioTimeline(timeline, scenario_changes(scenario[0], rows, managers))
+        developer_ids.update(timeline.delta.developer_ids)
+        project_ids.update(timeline.delta.project_ids)
+
+    developer_list = []
+    for dev in sorted(developer_ids):
+        developer_list.append({
+            'id': dev,
+            'fte': timeline.developer_fte(dev, start, end).round(3).tolist()
+        })
+
+    project_list = []
+    for project in sorted(project_ids):
+        project_list.append({
+            'id': project,
+            'fte': timeline.project_fte(project, start, end).round(3).tolist()
+        })
+
+    context = {
+        'dates': [(start + datetime.timedelta(days=i)).isoformat() for i in range((end - start).days + 1)],
+        'developers': developer_list,
+        'projects': project_list
+    }
+
+    return HttpResponse(json.dumps(context))
+
+
+@login_required
+def over_allocations(request):
+    """
+    Lists every developer whose assignments add up to more than 100% on some days, from today onward unless
+    ?all=true is passed.
+    """
+    since = datetime.date.today()
+    if request.GET.get('all') == 'true':
+        since = None
+
+    limit = OVER_ALLOCATION_LIMIT
+    if 'limit' in request.GET and request.GET['limit'] != '':
+        limit = float(request.GET['limit'])
+
+    developers = get_over_allocations(since=since, limit=limit)
+    for developer in developers:
+        for span in developer['spans']:
+            span['start'] = span['start'].isoformat()
+            span['end'] = span['end'].isoformat()
+            span['peak'] = span['peak'] * 100
+
+    return HttpResponse(json.dumps({'developers': developers}))
+
+
+@login_required
+def available_developers(request):
+    """
+    Ranks the active developers by how much capacity they have free on every day between start and end
+    (YYYY-MM-DD), keeping only those with at least min_free (1.0 = 100%).
+    """
+    start = datetime.datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+
+    min_free = 0.0
+    if 'min_free' in request.GET and request.GET['min_free'] != '':
+        min_free = float(request.GET['min_free'])
+
+    context = {
+        'developers': availability_index.available(start, end, min_free)
+    }
+
+    return HttpResponse(json.dumps(context))
+
+
+@login_required
+def get_scenarios(request):
+    scenarios = []
+    for scenario in get_session_scenarios(request.session):
+        scenarios.append(dict(scenario.to_session(), name=scenario.name))
+
+    return HttpResponse(json.dumps(scenarios))
+
+
+@login_required
+def save_scenario(request):
+    """
+    Saves a what-if staffing scenario to the planner's session.  The changes are JSON:
+    {"added": [{developer, project, effort, start, end}], "removed": [entry ids], "changed": [{entry_id, ...}]}
+    """
+    changes = json.loads(request.GET['changes'])
+    scenario = Scenario(request.GET['name'], changes.get('added'), changes.get('removed'), changes.get('changed'))
+    save_session_scenario(request.session, scenario)
+
+    return HttpResponse('200')
+
+
+@login_required
+def remove_scenario(request):
+    delete_session_scenario(request.session, request.GET['name'])
+
+    return HttpResponse('200')
+
+
+@login_required
+def compare_planning_scenarios(request):
+    """
+    Projects the spending of the live plan and each of the session's scenarios (or just those listed in names[]),
+    for the given projects[] or every project the scenarios touch.
+    """
+    scenarios = get_session_scenarios(request.session)
+    names = request.GET.getlist('names[]')
+    if len(names) > 0:
+        scenarios = [scenario for scenario in scenarios if scenario.name in names]
+
+    project_ids = None
+    if len(request.GET.getlist('projects[]')) > 0:
+        project_ids = []
+        for project in request.GET.getlist('projects[]'):
+            if not project.startswith('new_'):
+                project = int(project)
+            project_ids.append(project)
+
+    return HttpResponse(json.dumps(compare_scenarios(scenarios, project_ids)))
+
+
 @login_required
 def deactivate(request):
     cur = connection.cursor()
@@ -367,9 +571,14 @@ def update_supervisor(request):
 def remove_assignment(request):
     cur = connection.cursor()
 
-    cur.execute("DELETE FROM project_distribution WHERE id = %(id)s;" % {'id': request.GET['entry_id']})
+    cur.execute("DELETE FROM project_distribution WHERE id = %(id)s RETURNING \"user\";" % {
+        'id': request.GET['entry_id']})
+    removed = cur.fetchone()
     connection.commit()
 
+    if removed is not None:
+        availability_index.invalidate_developer(removed[0])
+
     return HttpResponse('200')
 
 
@@ -391,4 +600,161 @@ def add_assignment(request):
                 'from': request.GET['start'], 'to': request.GET['end']})
     connection.commit()
 
+    availability_index.invalidate_developer(request.GET['developer'])
+
     return HttpResponse('200')
+
+
+def parse_assignment_operations(operations):
+    """
+    Validates a list of assignment operations and sorts them by the statement that will apply them.  Supported
+    operations (with their keys) are:
+        add (developer, project, effort, start, end), update (entry_id and any of effort, start, end),
+        remove (entry_id), activate (developer), deactivate (developer), supervisor (developer, supervisor)
+    :return: (plan, errors) - errors is a list of messages, empty when everything is valid
+    """
+    plan = {'add': [], 'update': [], 'remove': [], 'activate': [], 'deactivate': [], 'supervisor': []}
+    errors = []
+    entries = set()
+
+    def to_date(value):
+        if value is None or value == '':
+            return None
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+    for i, operation in enumerate(operations):
+        op = operation.get('op')
+        try:
+            if op == 'add':
+                project = str(operation['project'])
+                prospect = None
+                if project.startswith('new_'):
+                    prospect = int(project.replace('new_', ''))
+                    project = None
+                else:
+                    project = int(project)
+                start = to_date(operation['start'])
+                end = to_date(operation['end'])
+                effort = float(operation['effort'])
+                if start is None or end is None or start > end:
+                    errors.append('Operation %s: the start date must come before the end date' % i)
+                if effort <= 0:
+                    errors.append('Operation %s: effort must be greater than zero' % i)
+                plan['add'].append((int(operation['developer']), project, prospect, effort, start, end))
+            elif op == 'update' or op == 'remove':
+                entry_id = int(operation['entry_id'])
+                if entry_id in entries:
+                    errors.append('Operation %s: entry %s is changed more than once' % (i, entry_id))
+                entries.add(entry_id)
+                if op == 'remove':
+                    plan['remove'].append(entry_id)
+                    continue
+                effort = operation.get('effort')
+                if effort is not None and effort != '':
+                    effort = float(effort)
+                    if effort <= 0:
+                        errors.append('Operation %s: effort must be greater than zero' % i)
+                else:
+                    effort = None
+                start = to_date(operation.get('start'))
+                end = to_date(operation.get('end'))
+                if start is not None and end is not None and start > end:
+                    errors.append('Operation %s: the start date must come before the end date' % i)
+                plan['update'].append((entry_id, effort, start, end))
+            elif op == 'activate' or op == 'deactivate':
+                plan[op].append(int(operation['developer']))
+            elif op == 'supervisor':
+                supervisor = operation.get('supervisor')
+                if supervisor is not None and supervisor != 'None' and supervisor != '':
+                    supervisor = int(supervisor)
+                else:
+                    supervisor = None
+                plan['supervisor'].append((int(operation['developer']), supervisor))
+            else:
+                errors.append('Operation %s: unknown operation "%s"' % (i, op))
+        except (KeyError, ValueError, TypeError) as e:
+            errors.append('Operation %s: invalid or missing value (%s)' % (i, e))
+
+    return plan, errors
+
+
+def apply_assignment_plan(plan, cur):
+    """
+    Applies a validated plan with one statement per kind of change.  Must be called inside a transaction.
+    :return: (ids of the new project_distribution rows, ids of every developer whose assignments changed)
+    """
+    developers = set()
+
+    if len(plan['remove']) > 0:
+        cur.execute('DELETE FROM project_distribution WHERE id = ANY(%s) RETURNING "user";', [plan['remove']])
+        developers.update(row[0] for row in cur.fetchall())
+
+    if len(plan['update']) > 0:
+        values, params = values_clause(plan['update'], '(%s, %s::double precision, %s::date, %s::date)')
+        cur.execute('UPDATE project_distribution SET '
+                    'percentage = COALESCE(changes.percentage, project_distribution.percentage), '
+                    '"from" = COALESCE(changes.start, project_distribution."from"), '
+                    '"to" = COALESCE(changes.finish, project_distribution."to") '
+                    'FROM (VALUES ' + values + ') AS changes (id, percentage, start, finish) '
+                    'WHERE project_distribution.id = changes.id RETURNING project_distribution.user;', params)
+        developers.update(row[0] for row in cur.fetchall())
+
+    created = []
+    if len(plan['add']) > 0:
+        values, params = values_clause(plan['add'], '(%s, %s, %s, %s, %s::date, %s::date)')
+        cur.execute('INSERT INTO project_distribution ("user", project, prospective_project, percentage, "from", "to") '
+                    'VALUES ' + values + ' RETURNING id, "user";', params)
+        for row in cur.fetchall():
+            created.append(row[0])
+            developers.add(row[1])
+
+    if len(plan['activate']) > 0:
+        cur.execute('INSERT INTO programmers (user_id, active) SELECT DISTINCT new_ids.id, TRUE '
+                    'FROM unnest(%s) AS new_ids (id) '
+                    'WHERE NOT EXISTS (SELECT 1 FROM programmers WHERE programmers.user_id = new_ids.id);',
+                    [plan['activate']])
+        cur.execute('UPDATE programmers SET active = TRUE WHERE user_id = ANY(%s);', [plan['activate']])
+        developers.update(plan['activate'])
+
+    if len(plan['deactivate']) > 0:
+        cur.execute('UPDATE programmers SET active = FALSE WHERE user_id = ANY(%s);', [plan['deactivate']])
+        developers.update(plan['deactivate'])
+
+    if len(plan['supervisor']) > 0:
+        values, params = values_clause(plan['supervisor'], '(%s, %s::integer)')
+        cur.execute('UPDATE programmers SET supervisor = changes.supervisor '
+                    'FROM (VALUES ' + values + ') AS changes (user_id, supervisor) '
+                    'WHERE programmers.user_id = changes.user_id;', params)
+
+    return created, developers
+
+
+@login_required
+def bulk_update_assignments(request):
+    """
+    Applies a JSON list of assignment operations (see parse_assignment_operations) as a single transaction and
+    returns the updated team timeline.  Nothing is written if any operation is invalid.
+    """
+    if not request.user.is_staff:
+        return HttpResponse("I'm afraid I can't do that...")
+
+    operations = json.loads(request.GET['operations'])
+    plan, errors = parse_assignment_operations(operations)
+    if len(errors) > 0:
+        return HttpResponse(json.dumps({'errors': errors}), status=400)
+
+    cur = connection.cursor()
+    with transaction.atomic():
+        created, developers = apply_assignment_plan(plan, cur)
+
+    # everything derived from project_distribution is now stale
+    for developer in developers:
+        availability_index.invalidate_developer(developer)
+    invalidate_baseline()
+
+    context = {
+        'created': created,
+        'active_devs': get_team_timeline(cur)
+    }
+
+    return HttpResponse(json.dumps(context))
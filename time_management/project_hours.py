@@ -2,8 +2,11 @@ from django.shortcuts import render, HttpResponse
 import datetime
 import json
 
+from django.contrib.auth.decorators import login_required
 from django.db import connection
 
+from time_management.decorators import conditional_get
+
 
 def project_hours_page(request):
     cursor = connection.cursor()
@@ -82,6 +85,8 @@ def generate_turbo_weeks(start_date, end_date):
     return week_list
 
 
+@login_required
+@conditional_get('project_hours')
 def get_project_hours(request):
     user_list = request.GET.getlist('users[]')
     start = datetime.datetime.strptime(request.GET['start'], '%m/%d/%Y')
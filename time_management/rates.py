@@ -3,6 +3,7 @@ from django.shortcuts import render, HttpResponse
 import datetime
 from pr.settings.base import LOGGING_CATEGORY_NAME
 from time_management.decorators import user_is_in_manager_group
+from time_management.custom_fields import custom_field_registry
 from django.contrib.auth.decorators import login_required
 
 
@@ -38,14 +39,7 @@ def rates_home(request):
         })
 
     # get a list of categories that this could be for
-    cur.execute("select possible_values from custom_fields "
-                "where lower(name) = lower(%s);", [LOGGING_CATEGORY_NAME])
-
-    categories = cur.fetchall()
-    category_list = []
-    for category in categories[0][0].split('\n')[1:]:
-        if category[2:] != '':
-            category_list.append(category[2:])
+    category_list = custom_field_registry.possible_values(LOGGING_CATEGORY_NAME, cur)
 
 
     # compute next fiscal year ranges
@@ -178,14 +172,7 @@ def add_rates(request):
     cur = connection.cursor()
 
     # get a list of categories that this could be for
-    cur.execute("select possible_values from custom_fields "
-                "where lower(name) = lower(%s);", [LOGGING_CATEGORY_NAME])
-
-    categories = cur.fetchall()
-    category_list = []
-    for category in categories[0][0].split('\n')[1:]:
-        if category[2:] != '':
-            category_list.append(category[2:])
+    category_list = custom_field_registry.possible_values(LOGGING_CATEGORY_NAME, cur)
 
     for category in category_list:
         cur.execute("INSERT INTO charge_rates "
@@ -7,6 +7,8 @@ import csv
 import costs
 from django.contrib.auth.decorators import login_required
 from time_management.decorators import user_is_in_manager_group
+from time_management.entry_index import get_periods
+from time_management.custom_fields import FOPAL_FIELD, PI_FIELD, FINANCIAL_PI_FIELD, MISSING_HOURS_FIELD
 
 
 class RedmineProject:
@@ -45,8 +47,8 @@ def get_children(input_parent_id):
     for child in children:
         cur.execute(
             "SELECT value FROM custom_values WHERE customized_id = %(project)s AND customized_type='Project' "
-            "AND custom_field_id = 4" % {
-                'project': child[0]})
+            "AND custom_field_id = %(field)s" % {
+                'project': child[0], 'field': FOPAL_FIELD})
         fopal = cur.fetchone()
         if fopal is not None:
             fopal = fopal[0]
@@ -55,9 +57,9 @@ def get_children(input_parent_id):
 
         # get financial pi list
         cur.execute(
-            'SELECT value FROM custom_values WHERE custom_field_id = 10 AND customized_id = %(project)s '
+            'SELECT value FROM custom_values WHERE custom_field_id = %(field)s AND customized_id = %(project)s '
             'AND customized_type = \'Project\';' % {
-                'project': child[0]})
+                'project': child[0], 'field': FINANCIAL_PI_FIELD})
         fpi = cur.fetchall()
         if len(fpi) >= 1:
             try:
@@ -178,13 +180,8 @@ def report_generator_home(request):
             'month': lastMonth.strftime('%m'), 'year': lastMonth.strftime('%Y'), 'list': required_list})
     missing_hours = cur.fetchall()
 
-    # gather a list of all years
-    cur.execute("SELECT DISTINCT tyear FROM time_entries ORDER BY tyear;")
-    dbyears = cur.fetchall()
-
-    # gather a list of all months (should always be 1-12)
-    cur.execute("SELECT DISTINCT tmonth FROM time_entries ORDER BY tmonth;")
-    dbmonths = cur.fetchall()
+    # gather a list of all years and months with time logged (months should always be 1-12)
+    dbyears, dbmonths = get_periods(cur)
 
     # close our database connection
     connection.close()
@@ -223,15 +220,15 @@ def report_generator_home(request):
     year_list = []
     for year in dbyears:
         new_year = {}  # haha...new year...
-        new_year['year'] = year[0]
+        new_year['year'] = year
         year_list.append(new_year)
 
     # loop through the months, constructing a month dictionary
     month_list = []
     for month in dbmonths:
         new_month = {}
-        new_month['number'] = month[0]
-        new_month['name'] = calendar.month_name[month[0]]
+        new_month['number'] = month
+        new_month['name'] = calendar.month_name[month]
         month_list.append(new_month)
 
     # generate our context to pass through
@@ -548,9 +545,9 @@ def generate_csr_report(request):
 
             # get the project FOPAL
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 4 '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s '
                 'AND customized_id = %(project)s AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': FOPAL_FIELD})
             fopal = cur.fetchall()
             if len(fopal) >= 1:
                 fopal = fopal[0][0]
@@ -559,9 +556,9 @@ def generate_csr_report(request):
 
             # get the financially responsible PI (if any)
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 10 '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s '
                 'AND customized_id = %(project)s AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': FINANCIAL_PI_FIELD})
             fpi = cur.fetchall()
             if len(fpi) >= 1:
                 try:
@@ -575,9 +572,9 @@ def generate_csr_report(request):
 
             # get the PI list
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 6 '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s '
                 'AND customized_id = %(project)s AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': PI_FIELD})
             pi = cur.fetchall()
             if len(pi) >= 1:
                 pi = pi[0][0]
@@ -770,9 +767,9 @@ def generate_external_report(request):
 
             # get the project FOPAL
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 4 AND customized_id = %(project)s '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s AND customized_id = %(project)s '
                 'AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': FOPAL_FIELD})
             fopal = cur.fetchall()
             if len(fopal) >= 1:
                 fopal = fopal[0][0]
@@ -781,9 +778,9 @@ def generate_external_report(request):
 
             # get the financially responsible PI (if any)
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 10 AND customized_id = %(project)s '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s AND customized_id = %(project)s '
                 'AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': FINANCIAL_PI_FIELD})
             fpi = cur.fetchall()
             if len(fpi) >= 1:
                 try:
@@ -797,9 +794,9 @@ def generate_external_report(request):
 
             # get the PI list
             cur.execute(
-                'SELECT value FROM custom_values WHERE custom_field_id = 6 AND customized_id = %(project)s '
+                'SELECT value FROM custom_values WHERE custom_field_id = %(field)s AND customized_id = %(project)s '
                 'AND customized_type = \'Project\';' % {
-                    'project': project})
+                    'project': project, 'field': PI_FIELD})
             pi = cur.fetchall()
             if len(pi) >= 1:
                 pi = pi[0][0]
@@ -955,8 +952,8 @@ def missing_hours(request):
     # gather a list of all projects
     cur.execute(
         "SELECT projects.id, projects.name FROM projects WHERE projects.id IN (SELECT customized_id "
-        "FROM custom_values WHERE customized_type='Project' AND custom_field_id = 11 AND value = '1') "
-        "ORDER BY projects.name;")
+        "FROM custom_values WHERE customized_type='Project' AND custom_field_id = %(field)s AND value = '1') "
+        "ORDER BY projects.name;" % {'field': MISSING_HOURS_FIELD})
     dbprojects = cur.fetchall()
 
     # total list of projects
@@ -967,15 +964,15 @@ def missing_hours(request):
         # get the fopal for this project
         cur.execute(
             "SELECT value FROM custom_values WHERE customized_id = %(project)s "
-            "AND customized_type='Project' AND custom_field_id = 4" % {
-                'project': project[0]})
+            "AND customized_type='Project' AND custom_field_id = %(field)s" % {
+                'project': project[0], 'field': FOPAL_FIELD})
         fopal = cur.fetchone()[0]
 
         # get the financially responsible PI (if any)
         cur.execute(
-            'SELECT value FROM custom_values WHERE custom_field_id = 10 '
+            'SELECT value FROM custom_values WHERE custom_field_id = %(field)s '
             'AND customized_id = %(project)s AND customized_type = \'Project\';' % {
-                'project': project[0]})
+                'project': project[0], 'field': FINANCIAL_PI_FIELD})
         fpi = cur.fetchall()
         if len(fpi) >= 1:
             try:
@@ -1,185 +1,291 @@
 import datetime
+import json
+import os
+import threading
+from django.conf import settings
 from django.db import connection
 from django.shortcuts import HttpResponse
-from openpyxl import Workbook
 from holidays import get_holidays
 from django.contrib.auth.decorators import login_required
+from time_management.bulk_sql import values_clause
+from time_management.custom_fields import WEEKLY_REPORT_FIELD, BUDGET_FIELD, SPENT_FIELD, END_DATE_FIELD
+from time_management.excel import ExcelWriter, Column, excel_response, MONEY_FORMAT, PERCENT_FORMAT, \
+    DECIMAL_FORMAT, DATE_FORMAT
+
+# the prebuilt weekly report files, and the pointer naming the current one
+WEEKLY_REPORT_POINTER = 'current'
+WEEKLY_REPORT_VERSIONS_KEPT = 7
+
+weekly_report_build = {'thread': None}
+weekly_report_lock = threading.Lock()
 
 
 @login_required
 def weekly_report_form_url(request):
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="WeeklyReport.xls"'
+    """
+    Serves the prebuilt weekly report (see the build_weekly_report command).  With ?fresh=1 the report is rebuilt in
+    the background instead and a 202 is returned; the new file is served once the build finishes.
+    """
+    if request.GET.get('fresh') == '1':
+        started = rebuild_weekly_report_in_background()
+        return HttpResponse(json.dumps({'building': True, 'started': started}), status=202)
+
+    path = current_weekly_report_path()
+    if path is None:
+        # nothing has been built yet
+        path = build_weekly_report_file()
+
+    response = excel_response('WeeklyReport.xlsx')
+    with open(path, 'rb') as report_file:
+        response.write(report_file.read())
+    return response
+
+
+def current_weekly_report_path():
+    """
+    Returns the path of the current weekly report file, or None if none has been built.
+    """
+    try:
+        with open(os.path.join(settings.WEEKLY_REPORT_DIR, WEEKLY_REPORT_POINTER), 'r') as pointer:
+            name = pointer.read().strip()
+    except IOError:
+        return None
+
+    path = os.path.join(settings.WEEKLY_REPORT_DIR, name)
+    if name == '' or not os.path.exists(path):
+        return None
+    return path
+
+
+def build_weekly_report_file():
+    """
+    Writes the weekly report to a new versioned file, then points "current" at it.  The pointer is replaced with a
+    rename, so readers always see either the old report or the new one, never a partly written file.
+    """
+    report_dir = settings.WEEKLY_REPORT_DIR
+    if not os.path.isdir(report_dir):
+        os.makedirs(report_dir)
+
+    name = 'WeeklyReport-%s.xlsx' % datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    path = os.path.join(report_dir, name)
+    project_list = get_weekly_report_projects()
+    save_project_snapshots(project_list)
+    with open(path + '.tmp', 'wb') as report_file:
+        generate_weekly_report(report_file, project_list)
+    os.rename(path + '.tmp', path)
+
+    pointer = os.path.join(report_dir, WEEKLY_REPORT_POINTER)
+    with open(path + '.pointer', 'w') as pointer_file:
+        pointer_file.write(name)
+    os.rename(path + '.pointer', pointer)
+
+    # keep a few previous versions around, drop the rest
+    versions = sorted(version for version in os.listdir(report_dir)
+                      if version.startswith('WeeklyReport-') and version.endswith('.xlsx'))
+    for version in versions[:-WEEKLY_REPORT_VERSIONS_KEPT]:
+        os.remove(os.path.join(report_dir, version))
+
+    return path
+
+
+def save_project_snapshots(project_list, cur=None):
+    """
+    Stores today's line of the report for every project.  Building the report again on the same day replaces them.
+    """
+    if len(project_list) == 0:
+        return
+    if cur is None:
+        cur = connection.cursor()
+
+    today = datetime.date.today()
+    values, params = values_clause([(project['id'], today, project['budget'], project['spent'], project['fte'],
+                                     project['end'], project['projected_spending'], project['hours'])
+                                    for project in project_list], '(%s, %s, %s, %s, %s, %s::date, %s, %s)')
+    cur.execute('INSERT INTO project_snapshots (project_id, taken_on, budget, spent, fte, end_date, '
+                'projected_spending, hours) VALUES ' + values + ' '
+                'ON CONFLICT (project_id, taken_on) DO UPDATE SET budget = EXCLUDED.budget, spent = EXCLUDED.spent, '
+                'fte = EXCLUDED.fte, end_date = EXCLUDED.end_date, '
+                'projected_spending = EXCLUDED.projected_spending, hours = EXCLUDED.hours;', params)
 
-    return generate_weekly_report(response)
 
-
-def generate_weekly_report(file_out):
-    # get a list of all projects we should include in the report
+@login_required
+def get_project_trend(request):
+    """
+    Returns the stored weekly snapshots of the given projects (every snapshotted project if none are given), oldest
+    first, optionally limited to a start/end date range (YYYY-MM-DD).
+    """
     cur = connection.cursor()
 
-    cur.execute("select sum(hours), projects.name, project_id "
-                "FROM time_entries "
-                "INNER JOIN projects ON time_entries.project_id = projects.id "
-                "INNER JOIN custom_values ON custom_values.customized_id = time_entries.project_id "
-                "WHERE custom_values.custom_field_id = 19 "
-                "AND custom_values.value = '1' "
-                "AND spent_on >= (current_date - interval '7 days') "
-                "GROUP BY projects.name, project_id;")
-
+    conditions = []
+    params = []
+    projects = request.GET.getlist('projects[]')
+    if len(projects) > 0:
+        conditions.append('project_snapshots.project_id = ANY(%s)')
+        params.append([int(project) for project in projects])
+    if 'start' in request.GET:
+        conditions.append('taken_on >= %s')
+        params.append(request.GET['start'])
+    if 'end' in request.GET:
+        conditions.append('taken_on <= %s')
+        params.append(request.GET['end'])
+
+    where = ''
+    if len(conditions) > 0:
+        where = 'WHERE ' + ' AND '.join(conditions) + ' '
+
+    cur.execute('SELECT project_snapshots.project_id, projects.name, taken_on, budget, spent, fte, end_date, '
+                'projected_spending, hours FROM project_snapshots '
+                'INNER JOIN projects ON projects.id = project_snapshots.project_id ' + where +
+                'ORDER BY projects.name, project_snapshots.project_id, taken_on;', params)
+
+    context = []
+    for row in cur.fetchall():
+        if len(context) == 0 or context[-1]['project_id'] != row[0]:
+            context.append({
+                'project_id': row[0],
+                'project': row[1],
+                'snapshots': []
+            })
+        context[-1]['snapshots'].append({
+            'date': row[2].isoformat(),
+            'budget': float(row[3]),
+            'spent': float(row[4]),
+            'fte': float(row[5]),
+            'end_date': row[6].isoformat() if row[6] is not None else None,
+            'projected_spending': float(row[7]),
+            'hours': float(row[8])
+        })
+
+    return HttpResponse(json.dumps(context))
+
+
+def rebuild_weekly_report_in_background():
+    """
+    Starts a background rebuild of the weekly report unless one is already running.  Returns whether one was started.
+    """
+    with weekly_report_lock:
+        thread = weekly_report_build['thread']
+        if thread is not None and thread.is_alive():
+            return False
+
+        thread = threading.Thread(target=run_weekly_report_build)
+        thread.daemon = True
+        weekly_report_build['thread'] = thread
+        thread.start()
+        return True
+
+
+def run_weekly_report_build():
+    try:
+        build_weekly_report_file()
+    finally:
+        # the thread got its own database connection, don't leave it open
+        connection.close()
+
+
+def get_weekly_report_projects():
+    """
+    Gathers every project flagged for the weekly report (WEEKLY_REPORT_FIELD) that billed hours in the past 7 days,
+    along with its budget, spending, today's FTE effort and projected spending.  The whole report takes two queries.
+    """
+    cur = connection.cursor()
+    today = datetime.date.today()
+
+    cur.execute("SELECT hours.hours, projects.name, projects.id, budget.value, spent.value, end_dates.value, "
+                "COALESCE(fte.fte, 0) "
+                "FROM (SELECT project_id, SUM(hours) AS hours FROM time_entries "
+                "WHERE spent_on >= (%s::date - interval '7 days') GROUP BY project_id) hours "
+                "INNER JOIN projects ON projects.id = hours.project_id "
+                "INNER JOIN custom_values flagged ON flagged.customized_id = projects.id "
+                "AND flagged.custom_field_id = %s AND flagged.value = '1' "
+                "LEFT JOIN custom_values budget ON budget.customized_id = projects.id AND budget.custom_field_id = %s "
+                "LEFT JOIN custom_values spent ON spent.customized_id = projects.id AND spent.custom_field_id = %s "
+                "LEFT JOIN custom_values end_dates ON end_dates.customized_id = projects.id "
+                "AND end_dates.custom_field_id = %s "
+                "LEFT JOIN (SELECT project, SUM(percentage) AS fte FROM project_distribution "
+                "WHERE \"from\" <= %s AND \"to\" >= %s GROUP BY project) fte ON fte.project = projects.id "
+                "ORDER BY projects.name;",
+                [today, WEEKLY_REPORT_FIELD, BUDGET_FIELD, SPENT_FIELD, END_DATE_FIELD, today, today])
     projects = cur.fetchall()
 
     project_list = []
     for project in projects:
-        proj = {
+        end_date = None
+        if project[5] not in (None, ''):
+            end_date = datetime.datetime.strptime(project[5], '%Y-%m-%d').date()
+
+        project_list.append({
             'name': project[1],
             'id': project[2],
-            'hours': project[0]
-        }
-
-        # get the budget
-        cur.execute("SELECT value FROM custom_values WHERE custom_field_id = 12 AND customized_id = %(project_id)s;"
-                    % {'project_id': project[2]})
-        proj['budget'] = (float(cur.fetchone()[0]))
-
-        # get the accumulated amount spent
-        cur.execute("SELECT value FROM custom_values WHERE custom_field_id = 13 AND customized_id = %(project_id)s;" % {
-            'project_id': project[2]})
-        proj['spent'] = (float(cur.fetchone()[0]))
-
-        # get the start date
-        cur.execute("SELECT value FROM custom_values WHERE custom_field_id = 15 AND customized_id = %(project_id)s;" % {
-            'project_id': project[2]})
-        proj['start_date'] = cur.fetchone()[0]
-
-        # get the end date
-        cur.execute("SELECT value FROM custom_values WHERE custom_field_id = 16 AND customized_id = %(project_id)s;" % {
-            'project_id': project[2]})
-        proj['end_date'] = cur.fetchone()[0]
-
-        # get the FTE effort for TODAY
-        cur.execute("SELECT SUM(percentage) FROM project_distribution WHERE \"from\" <= now() AND \"to\" >= now() "
-                    "AND project = %(proj)s;" % {'proj': proj['id']})
-        effort = cur.fetchone()
-        if len(effort) > 0:
-            proj['fte'] = effort[0]
-        else:
-            proj['fte'] = '0'
-
-        # run through each day between now and the project's end date.
-        current_day = datetime.datetime.now()
-        end_date = datetime.datetime.strptime(proj['end_date'], '%Y-%m-%d')
+            'hours': project[0],
+            'budget': float(project[3] or 0),
+            'spent': float(project[4] or 0),
+            'end_date': project[5],
+            'end': end_date,
+            'fte': project[6]
+        })
+
+    # the projection for every project comes from one statement: each assignment is expanded into the working days
+    # between today and the project's end date, and each day is priced at that day's internal programming rate
+    projected = {}
+    report = [project for project in project_list if project['end'] is not None and project['end'] >= today]
+    if len(report) > 0:
+        holiday_dates = []
+        for year in range(today.year, max(project['end'] for project in report).year + 1):
+            holiday_dates += [holiday['date'] for holiday in get_holidays(year)]
+
+        cur.execute("SELECT report.project, SUM(project_distribution.percentage * rates.rate) "
+                    "FROM unnest(%s::integer[], %s::date[]) AS report (project, end_date) "
+                    "INNER JOIN project_distribution ON project_distribution.project = report.project "
+                    "CROSS JOIN LATERAL generate_series(GREATEST(project_distribution.\"from\", %s)::timestamp, "
+                    "LEAST(project_distribution.\"to\", report.end_date)::timestamp, interval '1 day') AS days (day) "
+                    "CROSS JOIN LATERAL (SELECT rate FROM charge_rates WHERE start_date <= days.day "
+                    "AND end_date >= days.day AND category = 'Programming' AND internal = TRUE LIMIT 1) AS rates "
+                    "WHERE EXTRACT(ISODOW FROM days.day) < 6 AND NOT days.day::date = ANY(%s::date[]) "
+                    "GROUP BY report.project;",
+                    [[project['id'] for project in report], [project['end'] for project in report], today,
+                     holiday_dates])
+        for row in cur.fetchall():
+            projected[row[0]] = float(row[1] or 0)
 
+    for project in project_list:
         # remember projected spending is IN ADDITION to what's already spent...
-        projected_spending = proj['spent']
-        while current_day <= end_date:
-            # is this a working day?
-            # ...first check for holidays
-            if current_day in get_holidays(current_day.year):
-                current_day = current_day + datetime.timedelta(days=1)
-                continue
-
-            # ...then check if we are on a weekend
-            if current_day.weekday() > 4:
-                current_day = current_day + datetime.timedelta(days=1)
-                continue
-
-            # for each day, figure out the FTE effort
-            cur.execute(
-                "SELECT SUM(percentage) FROM project_distribution WHERE \"from\" <= '%(day)s' AND \"to\" >= '%(day)s' "
-                "AND project = %(proj)s;" % {
-                    'proj': proj['id'], 'day': current_day})
-            effort = cur.fetchone()
-            if len(effort) > 0:
-                effort = effort[0]
-            else:
-                effort = 0
-
-            # go get the charge rate for this day
-            cur.execute(
-                "SELECT rate FROM charge_rates WHERE start_date <= '%(date)s' AND end_date >= '%(date)s' "
-                "AND category = 'Programming' AND internal = TRUE;" % {
-                    'date': current_day
-                }
-            )
-            rate = cur.fetchone()
-            if len(rate) > 0:
-                rate = rate[0]
-            else:
-                rate = 0
-
-            # now we can add the product of today's rate and effort to the projected spending
-            projected_spending += (float(rate) * float(effort))
-
-            current_day = current_day + datetime.timedelta(days=1)
-
-        proj['projected_spending'] = projected_spending
+        project['projected_spending'] = project['spent'] + projected.get(project['id'], 0.0)
 
         # the ratio is: [projected spending] / [budget]
-        proj['projected_ratio'] = '{:,.2f}%'.format((projected_spending / float(proj['budget']) * 100))
-
-        project_list.append(proj)
-
-    # create an active worksheet for our excel file
-    wb = Workbook()
-    ws = wb.active
-
-    # The Headers
-    ws['B1'] = 'Project'
-    ws['C1'] = 'Budget'
-    ws['D1'] = 'Spent'
-    ws['E1'] = 'FTE Effort'
-    ws['F1'] = 'End Date'
-    ws['G1'] = 'Projected Spending'
-    ws['H1'] = 'Projected Spending Ratio'
-    ws['I1'] = 'Billed Hours (past 7 days)'
-
-    # style headers
-    # header_font = Font(color=colors.WHITE)
-    # header_bg = PatternFill(fill_type=None, start_color='000000', end_color='000000')
-    # font color
-    # ws['B1'].font.color.index = 'FFFFFF'
-    # ws['C1'].font.color.index = 'FFFFFF'
-    # ws['D1'].font.color.index = 'FFFFFF'
-    # ws['E1'].font.color.index = 'FFFFFF'
-    # ws['F1'].font.color.index = 'FFFFFF'
-    # ws['G1'].font.color.index = 'FFFFFF'
-    # ws['H1'].font.color.index = 'FFFFFF'
-    # ws['I1'].font.color.index = 'FFFFFF'
-
-    # background fill type
-    # ws['B1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['C1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['D1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['E1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['F1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['G1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['H1'].style.fill.fill_type = Fill.FILL_SOLID
-    # ws['I1'].style.fill.fill_type = Fill.FILL_SOLID
-
-    # background fill color
-    # ws['B1'].style.fill.start_color.index = '000000'
-    # ws['C1'].style.fill.start_color.index = '000000'
-    # ws['D1'].style.fill.start_color.index = '000000'
-    # ws['E1'].style.fill.start_color.index = '000000'
-    # ws['F1'].style.fill.start_color.index = '000000'
-    # ws['G1'].style.fill.start_color.index = '000000'
-    # ws['H1'].style.fill.start_color.index = '000000'
-    # ws['I1'].style.fill.start_color.index = '000000'
-
-    working_row = 2
+        if project['budget'] > 0:
+            project['projected_ratio'] = project['projected_spending'] / project['budget']
+        else:
+            project['projected_ratio'] = None
+
+    return project_list
+
+
+def generate_weekly_report(file_out, project_list=None):
+    if project_list is None:
+        project_list = get_weekly_report_projects()
+
+    report = ExcelWriter([
+        Column('Project', width=40),
+        Column('Budget', MONEY_FORMAT, 16),
+        Column('Spent', MONEY_FORMAT, 16),
+        Column('FTE Effort', DECIMAL_FORMAT, 12),
+        Column('End Date', DATE_FORMAT, 12),
+        Column('Projected Spending', MONEY_FORMAT, 20),
+        Column('Projected Spending Ratio', PERCENT_FORMAT, 24),
+        Column('Billed Hours (past 7 days)', DECIMAL_FORMAT, 26)
+    ], title='Weekly Report')
 
     for project in project_list:
-        ws['B'+str(working_row)] = project['name']
-        ws['C'+str(working_row)] = '${:,.2f}'.format(project['budget'])
-        ws['D'+str(working_row)] = '${:,.2f}'.format(project['spent'])
-        ws['E'+str(working_row)] = project['fte']
-        ws['F'+str(working_row)] = project['end_date']
-        ws['G'+str(working_row)] = '${:,.2f}'.format(project['projected_spending'])
-        ws['H'+str(working_row)] = project['projected_ratio']
-        ws['I'+str(working_row)] = project['hours']
-
-        working_row += 1
-
-    wb.save(file_out)
-    return file_out
+        report.append([
+            project['name'],
+            project['budget'],
+            project['spent'],
+            project['fte'],
+            project['end'],
+            project['projected_spending'],
+            project['projected_ratio'],
+            project['hours']
+        ])
+
+    return report.save(file_out)
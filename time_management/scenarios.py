@@ -0,0 +1,281 @@
+import datetime
+import threading
+
+from django.db import connection
+
+from time_management.custom_fields import BUDGET_FIELD, SPENT_FIELD
+from time_management.fte_timeline import FTETimeline, prospect_key
+
+# where a session keeps its scenarios
+SESSION_KEY = 'planning_scenarios'
+
+
+def parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class PlanningBaseline:
+    """
+    Projected hours for every project, computed once from the live project_distribution data.  Scenarios are
+    evaluated as differences against this, so the expensive part is shared by every scenario and every session.
+    """
+    def __init__(self, today, stamp, cur):
+        self.today = today
+        self.stamp = stamp
+        self.timeline = FTETimeline.load(today, cur=cur)
+        self.hours = self.timeline.all_project_hours()
+
+    def project_hours(self, project_id):
+        return self.hours.get(project_id, 0.0)
+
+
+baseline_cache = {'baseline': None}
+baseline_lock = threading.Lock()
+
+
+def distribution_stamp(cur):
+    """
+    A cheap checksum of project_distribution, so a baseline built by another process (or before an edit) is noticed.
+    """
+    cur.execute('SELECT count(*), COALESCE(sum(id), 0), COALESCE(sum(percentage), 0), '
+                'COALESCE(sum("from" - DATE \'2000-01-01\'), 0), COALESCE(sum("to" - DATE \'2000-01-01\'), 0) '
+                'FROM project_distribution;')
+    return tuple(cur.fetchone())
+
+
+def get_baseline(cur=None):
+    if cur is None:
+        cur = connection.cursor()
+
+    today = datetime.date.today()
+    stamp = distribution_stamp(cur)
+    with baseline_lock:
+        baseline = baseline_cache['baseline']
+        if baseline is None or baseline.today != today or baseline.stamp != stamp:
+            baseline = PlanningBaseline(today, stamp, cur)
+            baseline_cache['baseline'] = baseline
+    return baseline
+
+
+def invalidate_baseline():
+    baseline_cache['baseline'] = None
+
+
+class Scenario:
+    """
+    A what-if staffing plan: assignments to add, project_distribution rows to remove, and rows to change.  Nothing
+    is copied from the live data; the scenario only records its differences.
+    """
+    def __init__(self, name, added=None, removed=None, changed=None):
+        """
+        :param added: list of {'developer', 'project', 'effort', 'start', 'end'} dictionaries
+        :param removed: list of project_distribution ids
+        :param changed: list of {'entry_id', 'effort', 'start', 'end'} dictionaries (missing keys are left as is)
+        """
+        self.name = name
+        self.added = added or []
+        self.removed = [int(entry_id) for entry_id in (removed or [])]
+        self.changed = changed or []
+
+    @classmethod
+    def from_session(cls, name, data):
+        return cls(name, data.get('added'), data.get('removed'), data.get('changed'))
+
+    def to_session(self):
+        return {'added': self.added, 'removed': self.removed, 'changed': self.changed}
+
+    def touched_ids(self):
+        return self.removed + [int(change['entry_id']) for change in self.changed]
+
+
+def get_session_scenarios(session):
+    scenarios = []
+    for name, data in sorted(session.get(SESSION_KEY, {}).items()):
+        scenarios.append(Scenario.from_session(name, data))
+    return scenarios
+
+
+def save_session_scenario(session, scenario):
+    scenarios = session.get(SESSION_KEY, {})
+    scenarios[scenario.name] = scenario.to_session()
+    session[SESSION_KEY] = scenarios
+
+
+def delete_session_scenario(session, name):
+    scenarios = session.get(SESSION_KEY, {})
+    scenarios.pop(name, None)
+    session[SESSION_KEY] = scenarios
+
+
+def load_scenario_rows(scenarios, cur):
+    """
+    Loads, in two queries for any number of scenarios, the live rows the scenarios remove or change and the manager
+    flag of every developer they add.
+    """
+    entry_ids = set()
+    developer_ids = set()
+    for scenario in scenarios:
+        entry_ids.update(scenario.touched_ids())
+        for addition in scenario.added:
+            developer_ids.add(int(addition['developer']))
+
+    rows = {}
+    if len(entry_ids) > 0:
+        cur.execute('SELECT project_distribution.id, project_distribution.user, project_distribution.project, '
+                    'project_distribution.prospective_project, percentage, "from", "to", '
+                    'COALESCE(programmers.manager, FALSE) FROM project_distribution '
+                    'LEFT JOIN programmers ON programmers.user_id = project_distribution.user '
+                    'WHERE project_distribution.id = ANY(%s);', [list(entry_ids)])
+        for row in cur.fetchall():
+            project = row[2]
+            if project is None and row[3] is not None:
+                project = prospect_key(row[3])
+            rows[row[0]] = (row[1], project, row[4], row[5], row[6], row[7])
+
+    managers = {}
+    if len(developer_ids) > 0:
+        cur.execute('SELECT user_id, manager FROM programmers WHERE user_id = ANY(%s);', [list(developer_ids)])
+        for row in cur.fetchall():
+            managers[row[0]] = bool(row[1])
+
+    return rows, managers
+
+
+def scenario_changes(scenario, rows, managers):
+    """
+    Returns the scenario as signed assignments: removed (and the old side of changed) rows with a negative
+    percentage, added (and the new side of changed) rows with a positive one.
+    """
+    changes = []
+    for entry_id in scenario.removed:
+        if entry_id in rows:
+            row = rows[entry_id]
+            changes.append((row[0], row[1], -float(row[2]), row[3], row[4], row[5]))
+
+    for change in scenario.changed:
+        row = rows.get(int(change['entry_id']))
+        if row is None:
+            continue
+        changes.append((row[0], row[1], -float(row[2]), row[3], row[4], row[5]))
+        changes.append((row[0], row[1], float(change.get('effort', row[2])),
+                        parse_date(change.get('start', row[3])), parse_date(change.get('end', row[4])), row[5]))
+
+    for addition in scenario.added:
+        project = addition['project']
+        if not str(project).startswith('new_'):
+            project = int(project)
+        developer = int(addition['developer'])
+        changes.append((developer, project, float(addition['effort']), parse_date(addition['start']),
+                        parse_date(addition['end']), managers.get(developer, False)))
+
+    return changes
+
+
+class ScenarioTimeline:
+    """
+    The baseline timeline with a scenario's signed changes laid on top.  Only the changed intervals are turned into
+    matrices; every lookup is the baseline value plus the (usually tiny) difference.
+    """
+    def __init__(self, baseline_timeline, changes):
+        self.baseline = baseline_timeline
+        end_date = baseline_timeline.end_date
+        for change in changes:
+            end_date = max(end_date, change[4])
+        self.delta = FTETimeline(baseline_timeline.start_date, end_date, changes)
+
+    def developer_fte(self, user_id, start=None, end=None):
+        return add_series(self.baseline.developer_fte(user_id, start, end),
+                          self.delta.developer_fte(user_id, start, end))
+
+    def project_fte(self, project_id, start=None, end=None):
+        return add_series(self.baseline.project_fte(project_id, start, end),
+                          self.delta.project_fte(project_id, start, end))
+
+    def project_hours_delta(self, project_id):
+        return self.delta.project_hours(project_id)
+
+
+def add_series(baseline, delta):
+    """
+    Adds two per-day series that start on the same day, where the difference may run past the end of the baseline.
+    """
+    if len(delta) > len(baseline):
+        baseline, delta = delta, baseline
+    total = baseline.copy()
+    total[:len(delta)] += delta
+    return total
+
+
+def project_spending(project_ids, cur):
+    """
+    Returns the internal Programming rate for today and each project's (budget, spent) custom values.
+    """
+    cur.execute("SELECT rate FROM charge_rates WHERE internal = TRUE AND category = 'Programming' "
+                "AND start_date <= CURRENT_DATE AND end_date >= CURRENT_DATE LIMIT 1;")
+    rate = cur.fetchone()
+    rate = float(rate[0]) if rate is not None else 0.0
+
+    values = dict((project_id, [None, 0.0]) for project_id in project_ids)
+    real_ids = [project_id for project_id in project_ids if not str(project_id).startswith('new_')]
+    if len(real_ids) > 0:
+        cur.execute("SELECT customized_id, custom_field_id, value FROM custom_values "
+                    "WHERE custom_field_id IN (%s, %s) AND customized_id = ANY(%s);",
+                    [BUDGET_FIELD, SPENT_FIELD, real_ids])
+        for row in cur.fetchall():
+            if row[1] == BUDGET_FIELD:
+                values[row[0]][0] = row[2]
+            elif row[2] not in (None, ''):
+                values[row[0]][1] = float(row[2])
+
+    return rate, values
+
+
+def compare_scenarios(scenarios, project_ids=None, cur=None):
+    """
+    Projects the total spending of each scenario (and the live baseline) for the given projects, or for every
+    project one of the scenarios touches.  The baseline is shared, so each extra scenario only costs its changes.
+    """
+    if cur is None:
+        cur = connection.cursor()
+
+    baseline = get_baseline(cur)
+    rows, managers = load_scenario_rows(scenarios, cur)
+
+    timelines = []
+    projects = set(project_ids or [])
+    for scenario in scenarios:
+        # only the part of a change that is still in the future matters for the projection
+        changes = []
+        for change in scenario_changes(scenario, rows, managers):
+            if change[4] >= baseline.today:
+                changes.append((change[0], change[1], change[2], max(change[3], baseline.today), change[4],
+                                change[5]))
+        timeline = ScenarioTimeline(baseline.timeline, changes)
+        timelines.append((scenario.name, timeline))
+        if project_ids is None:
+            projects.update(timeline.delta.project_ids)
+
+    projects = sorted(projects)
+    rate, values = project_spending(projects, cur)
+
+    def projection(hours, project_id):
+        return {
+            'project': project_id,
+            'planned_spending': "%.2f" % round(values[project_id][1] + hours * rate, 2),
+            'project_budget': values[project_id][0]
+        }
+
+    results = [{
+        'scenario': None,
+        'projects': [projection(baseline.project_hours(project_id), project_id) for project_id in projects]
+    }]
+    for name, timeline in timelines:
+        results.append({
+            'scenario': name,
+            'projects': [projection(baseline.project_hours(project_id) + timeline.project_hours_delta(project_id),
+                                    project_id) for project_id in projects]
+        })
+
+    return results
@@ -0,0 +1,136 @@
+import datetime
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.db import connection
+from django.shortcuts import HttpResponse
+from dateutil.relativedelta import relativedelta
+
+from time_management.catalog import build_project_catalog, activity_catalog
+from time_management.custom_fields import custom_field_registry
+from time_management.models import RedmineUser
+from time_management.time_tools import get_user_list
+
+
+def get_team_members(user_ids, cur):
+    cur.execute("SELECT id, login, firstname, lastname FROM users WHERE id = ANY(%s) "
+                "ORDER BY firstname, lastname;", [user_ids])
+    return cur.fetchall()
+
+
+def get_team_projects(user_ids, cur):
+    """
+    Returns (user id, project id, project name, project status, member) for every project a team member belongs to
+    or has logged time against.
+    """
+    cur.execute(
+        "SELECT team.user_id, projects.id, projects.name, projects.status, bool_or(team.member) FROM ("
+        "SELECT user_id, project_id, true AS member FROM members WHERE user_id = ANY(%s) "
+        "UNION SELECT DISTINCT user_id, project_id, false FROM time_entries WHERE user_id = ANY(%s)) team "
+        "INNER JOIN projects ON projects.id = team.project_id "
+        "GROUP BY team.user_id, projects.id, projects.name, projects.status "
+        "ORDER BY team.user_id, projects.name;", [user_ids, user_ids])
+    return cur.fetchall()
+
+
+@login_required
+def get_team_entries(request):
+    """
+    Returns a month (?month=&year=) of entries for everyone on the user's teams, grouped by team member, so a
+    manager's dashboard loads with one request instead of one get_entries call per report.  The projects, activities
+    and "log as" options are sent once and shared by every member; each member only lists their project ids and
+    whether they belong to them.  Staff may pass ?manager= to see another manager's teams.
+    """
+    manager = request.user.username
+    if request.user.is_staff and request.GET.get('manager', '') != '':
+        manager = request.GET['manager']
+
+    try:
+        user_ids = get_user_list(manager, as_json=True)
+    except RedmineUser.DoesNotExist:
+        return HttpResponse(json.dumps({'error': 'Unknown user'}), status=404)
+
+    start = datetime.date(int(request.GET['year']), int(request.GET['month']), 1)
+    end = start + relativedelta(months=1)
+
+    cur = connection.cursor()
+
+    # every member's entries for the month in one pass
+    cur.execute(
+        "SELECT time_entries.user_id, time_entries.id, time_entries.project_id, projects.name, "
+        "time_entries.issue_id, time_entries.hours, time_entries.comments, enumerations.name, time_entries.spent_on, "
+        "custom_values.value, enumerations.id FROM time_entries "
+        "INNER JOIN custom_values ON custom_values.customized_id = time_entries.id "
+        "AND custom_values.customized_type = 'TimeEntry' AND custom_values.custom_field_id = %s "
+        "INNER JOIN projects ON projects.id = time_entries.project_id "
+        "INNER JOIN enumerations ON enumerations.id = time_entries.activity_id "
+        "WHERE time_entries.user_id = ANY(%s) AND time_entries.spent_on >= %s AND time_entries.spent_on < %s "
+        "AND custom_values.value != '' "
+        "ORDER BY time_entries.user_id, time_entries.spent_on, projects.name;",
+        [custom_field_registry.log_as_field(cur).id, user_ids, start, end])
+    entries = cur.fetchall()
+
+    members = {}
+    user_list = []
+    for member in get_team_members(user_ids, cur):
+        members[member[0]] = {
+            'id': member[0],
+            'login': member[1],
+            'name': member[2] + ' ' + member[3],
+            'entries': [],
+            'projects': [],
+            'total': 0,
+            'support': 0
+        }
+        user_list.append(members[member[0]])
+
+    for entry in entries:
+        member = members[entry[0]]
+        member['entries'].append({
+            'id': entry[1],
+            'project': entry[2],
+            'name': entry[3],
+            'issue': entry[4],
+            'hours': entry[5],
+            'comments': entry[6],
+            'activity': entry[7],
+            'date': entry[8].isoformat(),
+            'logas': entry[9],
+            'activity_id': entry[10],
+            'project_id': entry[2]
+        })
+
+        # billable and non-billable (support) hours are totalled separately
+        if 'non-billable' not in entry[7].lower():
+            member['total'] += entry[5]
+        else:
+            member['support'] += entry[5]
+
+    for member in user_list:
+        member['total'] = round(member['total'], 2)
+        member['support'] = round(member['support'], 2)
+
+    # projects are described once; members only refer to them
+    projects = {}
+    for row in get_team_projects(user_ids, cur):
+        members[row[0]]['projects'].append({'id': row[1], 'member': row[4]})
+        projects[row[1]] = {'id': row[1], 'name': row[2], 'active': row[3]}
+
+    catalog = build_project_catalog(projects.keys(), cur=cur)
+    project_list = []
+    for project in sorted(projects.values(), key=lambda p: p['name']):
+        project['activities'] = catalog[project['id']]['activities']
+        project_list.append(project)
+
+    logas_list = [{'name': value} for value in custom_field_registry.log_as_field(cur).possible_values]
+
+    context = {
+        'users': user_list,
+        'projects': project_list,
+        'activities': activity_catalog.get_activities(),
+        'logas': logas_list,
+        'start': start.isoformat(),
+        'end': (end - datetime.timedelta(days=1)).isoformat()
+    }
+
+    return HttpResponse(json.dumps(context))
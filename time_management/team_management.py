@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import user_passes_test
 
 from django.contrib.auth.decorators import login_required
 from time_management.models import TeamMember, RedmineUser, Team
-from time_management.decorators import user_is_in_manager_group
+from time_management.decorators import user_is_in_manager_group, conditional_get
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
@@ -55,6 +55,7 @@ def get_team_list():
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
+@conditional_get('teams')
 def get_teams(request):
     return HttpResponse(json.dumps(get_team_list()))
 
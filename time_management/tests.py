@@ -0,0 +1,119 @@
+import datetime
+import json
+
+import mock
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory
+
+from time_management import decorators, entry_sync
+from time_management.decorators import conditional_get, WATERMARK_TABLES
+
+def watermark(version):
+    return ['entry_periods:%s' % version]
+
+
+class ConditionalGetTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = []
+
+        patcher = mock.patch.object(decorators, 'connection')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.table_watermark = mock.patch.object(decorators, 'table_watermark', return_value=watermark(1))
+        self.table_watermark.start()
+        self.addCleanup(self.table_watermark.stop)
+
+        @conditional_get('dates')
+        def view(request):
+            self.calls.append(request)
+            return HttpResponse('{"years": []}')
+        self.view = view
+
+    def get(self, user='alice', staff=False, data=None, etag=None):
+        headers = {}
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        request = self.factory.get('/get_dates', data or {}, **headers)
+        request.user = mock.Mock(username=user, is_staff=staff)
+        return self.view(request)
+
+    def test_every_endpoint_has_tables(self):
+        for endpoint, tables in WATERMARK_TABLES.items():
+            self.assertTrue(len(tables) > 0, endpoint)
+
+    def test_first_request_runs_the_view_and_sets_an_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_matching_etag_is_answered_without_the_view(self):
+        etag = self.get()['ETag']
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_table_change_invalidates_the_etag(self):
+        etag = self.get()['ETag']
+        decorators.table_watermark.return_value = watermark(2)
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_the_user(self):
+        self.assertNotEqual(self.get(user='alice')['ETag'], self.get(user='bob')['ETag'])
+        self.assertNotEqual(self.get(staff=False)['ETag'], self.get(staff=True)['ETag'])
+
+    def test_etag_depends_on_the_query_string(self):
+        self.assertNotEqual(self.get(data={'start': '01/01/2018'})['ETag'],
+                            self.get(data={'start': '02/01/2018'})['ETag'])
+        self.assertEqual(self.get(data={'a': '1', 'b': '2'})['ETag'],
+                         self.get(data={'b': '2', 'a': '1'})['ETag'])
+
+    def test_watermark_is_read_for_the_endpoint_tables(self):
+        self.get()
+        self.assertEqual(decorators.table_watermark.call_args[0][0], WATERMARK_TABLES['dates'])
+
+    def test_watermark_key_follows_the_tables(self):
+        key = decorators.watermark_key('distribution', None)
+        self.assertEqual(decorators.watermark_key('distribution', None), key)
+        decorators.table_watermark.return_value = watermark(2)
+        self.assertNotEqual(decorators.watermark_key('distribution', None), key)
+
+    def test_no_watermark_means_no_etag(self):
+        decorators.table_watermark.return_value = None
+        response = self.get(etag='"anything"')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(decorators.watermark_key('distribution', None))
+
+
+class SyncEntriesTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.now = datetime.datetime(2026, 10, 19, 12, 0)
+
+        patchers = [mock.patch.object(entry_sync, 'connection'),
+                    mock.patch.object(entry_sync, 'sync_clock', return_value=self.now),
+                    mock.patch.object(entry_sync.RedmineUser.objects, 'get', return_value=mock.Mock(id=7))]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sync(self, token):
+        request = self.factory.get('/sync_entries', {'month': 10, 'year': 2026, 'token': token})
+        request.user = mock.Mock(username='alice', is_staff=True)
+        return entry_sync.sync_entries(request)
+
+    def test_token_round_trips(self):
+        self.assertEqual(entry_sync.decode_sync_token(entry_sync.encode_sync_token(self.now)), self.now)
+        self.assertIsNone(entry_sync.decode_sync_token('not a token'))
+
+    def test_token_older_than_the_tombstones_forces_a_reload(self):
+        token = entry_sync.encode_sync_token(self.now - entry_sync.SYNC_RETENTION)
+        response = self.sync(token)
+        self.assertEqual(json.loads(response.content), {'reset': True})
+        self.assertFalse(entry_sync.connection.cursor.return_value.execute.called)
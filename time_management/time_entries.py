@@ -1,11 +1,18 @@
 from django.shortcuts import HttpResponse, render
-from django.db import connection
+from django.db import connection, transaction
 import datetime
 import calendar
 import json
 from django.contrib.auth.decorators import login_required
-from time_management.decorators import user_is_in_manager_group
+from time_management.decorators import user_is_in_manager_group, conditional_get
 from time_management.time_tools import get_user_list, get_all_users
+from time_management.catalog import build_project_catalog, activity_catalog
+from time_management.custom_fields import custom_field_registry
+from time_management.entry_index import get_periods
+from time_management.bulk_sql import values_clause
+
+# the old record logged for an entry that was created
+NO_ENTRY = 'No Entry Existed'
 
 
 @login_required
@@ -32,30 +39,34 @@ def entries_home(request):
 
 @login_required
 # @user_is_in_manager_group
+@conditional_get('dates')
 def get_date_range(request):
     cur = connection.cursor()
 
-    # gather a list of all years
-    cur.execute("SELECT DISTINCT tyear FROM time_entries ORDER BY tyear;")
-    dbyears = cur.fetchall()
+    context = date_range_context(cur)
+    return HttpResponse(json.dumps(context))
+
 
-    # gather a list of all months (should always be 1-12)
-    cur.execute("SELECT DISTINCT tmonth FROM time_entries ORDER BY tmonth;")
-    dbmonths = cur.fetchall()
+def date_range_context(cur):
+    """
+    The months and years to offer in the month and year dropdowns.
+    """
+    # gather a list of all years and months with time logged (months should always be 1-12)
+    dbyears, dbmonths = get_periods(cur)
 
     # loop through the years, constructing a year dictionary
     year_list = []
     for year in dbyears:
         new_year = {}  # haha...new year...
-        new_year['year'] = year[0]
+        new_year['year'] = year
         year_list.append(new_year)
 
     # loop through the months, constructing a month dictionary
     month_list = []
     for month in dbmonths:
         new_month = {}
-        new_month['number'] = month[0]
-        new_month['name'] = calendar.month_name[month[0]]
+        new_month['number'] = month
+        new_month['name'] = calendar.month_name[month]
         month_list.append(new_month)
 
 
@@ -66,8 +77,7 @@ def get_date_range(request):
     if len(year_list) == 0:
         year_list.append({'year': datetime.datetime.today().year})
 
-    context = {'months': month_list, 'years': year_list}
-    return HttpResponse(json.dumps(context))
+    return {'months': month_list, 'years': year_list}
 
 
 @login_required
@@ -78,33 +88,26 @@ def get_project_activities(request):
     # connect to the database
     cur = connection.cursor()
 
-    # first get any that are specific to our project
-    cur.execute(
-        "SELECT name FROM enumerations WHERE type = 'TimeEntryActivity' and project_id = %(proj)s "
-        "and active = FALSE;" % {
-            'proj': project})
-    exclusions = cur.fetchall()
-    exclude_list = []
-    for ex in exclusions:
-        exclude_list.append(ex[0])
-
-    # now get the defaults
-    cur.execute(
-        "SELECT id, name FROM enumerations WHERE type = 'TimeEntryActivity' and active = TRUE and project_id is NULL;")
-    activity = cur.fetchall()
-
-    activity_list = []
-    for act in activity:
-        if act[1] in exclude_list:
-            continue
-        active = {}
-        active['id'] = act[0]
-        active['name'] = act[1]
-        activity_list.append(active)
+    catalog = build_project_catalog([int(project)], cur=cur)
+    activity_list = catalog[int(project)]['activities']
 
     return HttpResponse(json.dumps(activity_list))
 
 
+@login_required
+def invalidate_activities(request):
+    """
+    Drops the cached activity catalog, for when activities were changed in Redmine and shouldn't wait for the cache
+    to notice.
+    """
+    if not request.user.is_staff:
+        return HttpResponse("I'm afraid I can't do that...")
+
+    activity_catalog.invalidate()
+
+    return HttpResponse(json.dumps({'invalidated': True}))
+
+
 @login_required
 # @user_is_in_manager_group
 def update_entries(request):
@@ -121,114 +124,134 @@ def update_entries(request):
     # connect to the database
     cur = connection.cursor()
 
-    # let's do some security checks - run through each entry
-    # and make sure they are the owner of each one...unless they're a manager!
+    # new entries are logged for the target; existing ones stay with their owner
     target = user
     if 'target' in request.GET and request.GET['target'] is not None and request.GET['target'] != '':
         target = request.GET['target']
-    target_id = ''
-    for entry in entries:
-        if entry['id'] != 'new_entry':
-            cur.execute(
-                "SELECT users.login, users.id FROM users INNER JOIN time_entries "
-                "ON time_entries.user_id = users.id WHERE time_entries.id = %(entry)s;" % {
-                    'entry': entry['id']})
-            userid = cur.fetchone()
-            target = userid[0]
-            target_id = userid[1]
-            # get the list of users they're allowed to modify
-            if not request.user.is_staff:
-                user_list = get_user_list(username=request.user.username, as_json=True)
-                if target_id not in user_list and (not request.user.is_staff):
-                    return HttpResponse("Error 97")
-        else:
-            # otherwise, get the target_id
-            cur.execute("SELECT users.login, users.id FROM users WHERE login = '%(user)s';" % {'user': target})
-            userid = cur.fetchone()
-            target = userid[0]
-            target_id = userid[1]
-            # get the list of users they're allowed to modify
-            if not request.user.is_staff:
-                user_list = get_user_list(username=request.user.username, as_json=True)
-                if target_id not in user_list and (not request.user.is_staff):
-                    return HttpResponse("Error 97")
-
-    # now let's run through each entry and perform our update
-    for entry in entries:
-        # print entry
-        # format the date properly
-        edate = entry['date'].split('-')
-        entry_date = datetime.date(int(edate[0]), int(edate[1]), int(edate[2]))
-
-        # format the issue if emtpy
-        issue = 'null'
-        if entry['issue'] != '':
-            issue = entry['issue']
-
-        # grab the old record
-        if entry['id'] != 'new_entry':
-            query = "SELECT id, project_id, user_id, issue_id, hours, comments, activity_id, spent_on, " \
-                    "tyear, tmonth, tweek, created_on, updated_on FROM time_entries WHERE id = %(id)s;" % {
-                        'id': entry['id']}
-            cur.execute(query)
-            old_record = cur.fetchone()
-        else:
-            old_record = 'No Entry Existed'
-
-        # check the entry's ID...if it is "new_entry", then we insert
-        # otherwise we update
-        if entry['id'] == 'new_entry':
-            query = "INSERT INTO time_entries (project_id, user_id, spent_on, hours, comments, issue_id, " \
-                    "activity_id, tyear, tmonth, tweek, created_on, updated_on) VALUES (%(project)s, %(user)s, " \
-                    "'%(date)s', %(hours)s, '%(comments)s', %(issue)s, %(activity)s, %(year)s, %(month)s, " \
-                    "%(week)s, '%(now)s', '%(now)s') RETURNING *;" % {
-                        'project': entry['project'], 'user': target_id, 'date': entry['date'],
-                        'hours': float(entry['hours']),
-                        'comments': entry['comments'].replace("'", "''"), 'issue': issue, 'activity': entry['activity'],
-                        'year': edate[0], 'month': edate[1], 'week': entry_date.isocalendar()[1],
-                        'now': datetime.datetime.now().isoformat()}
-        else:
-            # construct the query
-            query = "UPDATE time_entries SET project_id = %(project)s, spent_on = '%(date)s', hours = %(hours)s, " \
-                    "comments = '%(comments)s', issue_id = %(issue)s, activity_id = %(activity)s, " \
-                    "tyear = %(year)s, tmonth = %(month)s, tweek = %(week)s WHERE id = %(entry_id)s " \
-                    "RETURNING *;" % {
-                        'project': entry['project'], 'date': entry['date'], 'hours': float(entry['hours']),
-                        'comments': entry['comments'].replace("'", "''"), 'issue': issue, 'activity': entry['activity'],
-                        'entry_id': entry['id'], 'year': edate[0], 'month': edate[1],
-                        'week': entry_date.isocalendar()[1]}
-
-        # execute the query
-        cur.execute(query)
-
-        # grab the id, if we need it
-        timeid = cur.fetchone()[0]
-
-        if entry['id'] == 'new_entry':
-            query = "INSERT INTO custom_values (customized_id, custom_field_id, value, customized_type) " \
-                    "VALUES (%(id)s, (SELECT id FROM custom_fields WHERE lower(name) like '%%task%%'), '%(value)s', 'TimeEntry');" % {
-                        'id': timeid, 'value': entry['logas']}
-        else:
-            query = "UPDATE custom_values SET value = '%(value)s' WHERE customized_id = %(id)s " \
-                    "AND custom_field_id = (select id from custom_fields where lower(name) like '%%task%%') " \
-                    "AND customized_type = 'TimeEntry';" % {
-                        'id': entry['id'], 'value': entry['logas']}
-        cur.execute(query)
-
-        # if the user performing this action is NOT the target, let's record this change...
-        if target != user:
-            query = "INSERT INTO time_entry_log (\"user\", old_record, new_record, \"timestamp\", target) " \
-                    "VALUES ('%(user)s', '%(old)s', '%(new)s', '%(time)s', '%(target)s');" % {
-                        'user': user, 'old': str(old_record).replace('\'', ''), 'new': str(entry).replace('\'', ''),
-                        'time': str(datetime.datetime.now()), 'target': target}
-            cur.execute(query)
 
-    # if we made it out ok, let's commit it!
-    connection.commit()
+    new_entries = [entry for entry in entries if entry['id'] == 'new_entry']
+    changed_entries = [entry for entry in entries if entry['id'] != 'new_entry']
+    now = datetime.datetime.now()
+
+    with transaction.atomic():
+        # grab the old records and their owners in one go, locking them until we're done
+        old_records = {}
+        owners = {}
+        if len(changed_entries) > 0:
+            cur.execute(
+                "SELECT time_entries.id, time_entries.project_id, time_entries.user_id, time_entries.issue_id, "
+                "time_entries.hours, time_entries.comments, time_entries.activity_id, time_entries.spent_on, "
+                "time_entries.tyear, time_entries.tmonth, time_entries.tweek, time_entries.created_on, "
+                "time_entries.updated_on, users.login FROM time_entries "
+                "INNER JOIN users ON users.id = time_entries.user_id "
+                "WHERE time_entries.id = ANY(%s) FOR UPDATE OF time_entries;",
+                [[int(entry['id']) for entry in changed_entries]])
+            for record in cur.fetchall():
+                old_records[record[0]] = record[:13]
+                owners[record[0]] = (record[13], record[2])
+
+            # an entry that no longer exists can't be saved over
+            if len(owners) != len(set(int(entry['id']) for entry in changed_entries)):
+                return HttpResponse("Error 97")
+
+        target_id = None
+        if len(new_entries) > 0:
+            cur.execute("SELECT id FROM users WHERE login = %s;", [target])
+            target_id = cur.fetchone()[0]
+
+        # let's do some security checks - make sure they may modify everyone involved...unless they're a manager!
+        if not request.user.is_staff:
+            involved = set(owner[1] for owner in owners.values())
+            if target_id is not None:
+                involved.add(target_id)
+            user_list = get_user_list(username=user, as_json=True)
+            if any(user_id not in user_list for user_id in involved):
+                return HttpResponse("Error 97")
+
+        # the custom field the "log as" value goes in
+        logas_field = custom_field_registry.log_as_field(cur)
+
+        if len(changed_entries) > 0:
+            update_entry_rows(changed_entries, logas_field.id, now, cur)
+        if len(new_entries) > 0:
+            insert_entries(new_entries, target_id, logas_field.id, now, cur)
+
+        # if the user performing this action is NOT the owner, let's record the change...
+        changes = []
+        for entry in entries:
+            if entry['id'] == 'new_entry':
+                changes.append((NO_ENTRY, entry, target))
+            else:
+                changes.append((old_records[int(entry['id'])], entry, owners[int(entry['id'])][0]))
+        log_entry_changes(user, changes, now, cur)
 
     return HttpResponse("200")
 
 
+def log_entry_changes(user, changes, now, cur):
+    """
+    Records the changes a user made to someone else's entries in time_entry_log, with one INSERT.
+    :param changes: list of (old record, new record, owner's login) tuples; changes to the user's own entries are
+    not recorded
+    """
+    rows = [(user, str(old).replace('\'', ''), str(new).replace('\'', ''), str(now), owner)
+            for old, new, owner in changes if owner != user]
+    if len(rows) == 0:
+        return
+    values, params = values_clause(rows, '(%s, %s, %s, %s, %s)')
+    cur.execute("INSERT INTO time_entry_log (\"user\", old_record, new_record, \"timestamp\", target) "
+                "VALUES " + values + ";", params)
+
+
+def entry_row(entry):
+    """
+    The columns of time_entries a submitted entry sets, in the order used by update_entry_rows and insert_entries.
+    """
+    entry_date = datetime.datetime.strptime(entry['date'], '%Y-%m-%d').date()
+    issue = entry['issue'] if entry.get('issue', '') != '' else None
+    return (entry['project'], entry_date, float(entry['hours']), entry['comments'], issue, entry['activity'],
+            entry_date.year, entry_date.month, entry_date.isocalendar()[1])
+
+
+def update_entry_rows(entries, logas_field_id, now, cur):
+    """
+    Saves edited entries and their "log as" values with a single statement.
+    """
+    values, params = values_clause(
+        [(int(entry['id']),) + entry_row(entry) + (entry['logas'],) for entry in entries],
+        '(%s::integer, %s::integer, %s::date, %s::float, %s::text, %s::integer, %s::integer, %s::integer, '
+        '%s::integer, %s::integer, %s::text)')
+    cur.execute(
+        "WITH v (id, project_id, spent_on, hours, comments, issue_id, activity_id, tyear, tmonth, tweek, logas) AS "
+        "(VALUES " + values + "), "
+        "saved AS (UPDATE time_entries SET project_id = v.project_id, spent_on = v.spent_on, hours = v.hours, "
+        "comments = v.comments, issue_id = v.issue_id, activity_id = v.activity_id, tyear = v.tyear, "
+        "tmonth = v.tmonth, tweek = v.tweek, updated_on = %s FROM v WHERE time_entries.id = v.id) "
+        "UPDATE custom_values SET value = v.logas FROM v WHERE custom_values.customized_id = v.id "
+        "AND custom_values.custom_field_id = %s AND custom_values.customized_type = 'TimeEntry';",
+        params + [now, logas_field_id])
+
+
+def insert_entries(entries, user_id, logas_field_id, now, cur):
+    """
+    Adds new entries for a user along with their "log as" values, one multi-row INSERT each.  Entries are dicts
+    like the ones update_entries receives (project, date as yyyy-mm-dd, hours, comments, issue, activity, logas).
+    Returns the new ids, in the order of the entries.
+    """
+    values, params = values_clause([entry_row(entry) + (user_id, now, now) for entry in entries],
+                                   '(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)')
+    # rows come back from RETURNING in the order of the VALUES list
+    cur.execute("INSERT INTO time_entries (project_id, spent_on, hours, comments, issue_id, activity_id, tyear, "
+                "tmonth, tweek, user_id, created_on, updated_on) VALUES " + values + " RETURNING id;", params)
+    ids = [row[0] for row in cur.fetchall()]
+
+    rows = [(entry_id, logas_field_id, entry['logas']) for entry_id, entry in zip(ids, entries)]
+    values, params = values_clause(rows, "(%s, %s, %s, 'TimeEntry')")
+    cur.execute("INSERT INTO custom_values (customized_id, custom_field_id, value, customized_type) "
+                "VALUES " + values + ";", params)
+    return ids
+
+
 @login_required
 # @user_is_in_manager_group
 def delete_entry(request):
@@ -258,23 +281,24 @@ def delete_entry(request):
         if target_id not in user_list and (not request.user.is_staff):
             return HttpResponse("Error 97")
 
-    # get a copy of that record in case we need to log it...
-    cur.execute("SELECT * FROM time_entries WHERE id = %(id)s;" % {'id': entry})
-    old_entry = cur.fetchone()
+    with transaction.atomic():
+        # get a copy of that record in case we need to log it...
+        cur.execute("SELECT * FROM time_entries WHERE id = %(id)s;" % {'id': entry})
+        old_entry = cur.fetchone()
 
-    # now simply delete it!
-    cur.execute("DELETE FROM time_entries WHERE id = %(id)s;" % {'id': entry})
+        # now simply delete it!
+        cur.execute("DELETE FROM time_entries WHERE id = %(id)s;" % {'id': entry})
 
-    # also delete any record in "custom_values"
-    cur.execute("DELETE FROM custom_values WHERE customized_id = %(id)s;" % {'id': entry})
+        # also delete any record in "custom_values"
+        cur.execute("DELETE FROM custom_values WHERE customized_id = %(id)s;" % {'id': entry})
 
-    # if the user performing this action is NOT the target, let's record this removal...
-    if target != user:
-        query = "INSERT INTO time_entry_log (\"user\", old_record, new_record, \"timestamp\", target) " \
-                "VALUES ('%(user)s', '%(old)s', '%(new)s', '%(time)s', '%(target)s');" % {
-                    'user': user, 'old': str(old_entry).replace('\'', ''), 'new': 'RECORD DELETED',
-                    'time': str(datetime.datetime.now()), 'target': target}
-        cur.execute(query)
+        # if the user performing this action is NOT the target, let's record this removal...
+        if target != user:
+            query = "INSERT INTO time_entry_log (\"user\", old_record, new_record, \"timestamp\", target) " \
+                    "VALUES ('%(user)s', '%(old)s', '%(new)s', '%(time)s', '%(target)s');" % {
+                        'user': user, 'old': str(old_entry).replace('\'', ''), 'new': 'RECORD DELETED',
+                        'time': str(datetime.datetime.now()), 'target': target}
+            cur.execute(query)
 
     # commit!
     connection.commit()